@@ -1,38 +1,82 @@
 import streamlit as st
 import gspread
 import pandas as pd
-from oauth2client.service_account import ServiceAccountCredentials
+import os
+import threading
 import time
 from datetime import datetime, time as dt_time
 from validate_docbr import CPF
-import calendar
 from dateutil.relativedelta import relativedelta
 import altair as alt
 
+import arquivamento
+import calculos
+import conexao_sheets
+import dados
+import exportacao
+import precalculo
+import resumo_mensal
+
 # -----------------------------------------------------
 # CONFIGURAÇÃO E CONEXÃO
 # -----------------------------------------------------
 st.set_page_config(layout="wide", page_title="Studio Pilates App")
 
 
-@st.cache_resource(ttl=300)
-def connect_to_sheets():
-    """Conecta ao Google Sheets usando as credenciais do Streamlit."""
+def carregar_estudios():
+    """Estúdios configurados em [estudios.<id>] no secrets.toml (nome e planilha); sem a seção, um estúdio só."""
+    try:
+        configurados = st.secrets.get("estudios", {})
+    except Exception:
+        configurados = {}
+    return conexao_sheets.estudios_configurados(configurados)
+
+
+ESTUDIOS = carregar_estudios()
+
+
+def selecionar_estudio():
+    """Estúdio da sessão: escolhido na barra lateral (ou por ?estudio=<id>) e guardado no session_state."""
+    ids = list(ESTUDIOS.keys())
+    if len(ids) == 1:
+        return ids[0]
+    if "estudio" not in st.session_state:
+        pedido = st.query_params.get("estudio")
+        st.session_state["estudio"] = pedido if pedido in ESTUDIOS else ids[0]
+    return st.sidebar.selectbox("🏢 Studio", ids, format_func=lambda id_estudio: ESTUDIOS[id_estudio]["nome"],
+                                key="estudio")
+
+
+@st.cache_resource
+def conectar_cliente_gspread():
+    """Cliente gspread único e de vida longa (um para todos os estúdios e sessões).
+
+    A sessão HTTP fica aberta e o token é renovado em segundo plano, então não há
+    reconexão periódica; em erro de autenticação, ela se reconecta sozinha.
+    """
+    return conexao_sheets.conectar_gspread(st.secrets["gcp_service_account"])
+
+
+@st.cache_resource
+def abrir_planilha(estudio):
+    """Planilha do estúdio, aberta uma vez por processo (falhas não ficam em cache)."""
+    client = conectar_cliente_gspread()
+    # A cota é da conta de serviço, então todos os estúdios dividem o mesmo ClienteComCota
+    return conexao_sheets.PlanilhaComCota(client.open(ESTUDIOS[estudio]["planilha"]), conexao_sheets.CLIENTE_PADRAO)
+
+
+def connect_to_sheets(estudio):
+    """Conecta à planilha do estúdio no Google Sheets."""
     try:
-        scope = ['https://spreadsheets.google.com/feeds',
-                 'https://www.googleapis.com/auth/drive']
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        sheet = client.open("StudioPilatesDB")
-        return sheet
+        return abrir_planilha(estudio)
     except Exception as e:
         st.error(f"Erro ao conectar com o Google Sheets: {e}")
         st.error("Verifique o 'secrets.toml' e as permissões de compartilhamento.")
         return None
 
 
-sheet = connect_to_sheets()
+estudio = selecionar_estudio()
+sheet = connect_to_sheets(estudio)
 
 hoje = datetime.now()
 MES_ATUAL = hoje.month
@@ -48,245 +92,166 @@ LISTA_MESES_NOMES = {
 # FUNÇÕES DE CARREGAMENTO DE DADOS (CACHE)
 # -----------------------------------------------------
 
-@st.cache_data(ttl=300)
-def load_data(worksheet_name):
-    """Função genérica para carregar uma aba como DataFrame (lendo como texto)."""
-    try:
-        ws = sheet.worksheet(worksheet_name)
-        all_values = ws.get_all_values()
-        if not all_values:
-            return pd.DataFrame()
+@st.cache_resource
+def load_cache_abas(estudio):
+    """Valores crus das abas do estúdio, compartilhados entre as sessões (single-flight + stale-while-revalidate)."""
+    return conexao_sheets.CacheDeAbas(lambda titulo: connect_to_sheets(estudio).worksheet(titulo).get_all_values(),
+                                      ttl=300, ao_atualizar=lambda: limpar_caches_derivados(estudio))
 
-        headers = all_values[0]
-        records_data = all_values[1:]
-        df = pd.DataFrame(records_data, columns=headers)
 
-        if not df.empty:
-            df.columns = df.columns.str.strip()
-        return df
+@st.cache_resource
+def load_indice_periodos(estudio, worksheet_name):
+    """Índice (ano, mês) de competência -> linhas da aba, compartilhado entre as sessões."""
+    return conexao_sheets.IndiceDePeriodos(lambda: connect_to_sheets(estudio).worksheet(worksheet_name))
+
+
+def load_data(estudio, worksheet_name, periodo=None):
+    """Função genérica para carregar uma aba como DataFrame (lendo como texto).
+
+    Com `periodo` (mes, ano), lê da planilha só as linhas dessa competência.
+    """
+    try:
+        if periodo is None:
+            all_values = load_cache_abas(estudio).obter(worksheet_name)
+        else:
+            all_values = load_indice_periodos(estudio, worksheet_name).valores_do_periodo(*periodo)
+        return dados.montar_dataframe(all_values)
     except gspread.exceptions.WorksheetNotFound:
         st.error(f"Aba '{worksheet_name}' não encontrada!")
         return pd.DataFrame()
+    except gspread.exceptions.APIError as e:
+        # Não devolve DataFrame vazio para não deixá-lo em cache por 5 minutos
+        st.error(f"O Google Sheets recusou a leitura da aba '{worksheet_name}' mesmo após novas tentativas: {e}")
+        st.error("Provável limite de requisições por minuto. Aguarde alguns segundos e recarregue a página.")
+        st.stop()
     except Exception as e:
         st.error(f"Erro ao carregar dados da aba '{worksheet_name}': {e}")
         return pd.DataFrame()
 
 
-@st.cache_data(ttl=300)
-def load_matriculas():
-    """Carrega e limpa dados da aba Matrículas."""
-    df = load_data("Matriculas")
-    if not df.empty:
-        if 'ID' in df.columns:
-            df['ID'] = pd.to_numeric(df['ID'], errors='coerce')
-        if 'Data_Inicio' in df.columns:
-            df['Data_Inicio'] = pd.to_datetime(df['Data_Inicio'], errors='coerce').dt.date
-            df['Data_Inicio'] = pd.to_datetime(df['Data_Inicio'], errors='coerce')
-
-        if 'Data_Nascimento' in df.columns:
-            df['Data_Nascimento'] = pd.to_datetime(df['Data_Nascimento'], errors='coerce').dt.date
-            df['Data_Nascimento'] = pd.to_datetime(df['Data_Nascimento'], errors='coerce')
-        else:
-            df['Data_Nascimento'] = pd.NaT
+@st.cache_resource(ttl=300)
+def load_precalculado(estudio):
+    """Snapshot da carga noturna (precalculo.py) ainda válido para o estúdio; {} se não houver."""
+    return precalculo.ler_snapshot(precalculo.DIRETORIO_PADRAO, estudio, datetime.now())
 
-        if 'Desconto_Percentual' in df.columns:
-            df['Desconto_Percentual'] = pd.to_numeric(df['Desconto_Percentual'], errors='coerce').fillna(0.0)
-        else:
-            df['Desconto_Percentual'] = 0.0
 
-        if 'Justificativa_Desconto' not in df.columns:
-            df['Justificativa_Desconto'] = ''
+def precalculado(estudio, nome, *args):
+    """Resultado pré-calculado do loader `nome` com estes argumentos, ou None (o loader calcula)."""
+    return precalculo.resultado(load_precalculado(estudio), nome, *args)
 
-        if 'Data_Congelamento_Inicio' in df.columns:
-            df['Data_Congelamento_Inicio'] = pd.to_datetime(df['Data_Congelamento_Inicio'], errors='coerce').dt.date
-        else:
-            df['Data_Congelamento_Inicio'] = pd.NaT
 
-        if 'Data_Primeira_Matricula' in df.columns:
-            df['Data_Primeira_Matricula'] = pd.to_datetime(df['Data_Primeira_Matricula'], errors='coerce').dt.date
-            df['Data_Primeira_Matricula'] = pd.to_datetime(df['Data_Primeira_Matricula'], errors='coerce')
-        else:
-            df['Data_Primeira_Matricula'] = pd.NaT
+def aba_da_particao(aba, ano=None):
+    """Aba principal (ano=None) ou a aba de arquivo do ano."""
+    return aba if ano is None else arquivamento.titulo_particao(aba, ano)
 
+
+@st.cache_data(ttl=300)
+def load_indice_arquivo(estudio):
+    """Partições arquivadas do estúdio (aba Arquivo_Historico); vazio se nada foi arquivado ainda."""
+    try:
+        valores = load_cache_abas(estudio).obter(arquivamento.ABA_INDICE)
+    except gspread.exceptions.WorksheetNotFound:
+        valores = []
+    if not valores:
+        return pd.DataFrame(columns=arquivamento.CABECALHO_INDICE)
+    df = pd.DataFrame([linha[:len(valores[0])] for linha in valores[1:]], columns=valores[0])
+    df['Ano'] = pd.to_numeric(df['Ano'], errors='coerce').fillna(0).astype(int)
+    df['ID_Maximo'] = pd.to_numeric(df['ID_Maximo'], errors='coerce').fillna(0).astype(int)
     return df
 
 
+def anos_arquivados(estudio, aba):
+    indice = load_indice_arquivo(estudio)
+    return sorted(indice.loc[indice['Aba'] == aba, 'Ano'].tolist())
+
+
+def com_anos_arquivados(estudio, loader, aba, anos):
+    """Aba principal do loader mais as abas arquivadas dos `anos` pedidos (só estas são lidas)."""
+    partes = [loader(estudio)] + [loader(estudio, ano) for ano in anos_arquivados(estudio, aba) if ano in anos]
+    partes = [df for df in partes if not df.empty]
+    if len(partes) <= 1:
+        return partes[0] if partes else loader(estudio)
+    return pd.concat(partes, ignore_index=True)
+
+
+def proximo_id(estudio, df, coluna, aba):
+    """Próximo ID livre da aba, contando também as linhas já arquivadas."""
+    maior = int(df[coluna].max()) if coluna in df.columns and df[coluna].notna().any() else 0
+    indice = load_indice_arquivo(estudio)
+    arquivados = indice.loc[indice['Aba'] == aba, 'ID_Maximo']
+    return max(maior, int(arquivados.max()) if not arquivados.empty else 0) + 1
+
+
 @st.cache_data(ttl=300)
-def load_planos():
+def load_matriculas(estudio):
+    """Carrega e limpa dados da aba Matrículas."""
+    return dados.limpar_matriculas(load_data(estudio, "Matriculas"))
+
+
+@st.cache_data(ttl=300)
+def load_planos(estudio):
     """Carrega e limpa dados da aba Planos."""
-    df = load_data("Planos")
-    if not df.empty:
-        if 'Preco_Mensal' in df.columns:
-            df['Preco_Mensal'] = df['Preco_Mensal'].astype(str).str.replace('R$', '', regex=False).str.strip()
-            df['Preco_Mensal'] = df['Preco_Mensal'].str.replace(',', '.', regex=False)
-            df['Preco_Mensal'] = df['Preco_Mensal'].apply(
-                lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
-            df['Preco_Mensal'] = pd.to_numeric(df['Preco_Mensal'], errors='coerce').fillna(0.0)
-        if 'Duracao_Meses' in df.columns:
-            df['Duracao_Meses'] = pd.to_numeric(df['Duracao_Meses'], errors='coerce').fillna(0)
-    return df
+    return dados.limpar_planos(load_data(estudio, "Planos"))
 
 
 @st.cache_data(ttl=300)
-def load_despesas():
-    """Carrega e limpa dados da aba Lancamentos_Despesas (Contas a Pagar)."""
-    df = load_data("Lancamentos_Despesas")
-    if not df.empty:
-        if 'ID' in df.columns:
-            df['ID'] = pd.to_numeric(df['ID'].astype(str).str.strip(), errors='coerce').fillna(0).astype(int)
-
-        if 'Valor' in df.columns:
-            df['Valor'] = df['Valor'].astype(str).str.replace('R$', '', regex=False).str.strip()
-            df['Valor'] = df['Valor'].str.replace(',', '.', regex=False)
-            df['Valor'] = df['Valor'].apply(lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
-            df['Valor'] = pd.to_numeric(df['Valor'], errors='coerce').fillna(0.0)
-
-        if 'Mes_Competencia' in df.columns:
-            df['Mes_Competencia'] = pd.to_numeric(df['Mes_Competencia'].astype(str).str.strip(),
-                                                  errors='coerce').fillna(0).astype(int)
-        if 'Ano_Competencia' in df.columns:
-            df['Ano_Competencia'] = pd.to_numeric(df['Ano_Competencia'].astype(str).str.strip(),
-                                                  errors='coerce').fillna(0).astype(int)
-
-        if 'Valor_Pago' in df.columns:
-            df['Valor_Pago'] = df['Valor_Pago'].astype(str).str.replace('R$', '', regex=False).str.strip()
-            df['Valor_Pago'] = df['Valor_Pago'].str.replace(',', '.', regex=False)
-            df['Valor_Pago'] = df['Valor_Pago'].apply(
-                lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
-            df['Valor_Pago'] = pd.to_numeric(df['Valor_Pago'], errors='coerce').fillna(0.0)
-        else:
-            df['Valor_Pago'] = 0.0
+def load_despesas(estudio, ano=None):
+    """Carrega e limpa dados da aba Lancamentos_Despesas (Contas a Pagar); com `ano`, a aba arquivada do ano."""
+    return dados.limpar_despesas(load_data(estudio, aba_da_particao("Lancamentos_Despesas", ano)))
 
-        if 'Data_Pagamento' in df.columns:
-            df['Data_Pagamento'] = pd.to_datetime(df['Data_Pagamento'], errors='coerce')
-        else:
-            df['Data_Pagamento'] = pd.NaT
 
-        if 'Data_Vencimento' in df.columns:
-            df['Data_Vencimento'] = pd.to_datetime(df['Data_Vencimento'], errors='coerce')
-        else:
-            df['Data_Vencimento'] = pd.NaT
-
-        if 'Status_Pagamento' not in df.columns:
-            df['Status_Pagamento'] = 'Pendente'
-        if 'Forma_Pagamento' not in df.columns:
-            df['Forma_Pagamento'] = ''
-        if 'Recorrente' not in df.columns:
-            df['Recorrente'] = 'Não'
-
-        if 'Ano_Competencia' in df.columns and 'Mes_Competencia' in df.columns:
-            df['Data_Competencia'] = pd.to_datetime(
-                df['Ano_Competencia'].astype(str) + '-' +
-                df['Mes_Competencia'].astype(str) + '-01',
-                format='%Y-%m-%d',
-                errors='coerce'
-            )
-    return df
+@st.cache_data(ttl=300)
+def load_presencas(estudio, ano=None):
+    """Carrega e limpa dados da aba Presencas_Evolucao; com `ano`, a aba arquivada do ano."""
+    return dados.limpar_presencas(load_data(estudio, aba_da_particao("Presencas_Evolucao", ano)))
 
 
 @st.cache_data(ttl=300)
-def load_presencas():
-    """Carrega e limpa dados da aba Presencas_Evolucao."""
-    df = load_data("Presencas_Evolucao")
-    if not df.empty:
-        if 'ID_Presenca' in df.columns:
-            df['ID_Presenca'] = pd.to_numeric(df['ID_Presenca'], errors='coerce')
-        if 'ID_Aluno' in df.columns:
-            df['ID_Aluno'] = pd.to_numeric(df['ID_Aluno'], errors='coerce')
-        if 'Data_Aula' in df.columns:
-            df['Data_Aula'] = pd.to_datetime(df['Data_Aula'], errors='coerce')
-    return df
+def load_pagamentos(estudio, ano=None):
+    """Carrega e limpa dados da aba Pagamentos_Recebidos; com `ano`, a aba arquivada do ano."""
+    return dados.limpar_pagamentos(load_data(estudio, aba_da_particao("Pagamentos_Recebidos", ano)))
+
+
+def carregar_competencia(estudio, aba, limpar, loader, mes, ano):
+    """Linhas de uma competência: da aba principal pelo índice de períodos e, se o ano foi arquivado, da aba do ano."""
+    partes = [limpar(load_data(estudio, aba, periodo=(mes, ano)))]
+    if ano in anos_arquivados(estudio, aba):
+        partes.append(loader(estudio, ano))
+    partes = [df for df in partes if not df.empty]
+    if not partes:
+        return pd.DataFrame()
+    df = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+    return df[(df['Mes_Competencia'] == mes) & (df['Ano_Competencia'] == ano)]
 
 
 @st.cache_data(ttl=300)
-def load_pagamentos():
-    """Carrega e limpa dados da aba Pagamentos_Recebidos."""
-    df = load_data("Pagamentos_Recebidos")
-    if not df.empty:
-        if 'ID_Pagamento' in df.columns:
-            df['ID_Pagamento'] = pd.to_numeric(df['ID_Pagamento'], errors='coerce')
-        if 'ID_Aluno' in df.columns:
-            df['ID_Aluno'] = pd.to_numeric(df['ID_Aluno'], errors='coerce')
-        if 'Data_Pagamento' in df.columns:
-            df['Data_Pagamento'] = pd.to_datetime(df['Data_Pagamento'], errors='coerce')
-
-        if 'Mes_Competencia' in df.columns:
-            df['Mes_Competencia'] = pd.to_numeric(df['Mes_Competencia'].astype(str).str.strip(),
-                                                  errors='coerce').fillna(0).astype(int)
-        if 'Ano_Competencia' in df.columns:
-            df['Ano_Competencia'] = pd.to_numeric(df['Ano_Competencia'].astype(str).str.strip(),
-                                                  errors='coerce').fillna(0).astype(int)
-
-        # Limpeza do Valor_Pago (Bruto)
-        if 'Valor_Pago' in df.columns:
-            df['Valor_Pago'] = df['Valor_Pago'].astype(str).str.replace('R$', '', regex=False).str.strip()
-            df['Valor_Pago'] = df['Valor_Pago'].str.replace(',', '.', regex=False)
-            df['Valor_Pago'] = df['Valor_Pago'].apply(
-                lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
-            df['Valor_Pago'] = pd.to_numeric(df['Valor_Pago'], errors='coerce').fillna(0.0)
-
-        # Limpeza do Valor_Liquido
-        if 'Valor_Liquido' in df.columns:
-            df['Valor_Liquido'] = df['Valor_Liquido'].astype(str).str.replace('R$', '', regex=False).str.strip()
-            df['Valor_Liquido'] = df['Valor_Liquido'].str.replace(',', '.', regex=False)
-            df['Valor_Liquido'] = df['Valor_Liquido'].apply(
-                lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
-            df['Valor_Liquido'] = pd.to_numeric(df['Valor_Liquido'], errors='coerce')
-        else:
-            df['Valor_Liquido'] = pd.NA
+def load_pagamentos_do_mes(estudio, mes, ano):
+    """Pagamentos de um mês de competência, sem baixar a aba inteira."""
+    return carregar_competencia(estudio, "Pagamentos_Recebidos", dados.limpar_pagamentos, load_pagamentos, mes, ano)
 
-        # Lógica Chave: Se Valor_Liquido for Nulo ou 0, ele é igual ao Valor_Pago (Bruto).
-        df['Valor_Liquido'] = df['Valor_Liquido'].fillna(df['Valor_Pago'])
-        df['Valor_Liquido'] = df.apply(
-            lambda row: row['Valor_Pago'] if row['Valor_Liquido'] == 0 else row['Valor_Liquido'],
-            axis=1
-        )
 
-    return df
+@st.cache_data(ttl=300)
+def load_despesas_do_mes(estudio, mes, ano):
+    """Despesas de um mês de competência, sem baixar a aba inteira."""
+    return carregar_competencia(estudio, "Lancamentos_Despesas", dados.limpar_despesas, load_despesas, mes, ano)
 
 
 @st.cache_data(ttl=300)
-def load_investimentos():
+def load_investimentos(estudio):
     """Carrega e limpa dados da aba Investimentos_Caixa."""
-    df = load_data("Investimentos_Caixa")
-    if not df.empty:
-        if 'ID_Movimentacao' in df.columns:
-            df['ID_Movimentacao'] = pd.to_numeric(df['ID_Movimentacao'].astype(str).str.strip(),
-                                                  errors='coerce').fillna(0).astype(int)
-        if 'Data' in df.columns:
-            df['Data'] = pd.to_datetime(df['Data'], errors='coerce')
-
-        if 'Valor' in df.columns:
-            df['Valor'] = df['Valor'].astype(str).str.replace('R$', '', regex=False).str.strip()
-            df['Valor'] = df['Valor'].str.replace(',', '.', regex=False)
-            df['Valor'] = df['Valor'].apply(lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
-            df['Valor'] = pd.to_numeric(df['Valor'], errors='coerce').fillna(0.0)
-    return df
+    return dados.limpar_investimentos(load_data(estudio, "Investimentos_Caixa"))
 
 
 @st.cache_data(ttl=300)
-def load_historico_renovacoes():
+def load_historico_renovacoes(estudio):
     """Carrega dados da aba Historico_Renovacoes."""
-    df = load_data("Historico_Renovacoes")
-    if not df.empty:
-        df['ID_Historico'] = pd.to_numeric(df['ID_Historico'], errors='coerce')
-        df['ID_Aluno'] = pd.to_numeric(df['ID_Aluno'], errors='coerce')
-        df['Data_Inicio_Contrato'] = pd.to_datetime(df['Data_Inicio_Contrato'], errors='coerce').dt.date
-        df['Data_Inicio_Contrato'] = pd.to_datetime(df['Data_Inicio_Contrato'], errors='coerce')
-
-        if 'Valor_Contrato' in df.columns:
-            df['Valor_Contrato'] = df['Valor_Contrato'].astype(str).str.replace('R$', '', regex=False).str.strip()
-            df['Valor_Contrato'] = df['Valor_Contrato'].str.replace(',', '.', regex=False)
-            df['Valor_Contrato'] = df['Valor_Contrato'].apply(
-                lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
-            df['Valor_Contrato'] = pd.to_numeric(df['Valor_Contrato'], errors='coerce').fillna(0.0)
-    return df
+    return dados.limpar_historico_renovacoes(load_data(estudio, "Historico_Renovacoes"))
 
 
 @st.cache_data(ttl=300)
-def load_taxas():
+def load_taxas(estudio):
     """Carrega e limpa dados da aba Config_Taxas."""
-    df = load_data("Config_Taxas")
+    df = load_data(estudio, "Config_Taxas")
     if not df.empty:
         if 'Taxa' in df.columns:
             # Limpa R$, , e converte para número
@@ -311,17 +276,271 @@ def load_taxas():
     return df
 
 
-def clear_all_caches():
-    """Limpa todos os caches de dados do app."""
-    load_data.clear()
-    load_matriculas.clear()
-    load_planos.clear()
-    load_despesas.clear()
-    load_presencas.clear()
-    load_pagamentos.clear()
-    load_investimentos.clear()
-    load_historico_renovacoes.clear()
-    load_taxas.clear()
+@st.cache_data(ttl=300)
+def load_indice_taxas(estudio):
+    """Compila a aba Config_Taxas em um índice {(Bandeira, Tipo, Parcela): taxa} com opções por nível."""
+    return calculos.indexar_taxas(load_taxas(estudio))
+
+
+@st.cache_resource
+def _estado_agregados_presencas(estudio):
+    """Guarda os agregados de presença entre recargas para atualizá-los de forma incremental."""
+    return {'agregados': None, 'lock': threading.Lock()}
+
+
+@st.cache_data(ttl=300)
+def load_agregados_presencas(estudio):
+    """Agregados de frequência por aluno/semana/mês, somando apenas as presenças novas desde a última carga."""
+    df_presencas = load_presencas(estudio)
+    estado = _estado_agregados_presencas(estudio)
+    with estado['lock']:
+        estado['agregados'] = calculos.agregar_presencas(df_presencas, estado['agregados'])
+        return estado['agregados']
+
+
+@st.cache_data(ttl=300)
+def load_frequencia_alunos(estudio, data_referencia):
+    """Resumo de frequência por aluno na data de referência (cacheado por dia)."""
+    return calculos.calcular_frequencia(load_agregados_presencas(estudio), load_matriculas(estudio), load_planos(estudio),
+                                        data_referencia)
+
+
+@st.cache_data
+def load_historico_cdi():
+    """Carrega o histórico local de CDI (cdi_historico.csv, ao lado do app.py)."""
+    caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cdi_historico.csv")
+    try:
+        return calculos.carregar_historico_cdi(caminho)
+    except Exception as e:
+        st.error(f"Erro ao carregar o histórico de CDI '{caminho}': {e}")
+        return pd.Series(dtype=float)
+
+
+@st.cache_data(ttl=300)
+def load_saldos_investimentos(estudio, data_referencia):
+    """Saldo com rendimentos (dia útil a dia útil) de cada produto até a data de referência."""
+    pronto = precalculado(estudio, 'load_saldos_investimentos', data_referencia)
+    if pronto is not None:
+        return pronto
+    return calculos.acumular_investimentos(load_investimentos(estudio), load_historico_cdi(), data_referencia)
+
+
+@st.cache_data(ttl=300)
+def load_indice_comemoracoes(estudio):
+    """Índice (mês, dia) -> alunos ativos para aniversários de vida e de studio."""
+    pronto = precalculado(estudio, 'load_indice_comemoracoes')
+    if pronto is not None:
+        return pronto
+    return calculos.indexar_comemoracoes(load_matriculas(estudio))
+
+
+@st.cache_data(ttl=300)
+def load_ciclos_contrato(estudio, data_referencia):
+    """Contratos do histórico com coorte, ciclo e situação de renovação."""
+    return calculos.montar_ciclos_contrato(load_historico_renovacoes(estudio), load_matriculas(estudio), load_planos(estudio),
+                                           data_referencia)
+
+
+@st.cache_data(ttl=300)
+def load_coortes(estudio, data_referencia, periodo):
+    """Retenção por coorte, churn por ciclo e permanência média (cacheado por snapshot e agrupamento)."""
+    return calculos.calcular_coortes(load_ciclos_contrato(estudio, data_referencia), data_referencia, periodo)
+
+
+@st.cache_data(ttl=300)
+def load_indice_busca_alunos(estudio):
+    """Índice de busca de alunos (nome sem acento, CPF e telefone)."""
+    return calculos.indexar_alunos(load_matriculas(estudio))
+
+
+@st.cache_resource(ttl=300)
+def load_indice_documentos(estudio):
+    """Índice compartilhado de CPFs/emails cadastrados; é atualizado a cada novo cadastro (não só na recarga)."""
+    return {'indice': calculos.indexar_documentos(load_matriculas(estudio)), 'lock': threading.Lock()}
+
+
+@st.cache_data(ttl=300)
+def load_lista_alunos(estudio):
+    """Lista de alunos já projetada e com as chaves de filtro pré-calculadas."""
+    return calculos.preparar_lista_alunos(load_matriculas(estudio))
+
+
+@st.cache_data(ttl=300, max_entries=200)
+def load_pagina_alunos(estudio, status, planos, texto, ordenar_por, crescente, pagina, tamanho_pagina):
+    """Uma página filtrada/ordenada da lista de alunos e o total de resultados."""
+    return calculos.paginar_alunos(load_lista_alunos(estudio), status, planos, texto, ordenar_por, crescente,
+                                   pagina, tamanho_pagina)
+
+
+@st.cache_data(ttl=300)
+def load_contratos_ativos(estudio):
+    """Contratos ativos (matrícula + plano) com Data_Fim e valor mensal com desconto."""
+    return calculos.montar_contratos_ativos(load_matriculas(estudio), load_planos(estudio))
+
+
+@st.cache_data(ttl=300)
+def load_fluxo_mes(estudio, mes, ano):
+    """Receita prevista, pagamentos e despesas de um mês de competência, com os totais do dashboard."""
+    pronto = precalculado(estudio, 'load_fluxo_mes', mes, ano)
+    if pronto is not None:
+        return pronto
+    return calculos.resumir_fluxo_mes(load_contratos_ativos(estudio), load_pagamentos_do_mes(estudio, mes, ano),
+                                      load_despesas_do_mes(estudio, mes, ano), mes, ano)
+
+
+@st.cache_data(ttl=300)
+def load_status_pagamentos(estudio, mes, ano):
+    """Situação de pagamento (Pago/Parcial/Não Pago) de cada aluno com contrato no mês."""
+    pronto = precalculado(estudio, 'load_status_pagamentos', mes, ano)
+    if pronto is not None:
+        return pronto
+    fluxo_mes = load_fluxo_mes(estudio, mes, ano)
+    return calculos.status_pagamentos_alunos(fluxo_mes['receita'], fluxo_mes['pagamentos'])
+
+
+@st.cache_data(ttl=300)
+def load_projecao_anual(estudio, mes, ano):
+    """Receita prevista, descontos e gastos previstos nos 12 meses a partir do mês escolhido."""
+    pronto = precalculado(estudio, 'load_projecao_anual', mes, ano)
+    if pronto is not None:
+        return pronto
+    do_resumo = calculos.projecao_do_resumo(load_resumo_mensal(estudio), datetime(ano, mes, 1))
+    if do_resumo is not None:
+        return do_resumo
+    df_despesas = com_anos_arquivados(estudio, load_despesas, "Lancamentos_Despesas", [ano, ano + 1])
+    return calculos.projetar_fluxo_anual(load_contratos_ativos(estudio), df_despesas, datetime(ano, mes, 1))
+
+
+@st.cache_data(ttl=300)
+def load_vencimentos(estudio, data_referencia):
+    """Alunos ativos com plano vencido e a vencer em 30 dias na data de referência (cacheado por dia)."""
+    pronto = precalculado(estudio, 'load_vencimentos', data_referencia)
+    if pronto is not None:
+        return pronto
+    return calculos.separar_vencimentos(load_matriculas(estudio), load_planos(estudio), data_referencia)
+
+
+@st.cache_resource
+def _estado_resumo_mensal(estudio):
+    """Marca o Resumo_Mensal como desatualizado neste processo quando uma escrita não conseguiu regravá-lo."""
+    return {'desatualizado': False}
+
+
+@st.cache_data(ttl=300)
+def load_resumo_mensal(estudio):
+    """Totais por mês da aba Resumo_Mensal por (Ano, Mes); vazio se a aba não existe ou está desatualizada."""
+    if _estado_resumo_mensal(estudio)['desatualizado']:
+        return dados.limpar_resumo_mensal(pd.DataFrame())
+    try:
+        valores = load_cache_abas(estudio).obter(resumo_mensal.ABA_RESUMO)
+    except gspread.exceptions.WorksheetNotFound:
+        valores = []
+    return dados.limpar_resumo_mensal(dados.montar_dataframe(valores))
+
+
+def totais_do_mes(estudio, mes, ano):
+    """Totais do dashboard de um mês: da linha do Resumo_Mensal ou, se o mês não está lá, calculados das abas."""
+    resumo = load_resumo_mensal(estudio)
+    if (ano, mes) in resumo.index:
+        return calculos.totais_do_resumo(resumo.loc[(ano, mes)])
+    return load_fluxo_mes(estudio, mes, ano)['totais']
+
+
+def atualizar_resumo_mensal(estudio, pagamentos=(), despesas=(), contratos=False):
+    """Regrava no Resumo_Mensal só o que uma escrita mudou (chamar depois do clear_all_caches).
+
+    `pagamentos`/`despesas`: competências [(mes, ano)] gravadas, lidas pelo índice de períodos;
+    `contratos`: matrícula ou plano mudou, então a receita prevista e os descontos de todos
+    os meses da aba são recalculados. Se a gravação não terminar, o resumo deixa de ser
+    usado neste processo (o Financeiro calcula das abas) até ser reconstruído.
+    """
+    estado = _estado_resumo_mensal(estudio)
+    try:
+        # Recalcula e grava sob a trava da planilha (sessões do app e precalculo.py): uma regravação mais
+        # lenta, com totais lidos antes de outra escrita, não sobrescreve a mais nova; quem entra depois
+        # já lê as abas com as duas escritas.
+        with arquivamento.travar(sheet, espera=arquivamento.ESPERA_ESCRITAS):
+            resumo = load_resumo_mensal(estudio)
+            if resumo.empty:
+                # Sem resumo (aba ainda não criada ou já desatualizada): o Financeiro calcula das abas
+                return
+            # Fica marcado até a gravação terminar (st.stop de um loader também o deixa desatualizado)
+            estado['desatualizado'] = True
+            partes = []
+            if contratos:
+                partes.append(calculos.resumir_meses(resumo.index, df_contratos=load_contratos_ativos(estudio)))
+            for mes, ano in set(pagamentos):
+                partes.append(calculos.resumir_meses([(ano, mes)],
+                                                     df_pagamentos=load_pagamentos_do_mes(estudio, mes, ano)))
+            for mes, ano in set(despesas):
+                partes.append(calculos.resumir_meses([(ano, mes)],
+                                                     df_despesas=load_despesas_do_mes(estudio, mes, ano)))
+            if partes:
+                # Um mês pode vir em mais de uma parte (ex: contratos + pagamento): junta as colunas de cada uma
+                resumo_mensal.gravar_meses(sheet, pd.concat(partes).groupby(level=[0, 1]).last())
+            estado['desatualizado'] = False
+    except Exception as e:
+        estado['desatualizado'] = True
+        st.warning(f"Não foi possível atualizar o Resumo_Mensal: {e}. O Financeiro vai calcular os totais a partir "
+                   "das abas até a próxima reconstrução (barra lateral ou carga noturna).")
+    finally:
+        load_cache_abas(estudio).invalidar(resumo_mensal.ABA_RESUMO)
+        load_resumo_mensal.clear(estudio)
+
+
+def reconstruir_resumo_mensal(estudio):
+    """Recalcula o Resumo_Mensal inteiro (inclusive os anos arquivados) e o regrava; devolve quantos meses."""
+    estado = _estado_resumo_mensal(estudio)
+    with arquivamento.travar(sheet, espera=arquivamento.ESPERA_ESCRITAS):
+        clear_all_caches(estudio)
+        df_pagamentos = com_anos_arquivados(estudio, load_pagamentos, "Pagamentos_Recebidos",
+                                            anos_arquivados(estudio, "Pagamentos_Recebidos"))
+        df_despesas = com_anos_arquivados(estudio, load_despesas, "Lancamentos_Despesas",
+                                          anos_arquivados(estudio, "Lancamentos_Despesas"))
+        df_contratos = load_contratos_ativos(estudio)
+        meses = calculos.meses_do_resumo(df_contratos, df_pagamentos, df_despesas, datetime.now())
+        gravados = resumo_mensal.reconstruir(sheet, calculos.resumir_meses(meses, df_contratos, df_pagamentos,
+                                                                           df_despesas))
+        estado['desatualizado'] = False
+        load_cache_abas(estudio).invalidar(resumo_mensal.ABA_RESUMO)
+        load_resumo_mensal.clear(estudio)
+    return gravados
+
+
+def clear_all_caches(estudio):
+    """Limpa todos os caches de dados do app (o índice de documentos é atualizado nos próprios cadastros)."""
+    load_cache_abas(estudio).invalidar()
+    limpar_caches_derivados(estudio)
+
+
+def limpar_caches_derivados(estudio):
+    """Limpa os caches calculados das abas do estúdio (os loaders com mais parâmetros são limpos por inteiro)."""
+    # Os dados mudaram: o snapshot da carga noturna deixa de valer
+    precalculo.descartar_snapshot(precalculo.DIRETORIO_PADRAO, estudio)
+    load_precalculado.clear(estudio)
+    for loader in (load_matriculas, load_planos, load_despesas, load_presencas, load_pagamentos, load_investimentos,
+                   load_historico_renovacoes, load_taxas, load_indice_taxas, load_agregados_presencas,
+                   load_indice_comemoracoes, load_indice_busca_alunos, load_lista_alunos, load_contratos_ativos,
+                   load_indice_arquivo, load_resumo_mensal):
+        loader.clear(estudio)
+    load_frequencia_alunos.clear()
+    load_saldos_investimentos.clear()
+    load_ciclos_contrato.clear()
+    load_coortes.clear()
+    load_pagina_alunos.clear()
+    load_pagamentos_do_mes.clear()
+    load_despesas_do_mes.clear()
+    load_fluxo_mes.clear()
+    load_status_pagamentos.clear()
+    load_projecao_anual.clear()
+    load_vencimentos.clear()
+    spec_fluxo_mes.clear()
+    spec_composicao_receita.clear()
+    spec_composicao_gastos.clear()
+    spec_projecao_descontos.clear()
+    spec_projecao_anual.clear()
+    for aba in ("Pagamentos_Recebidos", "Lancamentos_Despesas"):
+        load_indice_periodos(estudio, aba).invalidar()
 
 
 # -----------------------------------------------------
@@ -362,6 +581,16 @@ def atualizar_matricula_aluno(id_aluno, dados_para_atualizar):
 
 def atualizar_lancamento_despesa(id_despesa, dados_para_atualizar):
     """Atualiza uma linha específica na aba 'Lancamentos_Despesas' com base no ID."""
+    try:
+        # O arquivamento apaga linhas desta aba: o número da linha só vale sob a trava dele
+        with arquivamento.travar(sheet, espera=arquivamento.ESPERA_ESCRITAS):
+            return _atualizar_lancamento_despesa(id_despesa, dados_para_atualizar)
+    except RuntimeError as e:
+        st.error(f"Erro ao tentar atualizar a despesa: {e}")
+        return False
+
+
+def _atualizar_lancamento_despesa(id_despesa, dados_para_atualizar):
     try:
         despesas_ws = sheet.worksheet("Lancamentos_Despesas")
         df_despesas_raw = pd.DataFrame(despesas_ws.get_all_records(head=1))
@@ -393,6 +622,48 @@ def atualizar_lancamento_despesa(id_despesa, dados_para_atualizar):
         return False
 
 
+# -----------------------------------------------------
+# COMPONENTES DE INTERFACE
+# -----------------------------------------------------
+def coluna_reais(rotulo):
+    """Coluna numérica exibida em reais (mantém o valor numérico para ordenação).
+
+    "localized" usa o separador de milhar do navegador (o printf do Streamlit não aceita "%,.2f");
+    o "R$" vai para o rótulo e o step fixa as duas casas decimais.
+    """
+    rotulo = rotulo if "R$" in rotulo else f"{rotulo} (R$)"
+    return st.column_config.NumberColumn(rotulo, format="localized", step=0.01)
+
+
+def coluna_percentual(rotulo):
+    """Coluna numérica exibida em %, para valores já em pontos percentuais (ex: 10 -> 10.0%)."""
+    return st.column_config.NumberColumn(rotulo, format="%.1f%%")
+
+
+def selecionar_aluno(rotulo, chave, status=None):
+    """Busca de aluno(a) por nome, CPF ou telefone; retorna o registro do índice (ID, Nome, ...) ou None."""
+    consulta = st.text_input(f"🔍 Buscar {rotulo}", key=f"busca_{chave}",
+                             placeholder="Digite parte do nome, CPF ou telefone...")
+    # O índice só é montado quando há o que buscar: a página abre sem ele
+    resultados = []
+    if consulta:
+        resultados = calculos.buscar_alunos(load_indice_busca_alunos(estudio), consulta, limite=15, status=status)
+    if consulta and not resultados:
+        st.info("Nenhum(a) aluno(a) encontrado(a) para essa busca.")
+
+    alunos_por_id = {aluno['ID']: aluno for aluno in resultados}
+    id_selecionado = st.selectbox(
+        rotulo,
+        options=list(alunos_por_id.keys()),
+        index=0 if len(resultados) == 1 else None,
+        format_func=lambda id_aluno: f"{alunos_por_id[id_aluno]['Nome']} (ID {id_aluno})",
+        placeholder="Selecione um resultado da busca..." if resultados else "Digite na busca acima...",
+        disabled=not resultados,
+        key=f"sel_{chave}"
+    )
+    return alunos_por_id.get(id_selecionado)
+
+
 # -----------------------------------------------------
 # PÁGINA: CADASTRAR ALUNO(A)
 # -----------------------------------------------------
@@ -400,7 +671,7 @@ def pagina_cadastro():
     st.title("Cadastrar Novo(a) Aluno(a)")
 
     try:
-        df_planos = load_planos()
+        df_planos = load_planos(estudio)
         if df_planos.empty or 'Plano' not in df_planos.columns:
             st.error("Não foi possível carregar a lista de planos.")
             lista_planos = ["Erro ao carregar"]
@@ -463,91 +734,95 @@ def pagina_cadastro():
         if not validador_cpf.validate(cpf_input):
             st.error(f"CPF inválido! O número '{cpf_input}' não é um CPF válido. Verifique a digitação.")
             st.stop()
+        # Salva sempre no mesmo formato (000.000.000-00), independente de como foi digitado
+        cpf_input = validador_cpf.mask(calculos.somente_digitos(cpf_input))
 
         if desconto_percentual > 0 and not justificativa_desconto:
             st.warning("Por favor, insira a 'Justificativa do Desconto' para aplicar o valor.")
             st.stop()
 
         try:
-            df_matriculas = load_matriculas()
+            documentos = load_indice_documentos(estudio)
+            indice_documentos = documentos['indice']
 
-            if not df_matriculas.empty and 'CPF' in df_matriculas.columns:
-                if not df_matriculas[df_matriculas['CPF'] == cpf_input].empty:
+            # Checagem de duplicidade, reserva do ID e gravação numa só seção crítica, tomada antes
+            # da escrita: dois cadastros simultâneos não passam juntos pela checagem nem pegam o mesmo ID.
+            with documentos['lock']:
+                if calculos.somente_digitos(cpf_input) in indice_documentos['cpf']:
                     st.error(f"Erro: O CPF '{cpf_input}' já está cadastrado no sistema!")
                     st.stop()
-                if 'ID' in df_matriculas.columns and not df_matriculas['ID'].isnull().all():
-                    last_id = int(df_matriculas['ID'].max())
-                    novo_id = last_id + 1
-                else:
-                    novo_id = 1
-            else:
-                novo_id = 1
+                id_mesmo_email = indice_documentos['email'].get(calculos.normalizar_email(email))
+                if id_mesmo_email is not None:
+                    st.warning(f"Atenção: o email '{email}' já é usado pelo cadastro ID {id_mesmo_email}.")
 
-            data_cadastro = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                novo_id = indice_documentos['max_id'] + 1
 
-            data_inicio_original_str = data_inicio.strftime('%d/%m/%Y')
-            data_inicio_dt = datetime.combine(data_inicio, dt_time.min)
+                data_cadastro = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-            ciclos_a_registrar = []
-            data_inicio_para_matricula = data_inicio_dt
+                data_inicio_original_str = data_inicio.strftime('%d/%m/%Y')
+                data_inicio_dt = datetime.combine(data_inicio, dt_time.min)
 
-            try:
-                plano_info = df_planos[df_planos['Plano'] == plano_selecionado].iloc[0]
-                duracao_meses = int(plano_info['Duracao_Meses'])
+                ciclos_a_registrar = []
+                data_inicio_para_matricula = data_inicio_dt
 
-                if duracao_meses > 0:
-                    ciclos_a_registrar.append(data_inicio_dt)
-                    data_fim_ciclo = data_inicio_dt + relativedelta(months=duracao_meses)
-                    data_inicio_ciclo_atual = data_inicio_dt
+                try:
+                    plano_info = df_planos[df_planos['Plano'] == plano_selecionado].iloc[0]
+                    duracao_meses = int(plano_info['Duracao_Meses'])
 
-                    if hoje.date() > data_fim_ciclo.date() and status == "Ativa":
-                        while hoje.date() > (data_inicio_ciclo_atual + relativedelta(months=duracao_meses)).date():
-                            data_inicio_ciclo_atual = data_inicio_ciclo_atual + relativedelta(months=duracao_meses)
-                            ciclos_a_registrar.append(data_inicio_ciclo_atual)
+                    if duracao_meses > 0:
+                        ciclos_a_registrar.append(data_inicio_dt)
+                        data_fim_ciclo = data_inicio_dt + relativedelta(months=duracao_meses)
+                        data_inicio_ciclo_atual = data_inicio_dt
 
-                        data_inicio_para_matricula = data_inicio_ciclo_atual
+                        if hoje.date() > data_fim_ciclo.date() and status == "Ativa":
+                            while hoje.date() > (data_inicio_ciclo_atual + relativedelta(months=duracao_meses)).date():
+                                data_inicio_ciclo_atual = data_inicio_ciclo_atual + relativedelta(months=duracao_meses)
+                                ciclos_a_registrar.append(data_inicio_ciclo_atual)
 
-                        st.toast(
-                            f"Ajuste de aluno antigo: {len(ciclos_a_registrar)} ciclos detectados. Data de início alterada de {data_inicio_original_str} para {data_inicio_para_matricula.strftime('%d/%m/%Y')} (ciclo atual).",
-                            icon="🔔")
-                else:
+                            data_inicio_para_matricula = data_inicio_ciclo_atual
+
+                            st.toast(
+                                f"Ajuste de aluno antigo: {len(ciclos_a_registrar)} ciclos detectados. Data de início alterada de {data_inicio_original_str} para {data_inicio_para_matricula.strftime('%d/%m/%Y')} (ciclo atual).",
+                                icon="🔔")
+                    else:
+                        ciclos_a_registrar.append(data_inicio_dt)
+
+                except IndexError:
+                    st.error(
+                        f"O plano '{plano_selecionado}' não foi encontrado na aba 'Planos'. Não foi possível calcular a renovação automática.")
+                    ciclos_a_registrar.append(data_inicio_dt)
+                except Exception as e:
+                    st.warning(f"Não foi possível calcular a renovação automática: {e}")
                     ciclos_a_registrar.append(data_inicio_dt)
 
-            except IndexError:
-                st.error(
-                    f"O plano '{plano_selecionado}' não foi encontrado na aba 'Planos'. Não foi possível calcular a renovação automática.")
-                ciclos_a_registrar.append(data_inicio_dt)
-            except Exception as e:
-                st.warning(f"Não foi possível calcular a renovação automática: {e}")
-                ciclos_a_registrar.append(data_inicio_dt)
-
-            data_inicio_str = data_inicio_para_matricula.strftime("%Y-%m-%d")
-            data_nascimento_str = data_nascimento.strftime("%Y-%m-%d") if data_nascimento else ""
-            data_congelamento_str = ""
-            data_primeira_matricula_str = data_inicio.strftime("%Y-%m-%d")
-
-            if status == "Congelado":
-                data_congelamento_str = datetime.now().strftime("%Y-%m-%d")
-                st.toast("Status 'Congelado' definido. Use a página 'Gerenciar Status' para reativar.")
-
-            nova_linha_matricula = [
-                novo_id, data_cadastro, nome, cpf_input, telefone,
-                email, plano_selecionado, data_inicio_str, status,
-                cep, endereco, data_nascimento_str, onde_conheceu,
-                sexo, emprego, notas, desconto_percentual, justificativa_desconto,
-                data_congelamento_str,
-                data_primeira_matricula_str
-            ]
+                data_inicio_str = data_inicio_para_matricula.strftime("%Y-%m-%d")
+                data_nascimento_str = data_nascimento.strftime("%Y-%m-%d") if data_nascimento else ""
+                data_congelamento_str = ""
+                data_primeira_matricula_str = data_inicio.strftime("%Y-%m-%d")
+
+                if status == "Congelado":
+                    data_congelamento_str = datetime.now().strftime("%Y-%m-%d")
+                    st.toast("Status 'Congelado' definido. Use a página 'Gerenciar Status' para reativar.")
+
+                nova_linha_matricula = [
+                    novo_id, data_cadastro, nome, cpf_input, telefone,
+                    email, plano_selecionado, data_inicio_str, status,
+                    cep, endereco, data_nascimento_str, onde_conheceu,
+                    sexo, emprego, notas, desconto_percentual, justificativa_desconto,
+                    data_congelamento_str,
+                    data_primeira_matricula_str
+                ]
 
-            matriculas_ws = sheet.worksheet("Matriculas")
-            matriculas_ws.append_row([str(item) for item in nova_linha_matricula], value_input_option='USER_ENTERED')
+                matriculas_ws = sheet.worksheet("Matriculas")
+                matriculas_ws.append_row([str(item) for item in nova_linha_matricula], value_input_option='USER_ENTERED')
+                calculos.registrar_documentos(indice_documentos, novo_id, cpf_input, email)
 
             try:
                 plano_info_hist = df_planos[df_planos['Plano'] == plano_selecionado].iloc[0]
                 preco_plano_hist = plano_info_hist['Preco_Mensal']
                 valor_final_contrato = preco_plano_hist * (1 - desconto_percentual / 100)
 
-                df_hist = load_historico_renovacoes()
+                df_hist = load_historico_renovacoes(estudio)
                 id_hist = (df_hist['ID_Historico'].max() + 1) if not df_hist.empty and not df_hist[
                     'ID_Historico'].isnull().all() else 1
 
@@ -571,7 +846,8 @@ def pagina_cadastro():
             except Exception as e_hist:
                 st.error(f"Erro ao salvar no histórico de renovações: {e_hist}")
 
-            clear_all_caches()
+            clear_all_caches(estudio)
+            atualizar_resumo_mensal(estudio, contratos=True)
             st.success(f"Aluno(a) {nome} cadastrado(a) com sucesso! (Matrícula ID: {novo_id})")
             st.balloons()
             time.sleep(2)
@@ -590,8 +866,8 @@ def pagina_todos_alunos():
     st.title("Buscar Aluno(a) e Histórico")
 
     try:
-        df_matriculas = load_matriculas()
-        df_presencas = load_presencas()
+        df_matriculas = load_matriculas(estudio)
+        df_presencas = load_presencas(estudio)
 
         if df_matriculas.empty:
             st.info("Nenhum(a) aluno(a) cadastrado(a) ainda.")
@@ -601,9 +877,6 @@ def pagina_todos_alunos():
             st.error("Erro Crítico: A planilha 'Matriculas' precisa das colunas 'Nome' e 'ID'.")
             st.stop()
 
-        df_matriculas_sorted = df_matriculas.sort_values(by="Nome")
-        dict_alunas = pd.Series(df_matriculas_sorted.ID.values, index=df_matriculas_sorted.Nome).to_dict()
-
         modo_busca = st.radio(
             "Selecione o modo de visualização:",
             ["Buscar Aluno(a) Específico(a)", "Ver Lista Completa"],
@@ -614,16 +887,10 @@ def pagina_todos_alunos():
 
         if modo_busca == "Buscar Aluno(a) Específico(a)":
             st.header("Busca Individual e Histórico")
-            opcoes_alunas = [""] + list(dict_alunas.keys())
-            nome_selecionado = st.selectbox(
-                "Digite ou selecione o nome do(a) aluno(a):",
-                options=opcoes_alunas,
-                index=0,
-                placeholder="Selecione..."
-            )
-
-            if nome_selecionado:
-                id_aluno = dict_alunas[nome_selecionado]
+            aluno_selecionado = selecionar_aluno("Aluno(a)", "todos_alunos")
+
+            if aluno_selecionado:
+                id_aluno = aluno_selecionado['ID']
                 dados_aluno = df_matriculas[df_matriculas['ID'] == id_aluno].iloc[0]
 
                 st.subheader(f"Ficha de {dados_aluno['Nome']}")
@@ -666,6 +933,10 @@ def pagina_todos_alunos():
                     st.text(f"Notas: {dados_aluno.get('Notas', 'N/A')}")
 
                 st.subheader(f"Histórico de Aulas e Evolução")
+                anos_anteriores = anos_arquivados(estudio, "Presencas_Evolucao")
+                if anos_anteriores and st.toggle(f"Incluir aulas arquivadas ({anos_anteriores[0]}–{anos_anteriores[-1]})",
+                                                 key="historico_arquivado"):
+                    df_presencas = com_anos_arquivados(estudio, load_presencas, "Presencas_Evolucao", anos_anteriores)
                 if 'ID_Aluno' not in df_presencas.columns:
                     st.error("Erro Crítico: Coluna 'ID_Aluno' não encontrada na aba 'Presencas_Evolucao'.")
                     st.stop()
@@ -688,26 +959,60 @@ def pagina_todos_alunos():
 
         else:  # Modo "Ver Lista Completa"
             st.header("Lista Completa de Alunos(as)")
+
+            def voltar_primeira_pagina():
+                # Filtro ou ordenação mudou: a lista recomeça da página 1
+                st.session_state["pagina_lista"] = 1
+
+            filtro_status = "Todos(as)"
             if 'Status' in df_matriculas.columns:
                 filtro_status = st.radio("Filtrar por Status:",
                                          ["Todos(as)", "Ativa", "Congelado", "Inativa", "Cancelada"],
-                                         horizontal=True, index=1)
-                if filtro_status == "Todos(as)":
-                    df_filtrado = df_matriculas
-                else:
-                    df_filtrado = df_matriculas[df_matriculas['Status'].str.lower() == filtro_status.lower()]
+                                         horizontal=True, index=1, on_change=voltar_primeira_pagina)
             else:
                 st.warning("Coluna 'Status' não encontrada. Exibindo todos os alunos.")
-                df_filtrado = df_matriculas
 
-            st.info(f"Total de Alunos(as) Encontrados(as): {len(df_filtrado)}")
-            df_filtrado = df_filtrado.sort_values(by="ID", ascending=False)
-
-            cols_to_show = ['ID', 'Nome', 'Email', 'Telefone', 'Plano', 'Status',
-                            'Data_Primeira_Matricula', 'Data_Inicio',
-                            'Data_Congelamento_Inicio', 'Data_Nascimento', 'Emprego', 'Desconto_Percentual']
-            cols_existentes = [col for col in cols_to_show if col in df_filtrado.columns]
-            st.dataframe(df_filtrado[cols_existentes], use_container_width=True)
+            col_f1, col_f2 = st.columns(2)
+            with col_f1:
+                texto_filtro = st.text_input("Filtrar por nome, CPF ou telefone:", placeholder="Ex: Maria, 123.456",
+                                             on_change=voltar_primeira_pagina)
+            with col_f2:
+                opcoes_planos = sorted(df_matriculas['Plano'].dropna().unique()) if 'Plano' in df_matriculas else []
+                planos_filtro = st.multiselect("Filtrar por Plano:", opcoes_planos, placeholder="Todos os planos",
+                                               on_change=voltar_primeira_pagina)
+
+            colunas_ordenaveis = [col for col in calculos.COLUNAS_LISTA_ALUNOS if col in df_matriculas.columns]
+            col_o1, col_o2, col_o3 = st.columns(3)
+            with col_o1:
+                ordenar_por = st.selectbox("Ordenar por:", colunas_ordenaveis,
+                                           index=colunas_ordenaveis.index('ID') if 'ID' in colunas_ordenaveis else 0,
+                                           on_change=voltar_primeira_pagina)
+            with col_o2:
+                crescente = st.toggle("Ordem crescente", value=False, on_change=voltar_primeira_pagina)
+            with col_o3:
+                tamanho_pagina = st.selectbox("Alunos por página:", [25, 50, 100], index=1,
+                                              on_change=voltar_primeira_pagina)
+
+            status_consulta = None if filtro_status == "Todos(as)" else filtro_status
+            planos_consulta = tuple(planos_filtro)
+            _, total_filtrado = load_pagina_alunos(estudio, status_consulta, planos_consulta, texto_filtro, ordenar_por,
+                                                   crescente, 1, tamanho_pagina)
+            total_paginas = max(1, -(-total_filtrado // tamanho_pagina))
+
+            # A lista pode ter encolhido (ex: recarga dos dados) desde a última página escolhida
+            if st.session_state.get("pagina_lista", 1) > total_paginas:
+                st.session_state["pagina_lista"] = total_paginas
+            pagina = st.number_input(f"Página (de {total_paginas}):", min_value=1, max_value=total_paginas,
+                                     step=1, key="pagina_lista")
+            df_pagina, total_filtrado = load_pagina_alunos(estudio, status_consulta, planos_consulta, texto_filtro,
+                                                           ordenar_por, crescente, int(pagina), tamanho_pagina)
+
+            st.info(f"Total de Alunos(as) Encontrados(as): {total_filtrado}")
+            if total_filtrado:
+                inicio_pagina = (int(pagina) - 1) * tamanho_pagina
+                st.caption(f"Exibindo {inicio_pagina + 1}–{inicio_pagina + len(df_pagina)} de {total_filtrado}.")
+            st.dataframe(df_pagina, use_container_width=True, hide_index=True,
+                         column_config={'Desconto_Percentual': coluna_percentual("Desconto_Percentual")})
 
     except KeyError as e:
         st.error(f"Erro Crítico de Coluna: A coluna {e} não foi encontrada na planilha.")
@@ -749,11 +1054,7 @@ def pagina_lancar_despesa():
             st.warning("Por favor, preencha todos os campos obrigatórios (*).")
             st.stop()
         try:
-            df_despesas = load_despesas()
-            if df_despesas.empty or 'ID' not in df_despesas.columns or df_despesas['ID'].isnull().all():
-                proximo_id = 1
-            else:
-                proximo_id = int(df_despesas['ID'].max()) + 1
+            proximo_id_despesa = proximo_id(estudio, load_despesas(estudio), 'ID', "Lancamentos_Despesas")
 
             valor_parcela = valor_total / num_parcelas if not recorrente else valor_total
             data_cadastro = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -777,16 +1078,17 @@ def pagina_lancar_despesa():
                     vencimento_parcela_str = vencimento_parcela.strftime("%Y-%m-%d")
 
                 nova_linha = [
-                    proximo_id, data_cadastro, descricao_parcela, valor_parcela,
+                    proximo_id_despesa, data_cadastro, descricao_parcela, valor_parcela,
                     mes_competencia, ano_competencia, tipo, "Pendente",
                     "", 0.0, "", recorrente_str, vencimento_parcela_str
                 ]
                 linhas_a_adicionar.append(nova_linha)
-                proximo_id += 1
+                proximo_id_despesa += 1
 
             despesas_ws = sheet.worksheet("Lancamentos_Despesas")
             despesas_ws.append_rows(linhas_a_adicionar, value_input_option='USER_ENTERED')
-            clear_all_caches()
+            clear_all_caches(estudio)
+            atualizar_resumo_mensal(estudio, despesas=[(linha[4], linha[5]) for linha in linhas_a_adicionar])
 
             st.success(f"Despesa '{descricao}' lançada com sucesso em {num_parcelas} parcela(s)!")
             st.balloons()
@@ -804,19 +1106,25 @@ def pagina_presenca():
     st.title("Registrar Presença e Evolução da Aula")
 
     try:
-        df_matriculas = load_matriculas()
+        df_matriculas = load_matriculas(estudio)
         df_ativas = df_matriculas[df_matriculas['Status'].str.lower() == 'ativa']
         if df_ativas.empty:
             st.warning("Nenhuma aluna 'Ativa' encontrada para registrar a presença.")
             st.stop()
-        dict_alunas = pd.Series(df_ativas.ID.values, index=df_ativas.Nome).to_dict()
     except Exception as e:
         st.error(f"Erro ao carregar lista de alunas: {e}")
         st.stop()
 
+    modo_registro = st.radio("Modo de registro:", ["Aluno(a) Individual", "Turma Completa"],
+                             index=0, horizontal=True)
+
+    if modo_registro == "Turma Completa":
+        registrar_presenca_turma()
+        return
+
+    aluno_selecionado = selecionar_aluno("Aluno(a)*", "presenca", status=('ativa',))
+
     with st.form("presenca_form", clear_on_submit=True):
-        nome_selecionado = st.selectbox("Aluno(a)*", options=dict_alunas.keys(), index=None,
-                                        placeholder="Selecione a aluna...")
         col1, col2 = st.columns(2)
         with col1:
             data_aula = st.date_input("Data da Aula*", value=datetime.now())
@@ -827,24 +1135,17 @@ def pagina_presenca():
         submitted = st.form_submit_button("Registrar Presença e Salvar Notas")
 
     if submitted:
-        if not nome_selecionado:
+        if not aluno_selecionado:
             st.warning("Por favor, selecione a aluna.")
             st.stop()
 
-        horario_minimo = dt_time(6, 0)
-        horario_maximo = dt_time(21, 0)
-        if not (horario_minimo <= horario_inicio <= horario_maximo):
-            st.error(f"Horário inválido! Insira um horário entre {horario_minimo:%H:%M} e {horario_maximo:%H:%M}.")
+        if not horario_aula_valido(horario_inicio):
             st.stop()
 
         try:
-            id_aluna_selecionada = dict_alunas[nome_selecionado]
-            df_presencas = load_presencas()
-            if df_presencas.empty or 'ID_Presenca' not in df_presencas.columns or df_presencas[
-                'ID_Presenca'].isnull().all():
-                novo_id_presenca = 1
-            else:
-                novo_id_presenca = int(df_presencas['ID_Presenca'].max()) + 1
+            id_aluna_selecionada = aluno_selecionado['ID']
+            nome_selecionado = aluno_selecionado['Nome']
+            novo_id_presenca = reservar_ids_presenca(1)
 
             nova_linha = [
                 novo_id_presenca, id_aluna_selecionada, nome_selecionado,
@@ -853,7 +1154,7 @@ def pagina_presenca():
             presencas_ws = sheet.worksheet("Presencas_Evolucao")
             presencas_ws.append_row([str(item) for item in nova_linha], value_input_option='USER_ENTERED')
 
-            clear_all_caches()
+            clear_all_caches(estudio)
             st.success(f"Presença e notas da aluna {nome_selecionado} salvas com sucesso!")
             st.balloons()
             time.sleep(2)
@@ -863,35 +1164,123 @@ def pagina_presenca():
             st.error(f"Erro ao salvar presença: {e}")
 
 
-# -----------------------------------------------------
-# === PÁGINA: LANÇAR PAGAMENTO (CORRIGIDA DEFINITIVA) ===
-# -----------------------------------------------------
-def pagina_lancar_pagamento():
-    st.title("💰 Lançar Pagamento Recebido")
-    try:
-        df_matriculas = load_matriculas()
-        df_taxas = load_taxas()  # Carrega a nova tabela de taxas
+def horario_aula_valido(horario_inicio):
+    """Valida se o horário da aula está dentro do funcionamento do studio (exibe o erro se não estiver)."""
+    horario_minimo = dt_time(6, 0)
+    horario_maximo = dt_time(21, 0)
+    if not (horario_minimo <= horario_inicio <= horario_maximo):
+        st.error(f"Horário inválido! Insira um horário entre {horario_minimo:%H:%M} e {horario_maximo:%H:%M}.")
+        return False
+    return True
 
-        df_ativas = df_matriculas[df_matriculas['Status'].str.lower() == 'ativa']
-        if df_ativas.empty:
-            st.warning("Nenhuma aluna 'Ativa' encontrada para lançar pagamento.")
+
+@st.cache_resource
+def _reserva_ids_presenca(estudio):
+    """Próximo ID ainda não entregue a nenhuma sessão deste processo (None = só o que está na aba)."""
+    return {'proximo': None, 'lock': threading.Lock()}
+
+
+def reservar_ids_presenca(quantidade):
+    """Reserva um bloco de 'quantidade' IDs livres na aba Presencas_Evolucao e retorna o primeiro.
+
+    O bloco fica reservado no processo: duas sessões gravando ao mesmo tempo (antes de a aba
+    ser relida) recebem blocos diferentes. Um bloco cuja gravação falhou só deixa um buraco.
+    """
+    reserva = _reserva_ids_presenca(estudio)
+    with reserva['lock']:
+        primeiro = proximo_id(estudio, load_presencas(estudio), 'ID_Presenca', "Presencas_Evolucao")
+        if reserva['proximo'] is not None:
+            primeiro = max(primeiro, reserva['proximo'])
+        reserva['proximo'] = primeiro + quantidade
+    return primeiro
+
+
+def adicionar_a_turma(aluno):
+    """Inclui o(a) aluno(a) na turma em montagem e limpa a busca para o(a) próximo(a)."""
+    st.session_state["turma_presenca"][aluno['ID']] = aluno['Nome']
+    st.session_state["busca_turma"] = ""
+
+
+def registrar_presenca_turma():
+    """Registra a presença de uma turma inteira com um único append_rows.
+
+    A turma é montada pela busca (um(a) aluno(a) por vez) e guardada na sessão: o navegador
+    só recebe os nomes de quem já está nela, não a lista de todos os ativos.
+    """
+    st.subheader("Presença da Turma")
+    nomes_por_id = st.session_state.setdefault("turma_presenca", {})
+
+    col_busca, col_botao = st.columns([4, 1], vertical_alignment="bottom")
+    with col_busca:
+        aluno = selecionar_aluno("Aluno(a) da turma", "turma", status=('ativa',))
+    with col_botao:
+        st.button("➕ Adicionar", disabled=aluno is None or aluno['ID'] in nomes_por_id,
+                  on_click=adicionar_a_turma, args=(aluno,), use_container_width=True)
+
+    ids_turma = st.multiselect("Alunos(as) presentes*", options=list(nomes_por_id), default=list(nomes_por_id),
+                               format_func=lambda id_aluno: f"{nomes_por_id[id_aluno]} (ID {id_aluno})",
+                               placeholder="Busque e adicione os alunos(as) da aula acima...")
+    # Quem foi tirado(a) da lista sai da turma
+    for id_aluno in [id_aluno for id_aluno in nomes_por_id if id_aluno not in ids_turma]:
+        del nomes_por_id[id_aluno]
+
+    with st.form("presenca_turma_form", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            data_aula = st.date_input("Data da Aula*", value=datetime.now())
+        with col2:
+            horario_inicio = st.time_input("Horário da Aula*", value=dt_time(8, 0))
+
+        notas_por_aluno = {}
+        if ids_turma:
+            st.markdown("##### Anotações / Evolução (opcional)")
+            for id_aluno in ids_turma:
+                notas_por_aluno[id_aluno] = st.text_input(nomes_por_id[id_aluno], key=f"nota_turma_{id_aluno}",
+                                                          placeholder="Evolução da aula...")
+        submitted = st.form_submit_button("Registrar Presença da Turma")
+
+    if submitted:
+        if not ids_turma:
+            st.warning("Por favor, selecione ao menos um(a) aluno(a).")
             st.stop()
-        if df_taxas.empty:
-            st.error("Tabela 'Config_Taxas' não encontrada ou vazia. Não é possível calcular taxas.")
+
+        if not horario_aula_valido(horario_inicio):
             st.stop()
 
-        dict_alunas = pd.Series(df_ativas.ID.values, index=df_ativas.Nome).to_dict()
+        try:
+            # Reserva o bloco de IDs de uma vez só (uma única leitura da aba)
+            primeiro_id = reservar_ids_presenca(len(ids_turma))
+            data_aula_str = data_aula.strftime("%Y-%m-%d")
+            horario_str = horario_inicio.strftime("%H:%M:%S")
 
-    except gspread.exceptions.WorksheetNotFound:
-        st.error("Erro Crítico: Aba 'Config_Taxas' não foi encontrada. Crie-a conforme as instruções.")
-        st.stop()
-    except Exception as e:
-        st.error(f"Erro ao carregar dados: {e}")
-        st.stop()
+            linhas_presenca = []
+            for offset, id_aluno in enumerate(ids_turma):
+                nova_linha = [
+                    primeiro_id + offset, id_aluno, nomes_por_id[id_aluno],
+                    data_aula_str, horario_str, notas_por_aluno.get(id_aluno, "")
+                ]
+                linhas_presenca.append([str(item) for item in nova_linha])
 
-    with st.expander("🕵️ Raio-X da Tabela de Taxas (Debug)"):
-        st.dataframe(df_taxas)
+            presencas_ws = sheet.worksheet("Presencas_Evolucao")
+            presencas_ws.append_rows(linhas_presenca, value_input_option='USER_ENTERED')
+
+            clear_all_caches(estudio)
+            st.session_state["turma_presenca"] = {}
+            st.success(f"Presença de {len(linhas_presenca)} aluno(s) registrada com sucesso!")
+            st.balloons()
+            time.sleep(2)
+            st.rerun()
 
+        except Exception as e:
+            st.error(f"Erro ao salvar presença da turma: {e}")
+
+
+# -----------------------------------------------------
+# === PÁGINA: LANÇAR PAGAMENTO (CORRIGIDA DEFINITIVA) ===
+# -----------------------------------------------------
+@st.fragment
+def formulario_pagamento(indice_taxas):
+    """Formulário de pagamento; escolher bandeira/tipo/parcela reexecuta só este trecho."""
     # Inicializa variáveis
     valor_liquido_calculado = 0.0
     taxa_percentual = 0.0
@@ -900,8 +1289,8 @@ def pagina_lancar_pagamento():
     col1, col2 = st.columns(2)
 
     with col1:
-        nome_selecionado = st.selectbox("Aluno(a)*", options=dict_alunas.keys(), index=None,
-                                        placeholder="Selecione a aluna...")
+        aluno_selecionado = selecionar_aluno("Aluno(a)*", "pagamento", status=('ativa',))
+        nome_selecionado = aluno_selecionado['Nome'] if aluno_selecionado else None
         valor_pago_bruto = st.number_input("Valor Pago (Bruto) (R$)*", min_value=0.01, format="%.2f", value=None)
         mes_competencia = st.selectbox(
             "Mês de Competência*",
@@ -922,13 +1311,13 @@ def pagina_lancar_pagamento():
 
     # --- Coluna 1: Bandeira ---
     with col_taxa1:
-        opcoes_bandeira = df_taxas['Bandeira'].unique()
+        opcoes_bandeira = indice_taxas['bandeiras']
         bandeira_selecionada = st.selectbox("Bandeira*", options=opcoes_bandeira, index=None,
                                             placeholder="Selecione...")
 
     # --- Coluna 2: Tipo (Depende da Bandeira) ---
     if bandeira_selecionada:
-        opcoes_tipo = df_taxas[df_taxas['Bandeira'] == bandeira_selecionada]['Tipo'].unique()
+        opcoes_tipo = indice_taxas['tipos'].get(bandeira_selecionada, [])
         with col_taxa2:
             # key dinâmica força o reset se a bandeira mudar
             tipo_selecionado = st.selectbox("Tipo*", options=opcoes_tipo, index=None,
@@ -940,10 +1329,7 @@ def pagina_lancar_pagamento():
 
     # --- Coluna 3: Parcela (Depende da Bandeira E Tipo) ---
     if bandeira_selecionada and tipo_selecionado:
-        opcoes_parcela = df_taxas[
-            (df_taxas['Bandeira'] == bandeira_selecionada) &
-            (df_taxas['Tipo'] == tipo_selecionado)
-            ]['Parcela'].unique()
+        opcoes_parcela = indice_taxas['parcelas'].get((bandeira_selecionada, tipo_selecionado), [])
         with col_taxa3:
             # key dinâmica força o reset se a bandeira ou tipo mudarem
             parcela_selecionada = st.selectbox("Parcela*", options=opcoes_parcela, index=0,
@@ -959,13 +1345,10 @@ def pagina_lancar_pagamento():
 
     if valor_bruto_calculo > 0 and bandeira_selecionada and tipo_selecionado and parcela_selecionada:
         try:
-            taxa_row = df_taxas[
-                (df_taxas['Bandeira'] == bandeira_selecionada) &
-                (df_taxas['Tipo'] == tipo_selecionado) &
-                (df_taxas['Parcela'] == parcela_selecionada)
-                ]
-            if not taxa_row.empty:
-                taxa_percentual = taxa_row['Taxa'].iloc[0]
+            taxa_encontrada = calculos.buscar_taxa(indice_taxas, bandeira_selecionada, tipo_selecionado,
+                                                   parcela_selecionada)
+            if taxa_encontrada is not None:
+                taxa_percentual = taxa_encontrada
                 valor_taxa = valor_bruto_calculo * taxa_percentual
                 valor_liquido_calculado = valor_bruto_calculo - valor_taxa
 
@@ -990,16 +1373,12 @@ def pagina_lancar_pagamento():
 
         # Recalcula os valores finais para garantir que estão corretos
         try:
-            taxa_row = df_taxas[
-                (df_taxas['Bandeira'] == bandeira_selecionada) &
-                (df_taxas['Tipo'] == tipo_selecionado) &
-                (df_taxas['Parcela'] == parcela_selecionada)
-                ]
-            if taxa_row.empty:
+            taxa_percentual_final = calculos.buscar_taxa(indice_taxas, bandeira_selecionada, tipo_selecionado,
+                                                         parcela_selecionada)
+            if taxa_percentual_final is None:
                 st.error("Erro ao salvar: Combinação de taxa não encontrada. Verifique 'Config_Taxas'.")
                 st.stop()
 
-            taxa_percentual_final = taxa_row['Taxa'].iloc[0]
             valor_taxa_final = valor_pago_bruto * taxa_percentual_final
             valor_liquido_final = valor_pago_bruto - valor_taxa_final
         except Exception:
@@ -1007,21 +1386,13 @@ def pagina_lancar_pagamento():
             st.stop()
 
         # Constrói o nome da forma de pagamento
-        forma_pagamento_str = f"{bandeira_selecionada}"
-        if tipo_selecionado != 'N/A':
-            forma_pagamento_str += f" - {tipo_selecionado}"
-        if parcela_selecionada != 'N/A' and parcela_selecionada != '1x':
-            forma_pagamento_str += f" {parcela_selecionada}"
+        forma_pagamento_str = calculos.montar_forma_pagamento(bandeira_selecionada, tipo_selecionado,
+                                                              parcela_selecionada)
 
         try:
-            id_aluna_selecionada = dict_alunas[nome_selecionado]
-            df_pagamentos = load_pagamentos()
-
-            if df_pagamentos.empty or 'ID_Pagamento' not in df_pagamentos.columns or df_pagamentos[
-                'ID_Pagamento'].isnull().all():
-                novo_id_pagamento = 1
-            else:
-                novo_id_pagamento = int(df_pagamentos['ID_Pagamento'].max()) + 1
+            id_aluna_selecionada = aluno_selecionado['ID']
+            novo_id_pagamento = proximo_id(estudio, load_pagamentos(estudio), 'ID_Pagamento',
+                                           "Pagamentos_Recebidos")
 
             nova_linha = [
                 novo_id_pagamento, id_aluna_selecionada, nome_selecionado,
@@ -1034,7 +1405,8 @@ def pagina_lancar_pagamento():
             pagamentos_ws = sheet.worksheet("Pagamentos_Recebidos")
             pagamentos_ws.append_row([str(item) for item in nova_linha], value_input_option='USER_ENTERED')
 
-            clear_all_caches()
+            clear_all_caches(estudio)
+            atualizar_resumo_mensal(estudio, pagamentos=[(mes_competencia, ano_competencia)])
             st.success(
                 f"Pagamento (Bruto: R$ {valor_pago_bruto:,.2f} | Líquido: R$ {valor_liquido_final:,.2f}) para {nome_selecionado} lançado com sucesso!")
             st.balloons()
@@ -1045,116 +1417,374 @@ def pagina_lancar_pagamento():
             st.error("Verifique se a aba 'Pagamentos_Recebidos' tem 10 colunas (terminando em 'Valor_Liquido').")
 
 
+def pagina_lancar_pagamento():
+    st.title("💰 Lançar Pagamento Recebido")
+    try:
+        df_matriculas = load_matriculas(estudio)
+        df_taxas = load_taxas(estudio)  # Carrega a nova tabela de taxas
+        indice_taxas = load_indice_taxas(estudio)
+
+        df_ativas = df_matriculas[df_matriculas['Status'].str.lower() == 'ativa']
+        if df_ativas.empty:
+            st.warning("Nenhuma aluna 'Ativa' encontrada para lançar pagamento.")
+            st.stop()
+        if df_taxas.empty:
+            st.error("Tabela 'Config_Taxas' não encontrada ou vazia. Não é possível calcular taxas.")
+            st.stop()
+
+    except gspread.exceptions.WorksheetNotFound:
+        st.error("Erro Crítico: Aba 'Config_Taxas' não foi encontrada. Crie-a conforme as instruções.")
+        st.stop()
+    except Exception as e:
+        st.error(f"Erro ao carregar dados: {e}")
+        st.stop()
+
+    with st.expander("🕵️ Raio-X da Tabela de Taxas (Debug)"):
+        st.dataframe(df_taxas)
+
+    formulario_pagamento(indice_taxas)
+
+
 # -----------------------------------------------------
 # PÁGINA: PAGAR CONTAS (BAIXA)
 # -----------------------------------------------------
+def lista_contas_a_pagar():
+    """Filtros e baixa das contas; lê só as despesas do mês filtrado."""
+    st.subheader("Filtrar Contas a Pagar")
+    status_filtro_opcoes = ["Pendente", "Parcial", "Pago"]
+    status_selecionado = st.multiselect("Filtrar por Status", options=status_filtro_opcoes,
+                                        default=["Pendente", "Parcial"])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        mes_selecionado = st.selectbox("Mês de Competência", options=LISTA_MESES_NOMES.keys(),
+                                       format_func=lambda mes: f"{mes} - {LISTA_MESES_NOMES[mes]}",
+                                       index=MES_ATUAL - 1)
+    with col2:
+        ano_selecionado = st.number_input("Ano de Competência", min_value=2024, value=ANO_ATUAL, step=1)
+
+    df_contas_mes = load_despesas_do_mes(estudio, int(mes_selecionado), int(ano_selecionado))
+    if status_selecionado and not df_contas_mes.empty:
+        df_contas_mes = df_contas_mes[df_contas_mes['Status_Pagamento'].isin(status_selecionado)]
+    if not df_contas_mes.empty:
+        df_contas_mes = df_contas_mes.sort_values(by="ID", ascending=False)
+
+    if df_contas_mes.empty:
+        st.info(
+            f"Nenhuma conta encontrada com o status '{', '.join(status_selecionado)}' para {LISTA_MESES_NOMES[mes_selecionado]}/{ano_selecionado}.")
+        st.stop()
+
+    st.info(f"Exibindo {len(df_contas_mes)} conta(s).")
+
+    for _, conta in df_contas_mes.iterrows():
+        id_despesa = conta['ID']
+        valor_previsto = conta['Valor']
+        valor_pago = conta['Valor_Pago']
+        saldo_devedor = valor_previsto - valor_pago
+
+        st.divider()
+        col1, col2, col3 = st.columns(3)
+        col1.markdown(f"**{conta['Descricao']}** (ID: {id_despesa})")
+        col2.metric("Previsto", f"R$ {valor_previsto:,.2f}")
+
+        if conta['Status_Pagamento'] == "Pendente":
+            col3.metric("A Pagar", f"R$ {saldo_devedor:,.2f}", delta_color="inverse")
+        elif conta['Status_Pagamento'] == "Parcial":
+            col3.metric("A Pagar", f"R$ {saldo_devedor:,.2f}", delta=f"Pago: R$ {valor_pago:,.2f}",
+                        delta_color="inverse")
+        else:
+            col3.metric("Pago", f"R$ {valor_pago:,.2f}", delta_color="normal")
+
+        if conta['Status_Pagamento'] != "Pago":
+            with st.expander("Pagar/Registrar Baixa desta Conta"):
+                with st.form(f"form_pagar_despesa_{id_despesa}", clear_on_submit=True):
+                    st.write(f"Pagando: {conta['Descricao']}")
+
+                    col_form_1, col_form_2 = st.columns(2)
+                    with col_form_1:
+                        data_pagamento = st.date_input("Data do Pagamento*", value=datetime.now())
+                        forma_pagamento = st.selectbox("Forma de Pagamento*",
+                                                       ["PIX", "Boleto", "Cartão de Débito", "Dinheiro",
+                                                        "Cartão de Crédito", "Transferência"],
+                                                       index=None, placeholder="Selecione...")
+                    with col_form_2:
+                        valor_a_pagar = st.number_input("Valor Pago*", min_value=0.01, value=float(saldo_devedor),
+                                                        format="%.2f")
+
+                    submitted_pagar = st.form_submit_button("Confirmar Pagamento")
+
+                if submitted_pagar:
+                    if not data_pagamento or not forma_pagamento or not valor_a_pagar:
+                        st.warning("Preencha todos os campos do pagamento.")
+                        st.stop()
+
+                    novo_valor_pago_total = valor_pago + valor_a_pagar
+                    novo_status = "Pago"
+
+                    if novo_valor_pago_total < valor_previsto:
+                        novo_status = "Parcial"
+                    elif novo_valor_pago_total > valor_previsto:
+                        st.warning(
+                            f"O valor pago (R$ {novo_valor_pago_total:,.2f}) é maior que o previsto (R$ {valor_previsto:,.2f}). Registrando como 'Pago'.")
+
+                    dados_baixa = {
+                        "Status_Pagamento": novo_status,
+                        "Data_Pagamento": data_pagamento.strftime("%Y-%m-%d"),
+                        "Valor_Pago": novo_valor_pago_total,
+                        "Forma_Pagamento": forma_pagamento
+                    }
+
+                    if atualizar_lancamento_despesa(id_despesa, dados_baixa):
+                        st.success(f"Pagamento da despesa '{conta['Descricao']}' registrado com sucesso!")
+                        clear_all_caches(estudio)
+                        atualizar_resumo_mensal(estudio, despesas=[(int(conta['Mes_Competencia']),
+                                                                           int(conta['Ano_Competencia']))])
+                        time.sleep(1)
+                        st.rerun()
+                    else:
+                        st.error("Falha ao registrar o pagamento.")
+
+
 def pagina_contas_a_pagar():
     st.title("🧾 Pagar Contas (Baixa de Despesas)")
     st.write("Aqui você confirma o pagamento das contas provisionadas.")
 
+    # Antes da lista: ela para a página (st.stop) quando o filtro não encontra contas
+    secao_exportacao("export_contas", {"Despesas": tabela_despesas_periodo})
+
     try:
-        df_despesas = load_despesas()
-        if df_despesas.empty:
-            st.info("Nenhuma despesa lançada no sistema.")
-            st.stop()
+        lista_contas_a_pagar()
+    except Exception as e:
+        st.exception(f"Ocorreu um erro inesperado ao carregar as contas a pagar: {e}")
+
+
+# -----------------------------------------------------
+# GRÁFICOS DO DASHBOARD (especificações Vega-Lite em cache)
+# -----------------------------------------------------
+# Cada gráfico é montado uma vez por (mês, ano) a partir de dados já agregados
+# e guardado como dict; os reruns só reenviam a especificação pronta.
+@st.cache_data(ttl=300)
+def spec_fluxo_mes(estudio, mes, ano):
+    """Barras de receita/gasto previstos e realizados do mês."""
+    totais = totais_do_mes(estudio, mes, ano)
+    tipos = ['Receita Prevista', 'Receita Realizada (Líquida)', 'Gasto Previsto', 'Gasto Realizado']
+    df_fluxo_mes = pd.DataFrame({
+        'Tipo': tipos,
+        'Valor': [totais['receita_prevista'], totais['receita_liquida'], totais['gastos_previstos'],
+                  totais['gastos_realizados']],
+    })
+    chart_fluxo_base = alt.Chart(df_fluxo_mes).encode(
+        x=alt.X('Tipo:N', title=None, axis=None),
+        y=alt.Y('Valor:Q', title='Valor (R$)'),
+        color=alt.Color('Tipo:N', legend=alt.Legend(title="Fluxo"),
+                        scale=alt.Scale(domain=tipos, range=['#1f77b4', '#2ca02c', '#ff7f0e', '#d62728']))
+    ).properties(height=350)
+    text = chart_fluxo_base.mark_text(dy=-8, color='black').encode(text=alt.Text('Valor:Q', format=",.2f"))
+    return (chart_fluxo_base.mark_bar() + text).to_dict()
+
+
+def _spec_donut(df_composicao, campo_valor, campo_cor, titulo_cor, escala):
+    """Donut com rótulos de percentual a partir de uma composição já agregada."""
+    base = alt.Chart(df_composicao).encode(theta=alt.Theta(f"{campo_valor}:Q", stack=True))
+    donut = base.mark_arc(outerRadius=100, innerRadius=60).encode(
+        color=alt.Color(f"{campo_cor}:N", title=titulo_cor, scale=escala),
+        order=alt.Order(campo_valor, sort="descending"),
+        tooltip=[campo_cor, alt.Tooltip(campo_valor, format=",.2f", title="Valor (R$)"), "Percentual"])
+    texto = base.mark_text(radius=120).encode(text=alt.Text("Percentual:N"),
+                                              order=alt.Order(campo_valor, sort="descending"),
+                                              color=alt.value("white"))
+    return (donut + texto).to_dict()
+
 
-        st.subheader("Filtrar Contas a Pagar")
-        status_filtro_opcoes = ["Pendente", "Parcial", "Pago"]
-        status_selecionado = st.multiselect("Filtrar por Status", options=status_filtro_opcoes,
-                                            default=["Pendente", "Parcial"])
+@st.cache_data(ttl=300)
+def spec_composicao_receita(estudio, mes, ano):
+    """Donut da receita prevista por plano (None se não houver receita)."""
+    df_receita = load_fluxo_mes(estudio, mes, ano)['receita']
+    if df_receita.empty or 'Plano' not in df_receita.columns:
+        return None
+    df_composicao = calculos.composicao_percentual(df_receita, 'Plano', 'Valor_Plano_Final')
+    if df_composicao.empty:
+        return None
+    return _spec_donut(df_composicao, 'Valor_Plano_Final', 'Plano', "Plano", alt.Scale(scheme='spectral'))
 
-        if not status_selecionado:
-            df_filtrado_status = df_despesas
+
+@st.cache_data(ttl=300)
+def spec_composicao_gastos(estudio, mes, ano):
+    """Donut dos gastos previstos por tipo (None se não houver gastos)."""
+    df_despesas_mes = load_fluxo_mes(estudio, mes, ano)['despesas']
+    if df_despesas_mes.empty or not {'Tipo', 'Valor'}.issubset(df_despesas_mes.columns):
+        return None
+    df_composicao = calculos.composicao_percentual(df_despesas_mes, 'Tipo', 'Valor')
+    if df_composicao.empty:
+        return None
+    return _spec_donut(df_composicao, 'Valor', 'Tipo', "Tipo de Gasto",
+                       alt.Scale(range=['#d62728', '#ff7f0e', '#9467bd']))
+
+
+@st.cache_data(ttl=300)
+def spec_projecao_descontos(estudio, mes, ano):
+    """Barras dos descontos concedidos nos próximos 12 meses."""
+    df_projecao = load_projecao_anual(estudio, mes, ano)[['Mes', 'Valor_Descontado']]
+    return alt.Chart(df_projecao).mark_bar(color='#ff7f0e').encode(
+        x=alt.X('Mes:O', title='Mês'),
+        y=alt.Y('Valor_Descontado:Q', title='Total Descontado (R$)'),
+        tooltip=['Mes', alt.Tooltip('Valor_Descontado', format=",.2f", title="Desconto (R$)")]
+    ).properties(height=300).interactive().to_dict()
+
+
+@st.cache_data(ttl=300)
+def spec_projecao_anual(estudio, mes, ano):
+    """Barras agrupadas de receita prevista vs. gastos previstos nos próximos 12 meses."""
+    df_projecao = load_projecao_anual(estudio, mes, ano)[['Mes', 'Gastos Previstos', 'Receita Prevista']]
+    df_melted = df_projecao.melt('Mes', var_name='Tipo', value_name='Valor')
+    return alt.Chart(df_melted).mark_bar().encode(
+        x=alt.X('Mes:O', title='Perspectiva 12 Meses'),
+        y=alt.Y('Valor:Q', title='Valor (R$)'),
+        color=alt.Color('Tipo:N', scale=alt.Scale(domain=['Receita Prevista', 'Gastos Previstos'],
+                                                  range=['#2ca02c', '#d62728']),
+                        legend=alt.Legend(title="Tipo de Fluxo")),
+        xOffset='Tipo:N',
+        tooltip=['Mes', 'Tipo', alt.Tooltip('Valor', format=",.2f")]
+    ).properties(height=400).interactive().to_dict()
+
+
+# -----------------------------------------------------
+# SEÇÕES SOB DEMANDA DO DASHBOARD
+# -----------------------------------------------------
+# Só calculam quando o toggle está ligado; abrir/fechar reexecuta apenas a seção.
+@st.fragment
+def secao_descontos_mes(mes, ano):
+    """Tabela dos descontos aplicados no mês."""
+    if not st.toggle("Mostrar os detalhes de descontos aplicados este mês", key="dash_descontos"):
+        return
+
+    df_receita_prevista_mes = load_fluxo_mes(estudio, mes, ano)['receita']
+    if 'Valor_Descontado' in df_receita_prevista_mes.columns:
+        df_descontos_mes = df_receita_prevista_mes[df_receita_prevista_mes['Valor_Descontado'] > 0]
+    else:
+        df_descontos_mes = pd.DataFrame()
+
+    if df_descontos_mes.empty:
+        st.info("Nenhum desconto aplicado para alunas ativas este mês.")
+    else:
+        cols_desc_report = ['Nome', 'Plano', 'Preco_Mensal', 'Desconto_Percentual', 'Valor_Descontado',
+                            'Justificativa_Desconto']
+        cols_desc_exist = [col for col in cols_desc_report if col in df_descontos_mes.columns]
+        st.dataframe(df_descontos_mes[cols_desc_exist], use_container_width=True,
+                     column_config={
+                         'Preco_Mensal': coluna_reais("Plano (Valor Cheio)"),
+                         'Desconto_Percentual': coluna_percentual("Desc. (%)"),
+                         'Valor_Descontado': coluna_reais("Valor (R$)"),
+                     })
+
+
+@st.fragment
+def secao_graficos_financeiro(mes, ano):
+    """Donuts de composição, projeção de 12 meses e tabela de gastos do mês."""
+    if not st.toggle("Mostrar Gráficos de Composição e Projeção Anual", key="dash_graficos"):
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Composição da Receita (Prevista, com desc.)")
+        spec_receita = spec_composicao_receita(estudio, mes, ano)
+        if spec_receita:
+            st.vega_lite_chart(spec_receita, use_container_width=True)
         else:
-            df_filtrado_status = df_despesas[df_despesas['Status_Pagamento'].isin(status_selecionado)]
+            st.info("Nenhuma receita prevista para este mês.")
 
-        col1, col2 = st.columns(2)
-        with col1:
-            mes_selecionado = st.selectbox("Mês de Competência", options=LISTA_MESES_NOMES.keys(),
-                                           format_func=lambda mes: f"{mes} - {LISTA_MESES_NOMES[mes]}",
-                                           index=MES_ATUAL - 1)
-        with col2:
-            ano_selecionado = st.number_input("Ano de Competência", min_value=2024, value=ANO_ATUAL, step=1)
+    with col2:
+        st.subheader(f"Composição dos Gastos (Previstos)")
+        spec_gastos = spec_composicao_gastos(estudio, mes, ano)
+        if spec_gastos:
+            st.vega_lite_chart(spec_gastos, use_container_width=True)
+        else:
+            st.info("Nenhum gasto previsto para este mês.")
 
-        df_contas_mes = df_filtrado_status[
-            (df_filtrado_status['Mes_Competencia'] == mes_selecionado) &
-            (df_filtrado_status['Ano_Competencia'] == ano_selecionado)
-            ].sort_values(by="ID", ascending=False)
+    st.divider()
 
-        if df_contas_mes.empty:
-            st.info(
-                f"Nenhuma conta encontrada com o status '{', '.join(status_selecionado)}' para {LISTA_MESES_NOMES[mes_selecionado]}/{ano_selecionado}.")
-            st.stop()
+    # Perspectiva Anual
+    st.subheader(f"Perspectiva Anual (Iniciando em {LISTA_MESES_NOMES[mes]}/{ano})")
 
-        st.info(f"Exibindo {len(df_contas_mes)} conta(s).")
+    st.markdown("#### Projeção de Descontos Concedidos (12 Meses)")
+    st.vega_lite_chart(spec_projecao_descontos(estudio, mes, ano), use_container_width=True)
 
-        for _, conta in df_contas_mes.iterrows():
-            id_despesa = conta['ID']
-            valor_previsto = conta['Valor']
-            valor_pago = conta['Valor_Pago']
-            saldo_devedor = valor_previsto - valor_pago
+    st.markdown("#### Projeção de Receita Prevista vs. Gastos Previstos (12 Meses)")
+    st.vega_lite_chart(spec_projecao_anual(estudio, mes, ano), use_container_width=True)
 
-            st.divider()
-            col1, col2, col3 = st.columns(3)
-            col1.markdown(f"**{conta['Descricao']}** (ID: {id_despesa})")
-            col2.metric("Previsto", f"R$ {valor_previsto:,.2f}")
+    if st.toggle("Mostrar Tabela de Detalhes de Gastos (Previstos) do Mês", key="dash_gastos"):
+        st.subheader(f"Contas a Pagar Lançadas em {LISTA_MESES_NOMES[mes]}")
+        df_despesas_mes = load_fluxo_mes(estudio, mes, ano)['despesas']
+        cols_gastos = ['ID', 'Descricao', 'Valor', 'Status_Pagamento', 'Valor_Pago', 'Data_Vencimento',
+                       'Recorrente', 'Tipo']
+        cols_gastos_existem = [col for col in cols_gastos if col in df_despesas_mes.columns]
+        st.dataframe(df_despesas_mes[cols_gastos_existem], use_container_width=True,
+                     column_config={'Valor': coluna_reais("Valor"), 'Valor_Pago': coluna_reais("Valor_Pago")})
 
-            if conta['Status_Pagamento'] == "Pendente":
-                col3.metric("A Pagar", f"R$ {saldo_devedor:,.2f}", delta_color="inverse")
-            elif conta['Status_Pagamento'] == "Parcial":
-                col3.metric("A Pagar", f"R$ {saldo_devedor:,.2f}", delta=f"Pago: R$ {valor_pago:,.2f}",
-                            delta_color="inverse")
-            else:
-                col3.metric("Pago", f"R$ {valor_pago:,.2f}", delta_color="normal")
-
-            if conta['Status_Pagamento'] != "Pago":
-                with st.expander("Pagar/Registrar Baixa desta Conta"):
-                    with st.form(f"form_pagar_despesa_{id_despesa}", clear_on_submit=True):
-                        st.write(f"Pagando: {conta['Descricao']}")
-
-                        col_form_1, col_form_2 = st.columns(2)
-                        with col_form_1:
-                            data_pagamento = st.date_input("Data do Pagamento*", value=datetime.now())
-                            forma_pagamento = st.selectbox("Forma de Pagamento*",
-                                                           ["PIX", "Boleto", "Cartão de Débito", "Dinheiro",
-                                                            "Cartão de Crédito", "Transferência"],
-                                                           index=None, placeholder="Selecione...")
-                        with col_form_2:
-                            valor_a_pagar = st.number_input("Valor Pago*", min_value=0.01, value=float(saldo_devedor),
-                                                            format="%.2f")
-
-                        submitted_pagar = st.form_submit_button("Confirmar Pagamento")
-
-                    if submitted_pagar:
-                        if not data_pagamento or not forma_pagamento or not valor_a_pagar:
-                            st.warning("Preencha todos os campos do pagamento.")
-                            st.stop()
-
-                        novo_valor_pago_total = valor_pago + valor_a_pagar
-                        novo_status = "Pago"
-
-                        if novo_valor_pago_total < valor_previsto:
-                            novo_status = "Parcial"
-                        elif novo_valor_pago_total > valor_previsto:
-                            st.warning(
-                                f"O valor pago (R$ {novo_valor_pago_total:,.2f}) é maior que o previsto (R$ {valor_previsto:,.2f}). Registrando como 'Pago'.")
-
-                        dados_baixa = {
-                            "Status_Pagamento": novo_status,
-                            "Data_Pagamento": data_pagamento.strftime("%Y-%m-%d"),
-                            "Valor_Pago": novo_valor_pago_total,
-                            "Forma_Pagamento": forma_pagamento
-                        }
-
-                        if atualizar_lancamento_despesa(id_despesa, dados_baixa):
-                            st.success(f"Pagamento da despesa '{conta['Descricao']}' registrado com sucesso!")
-                            clear_all_caches()
-                            time.sleep(1)
-                            st.rerun()
-                        else:
-                            st.error("Falha ao registrar o pagamento.")
-    except Exception as e:
-        st.exception(f"Ocorreu um erro inesperado ao carregar as contas a pagar: {e}")
+
+# -----------------------------------------------------
+# EXPORTAÇÃO PARA A CONTABILIDADE (CSV / XLSX / PARQUET)
+# -----------------------------------------------------
+# As tabelas saem dos mesmos loaders em cache das páginas (já tipados, sem nova
+# leitura da planilha); abas arquivadas só são lidas quando o período chega nelas.
+# Pagamentos e despesas entram pelo mês de competência; contratos pela data de início.
+def tabela_pagamentos_periodo(inicio, fim):
+    anos = range(inicio.year, fim.year + 1)
+    df = com_anos_arquivados(estudio, load_pagamentos, "Pagamentos_Recebidos", anos)
+    return exportacao.filtrar_competencias(df, inicio, fim)
+
+
+def tabela_despesas_periodo(inicio, fim):
+    anos = range(inicio.year, fim.year + 1)
+    df = com_anos_arquivados(estudio, load_despesas, "Lancamentos_Despesas", anos)
+    return exportacao.filtrar_competencias(df, inicio, fim)
+
+
+def tabela_contratos_periodo(inicio, fim):
+    df = load_historico_renovacoes(estudio)
+    if df.empty:
+        return df
+    no_periodo = df['Data_Inicio_Contrato'].between(pd.Timestamp(inicio), pd.Timestamp(fim))
+    return df[no_periodo].sort_values(by='Data_Inicio_Contrato', kind='stable')
+
+
+@st.fragment
+def secao_exportacao(chave, tabelas):
+    """Gera o arquivo de uma das `tabelas` ({nome: função(inicio, fim)}) no período; reexecuta só esta seção."""
+    with st.expander("⬇️ Exportar para a Contabilidade"):
+        col1, col2 = st.columns(2)
+        with col1:
+            nome_tabela = st.selectbox("Dados", list(tabelas), key=f"{chave}_tabela")
+            periodo = st.date_input("Período", value=(hoje.date().replace(month=1, day=1), hoje.date()),
+                                    format="DD/MM/YYYY", key=f"{chave}_periodo",
+                                    help="Pagamentos e despesas entram pelo mês de competência.")
+        with col2:
+            formatos = exportacao.formatos_disponiveis()
+            formato = st.radio("Formato", formatos, horizontal=True, key=f"{chave}_formato")
+            if 'Excel (XLSX)' not in formatos:
+                st.caption("Para exportar em Excel, instale o pacote openpyxl.")
+
+        if len(periodo) != 2:
+            st.info("Selecione a data inicial e a data final.")
+            return
+        inicio, fim = periodo
+        pedido = (estudio, nome_tabela, inicio, fim, formato)
+
+        if st.button("Gerar arquivo", key=f"{chave}_gerar"):
+            df = tabelas[nome_tabela](inicio, fim)
+            with exportacao.exportar(df, formato, nome_aba=nome_tabela) as arquivo:
+                conteudo = arquivo.read()
+            extensao, mime = exportacao.FORMATOS[formato]
+            nome_arquivo = f"{nome_tabela.lower().replace(' ', '_')}_{inicio:%Y%m%d}_{fim:%Y%m%d}.{extensao}"
+            st.session_state[f"{chave}_arquivo"] = {'pedido': pedido, 'dados': conteudo, 'nome': nome_arquivo,
+                                                   'mime': mime, 'linhas': len(df)}
+
+        # Arquivo gerado para outro período/formato não é oferecido
+        pronto = st.session_state.get(f"{chave}_arquivo")
+        if pronto and pronto['pedido'] == pedido:
+            st.caption(f"{pronto['linhas']} linha(s) exportada(s).")
+            st.download_button(f"Baixar {pronto['nome']}", pronto['dados'], file_name=pronto['nome'],
+                               mime=pronto['mime'], on_click="ignore", key=f"{chave}_baixar")
 
 
 # -----------------------------------------------------
@@ -1164,11 +1794,6 @@ def pagina_financeiro():
     st.title("📈 Dashboard Financeiro")
 
     try:
-        df_planos = load_planos()
-        df_matriculas = load_matriculas()
-        df_despesas = load_despesas()
-        df_pagamentos = load_pagamentos()
-
         st.subheader("Análise de Fluxo de Caixa (Realizado vs. Previsto)")
         col1, col2 = st.columns(2)
         with col1:
@@ -1177,74 +1802,18 @@ def pagina_financeiro():
                                            index=MES_ATUAL - 1)
         with col2:
             ano_selecionado = st.number_input("Ano de Competência", min_value=2024, value=ANO_ATUAL, step=1)
+        mes_selecionado, ano_selecionado = int(mes_selecionado), int(ano_selecionado)
 
-        data_filtro_inicio = datetime(ano_selecionado, mes_selecionado, 1)
-        ultimo_dia = calendar.monthrange(ano_selecionado, mes_selecionado)[1]
-        data_filtro_fim = datetime(ano_selecionado, mes_selecionado, ultimo_dia)
-
-        # Cálculo de Receita Prevista
-        total_receita_prevista = 0
-        total_descontado_mes = 0
-        df_receita_prevista_mes = pd.DataFrame()
-        if not df_planos.empty and not df_matriculas.empty:
-            df_ativas = df_matriculas[df_matriculas.get('Status', pd.Series(dtype=str)).str.lower() == 'ativa']
-            df_receita_join = df_ativas.merge(df_planos, left_on='Plano', right_on='Plano')
-
-            if 'Data_Inicio' in df_receita_join.columns and 'Duracao_Meses' in df_receita_join.columns:
-                df_receita_join['Data_Fim'] = df_receita_join.apply(
-                    lambda row: row['Data_Inicio'] + pd.DateOffset(months=int(row['Duracao_Meses']))
-                    if pd.notna(row['Data_Inicio']) else pd.NaT, axis=1)
-                df_receita_join = df_receita_join.dropna(subset=['Data_Inicio', 'Data_Fim'])
-
-                df_receita_prevista_mes = df_receita_join[
-                    (df_receita_join['Data_Inicio'] <= data_filtro_fim) &
-                    (df_receita_join['Data_Fim'] > data_filtro_inicio)]
-
-                if not df_receita_prevista_mes.empty:
-                    preco_col = df_receita_prevista_mes.get('Preco_Mensal', 0)
-                    desc_col = df_receita_prevista_mes.get('Desconto_Percentual', 0)
-                    df_receita_prevista_mes['Valor_Plano_Final'] = preco_col * (1 - desc_col / 100)
-                    df_receita_prevista_mes['Valor_Descontado'] = preco_col - df_receita_prevista_mes[
-                        'Valor_Plano_Final']
-                    total_receita_prevista = df_receita_prevista_mes['Valor_Plano_Final'].sum()
-                    total_descontado_mes = df_receita_prevista_mes['Valor_Descontado'].sum()
-
-        # --- CÁLCULO DE RECEITA REALIZADA (ATUALIZADO) ---
-        total_receita_bruta_realizada = 0
-        total_receita_liquida_realizada = 0
-        total_taxas = 0
-        df_pagamentos_mes_filtrado = pd.DataFrame()
-        if not df_pagamentos.empty:
-            mes_selecionado_int = int(mes_selecionado)
-            ano_selecionado_int = int(ano_selecionado)
-            df_pagamentos_mes_filtrado = df_pagamentos[
-                (df_pagamentos['Mes_Competencia'] == mes_selecionado_int) &
-                (df_pagamentos['Ano_Competencia'] == ano_selecionado_int)]
-
-            if 'Valor_Pago' in df_pagamentos_mes_filtrado.columns:
-                total_receita_bruta_realizada = df_pagamentos_mes_filtrado['Valor_Pago'].sum()
-
-            if 'Valor_Liquido' in df_pagamentos_mes_filtrado.columns:
-                total_receita_liquida_realizada = df_pagamentos_mes_filtrado['Valor_Liquido'].sum()
-            else:
-                # Fallback se a coluna ainda não foi lida
-                total_receita_liquida_realizada = total_receita_bruta_realizada
+        # Cartões: só a linha do mês no Resumo_Mensal (ou calculados das abas, se o mês não está lá)
+        totais = totais_do_mes(estudio, mes_selecionado, ano_selecionado)
 
+        total_receita_prevista = totais['receita_prevista']
+        total_descontado_mes = totais['descontos']
+        total_receita_bruta_realizada = totais['receita_bruta']
+        total_receita_liquida_realizada = totais['receita_liquida']
         total_taxas = total_receita_bruta_realizada - total_receita_liquida_realizada
-
-        # Cálculo de Gastos (Previsto vs Realizado)
-        total_gastos_previstos = 0
-        total_gastos_realizados = 0
-        df_despesas_mes = pd.DataFrame()
-        if not df_despesas.empty:
-            df_despesas_mes = df_despesas[
-                (df_despesas['Mes_Competencia'] == mes_selecionado) &
-                (df_despesas['Ano_Competencia'] == ano_selecionado)]
-            if 'Valor' in df_despesas_mes.columns:
-                total_gastos_previstos = df_despesas_mes['Valor'].sum()
-            if 'Valor_Pago' in df_despesas_mes.columns:
-                total_gastos_realizados = df_despesas_mes['Valor_Pago'].sum()
-
+        total_gastos_previstos = totais['gastos_previstos']
+        total_gastos_realizados = totais['gastos_realizados']
         total_gastos_pendentes = total_gastos_previstos - total_gastos_realizados
 
         # --- CÁLCULO DAS MÉTRICAS FINAIS (ATUALIZADO) ---
@@ -1306,228 +1875,36 @@ def pagina_financeiro():
 
         # Gráfico de Fluxo de Caixa (Atualizado para usar LÍQUIDO)
         st.subheader("Comparativo Mensal: Previsto vs. Realizado")
-        df_fluxo_mes = pd.DataFrame({
-            'Tipo': ['Receita Prevista', 'Receita Realizada (Líquida)', 'Gasto Previsto', 'Gasto Realizado'],
-            'Valor': [total_receita_prevista, total_receita_liquida_realizada, total_gastos_previstos,
-                      total_gastos_realizados],
-            'Categoria': ['Receita', 'Receita', 'Gasto', 'Gasto']
-        })
-        chart_fluxo_base = alt.Chart(df_fluxo_mes).encode(
-            x=alt.X('Tipo:N', title=None, axis=None),
-            y=alt.Y('Valor:Q', title='Valor (R$)'),
-            color=alt.Color('Tipo:N', legend=alt.Legend(title="Fluxo"),
-                            scale=alt.Scale(
-                                domain=['Receita Prevista', 'Receita Realizada (Líquida)', 'Gasto Previsto',
-                                        'Gasto Realizado'],
-                                range=['#1f77b4', '#2ca02c', '#ff7f0e', '#d62728']))
-        ).properties(height=350)
-        text = chart_fluxo_base.mark_text(dy=-8, color='black').encode(text=alt.Text('Valor:Q', format=",.2f"))
-        chart_fluxo_final = chart_fluxo_base.mark_bar() + text
-        st.altair_chart(chart_fluxo_final, use_container_width=True)
+        st.vega_lite_chart(spec_fluxo_mes(estudio, mes_selecionado, ano_selecionado), use_container_width=True)
 
         st.divider()
 
         # Tabela de Devedores (Receitas) - (Inalterada, usa Bruto, o que está correto)
         st.subheader(f"Status de Pagamentos de Alunos ({LISTA_MESES_NOMES[mes_selecionado]}/{ano_selecionado})")
-        if df_receita_prevista_mes.empty:
+        if load_fluxo_mes(estudio, mes_selecionado, ano_selecionado)['receita'].empty:
             st.info("Nenhuma aluna ativa encontrada para este mês de competência.")
         else:
-            df_status_cols = ['ID', 'Nome', 'Plano', 'Preco_Mensal', 'Desconto_Percentual', 'Valor_Plano_Final',
-                              'Justificativa_Desconto']
-            df_status_cols_exist = [col for col in df_status_cols if col in df_receita_prevista_mes.columns]
-            df_status = df_receita_prevista_mes[df_status_cols_exist].copy()
-            df_status.rename(
-                columns={'ID': 'ID_Aluno', 'Preco_Mensal': 'Valor_Cheio', 'Valor_Plano_Final': 'Valor_Plano_com_Desc'},
-                inplace=True)
-            df_status = df_status.drop_duplicates(subset=['ID_Aluno'])
-
-            if not df_pagamentos_mes_filtrado.empty and 'ID_Aluno' in df_pagamentos_mes_filtrado.columns:
-                # Agrupa pelo Valor_Pago (Bruto) para abater a dívida
-                df_pagos_agrupado = df_pagamentos_mes_filtrado.groupby('ID_Aluno')['Valor_Pago'].sum().reset_index()
-                df_status = pd.merge(df_status, df_pagos_agrupado, on='ID_Aluno', how='left')
-            else:
-                df_status['Valor_Pago'] = 0
-
-            df_status['Valor_Pago'] = df_status['Valor_Pago'].fillna(0)
-            if 'Valor_Plano_com_Desc' not in df_status.columns:
-                df_status['Valor_Plano_com_Desc'] = df_status.get('Valor_Cheio', 0)
-
-            # Saldo Devedor é (Previsto com Desconto - Pago Bruto)
-            df_status['Saldo_Devedor'] = df_status['Valor_Plano_com_Desc'] - df_status['Valor_Pago']
-
-            def get_status(row):
-                if row['Saldo_Devedor'] <= 0.01: return "Pago"
-                if row['Saldo_Devedor'] < row.get('Valor_Plano_com_Desc', 0): return "Parcial"
-                return "Não Pago"
-
-            df_status['Status_Pagamento'] = df_status.apply(get_status, axis=1)
-            cols_display_status = ['Nome', 'Plano', 'Valor_Cheio', 'Desconto_Percentual', 'Valor_Plano_com_Desc',
-                                   'Valor_Pago', 'Saldo_Devedor', 'Status_Pagamento']
-            cols_status_exist = [col for col in cols_display_status if col in df_status.columns]
-            df_status_display = df_status[cols_status_exist].copy()
-
-            for col in ['Valor_Cheio', 'Valor_Plano_com_Desc', 'Valor_Pago', 'Saldo_Devedor']:
-                if col in df_status_display:
-                    df_status_display[col] = df_status_display[col].map("R$ {:,.2f}".format)
-            if 'Desconto_Percentual' in df_status_display:
-                df_status_display['Desconto_Percentual'] = df_status_display['Desconto_Percentual'].map(
-                    "{:,.1f}%".format)
-
-            df_status_display = df_status_display.sort_values(by="Nome", ascending=True)
-            st.dataframe(df_status_display.rename(
-                columns={'Valor_Cheio': 'Plano (Valor Cheio)', 'Desconto_Percentual': 'Desc. (%)',
-                         'Valor_Plano_com_Desc': 'A Pagar (com Desc.)',
-                         'Valor_Pago': 'Valor Pago (Bruto)'}), use_container_width=True)
+            df_status_display = load_status_pagamentos(estudio, mes_selecionado, ano_selecionado)
+            st.dataframe(df_status_display, use_container_width=True,
+                         column_config={
+                             'Valor_Cheio': coluna_reais("Plano (Valor Cheio)"),
+                             'Desconto_Percentual': coluna_percentual("Desc. (%)"),
+                             'Valor_Plano_com_Desc': coluna_reais("A Pagar (com Desc.)"),
+                             'Valor_Pago': coluna_reais("Valor Pago (Bruto)"),
+                             'Saldo_Devedor': coluna_reais("Saldo_Devedor"),
+                         })
 
         # Relatório de Descontos
         st.subheader("Relatório de Descontos de Alunos do Mês")
-        with st.expander("Clique para ver os detalhes de descontos aplicados este mês"):
-            if 'Valor_Descontado' in df_receita_prevista_mes.columns:
-                df_descontos_mes = df_receita_prevista_mes[df_receita_prevista_mes['Valor_Descontado'] > 0].copy()
-            else:
-                df_descontos_mes = pd.DataFrame()
-
-            if df_descontos_mes.empty:
-                st.info("Nenhum desconto aplicado para alunas ativas este mês.")
-            else:
-                cols_desc_report = ['Nome', 'Plano', 'Preco_Mensal', 'Desconto_Percentual', 'Valor_Descontado',
-                                    'Justificativa_Desconto']
-                cols_desc_exist = [col for col in cols_desc_report if col in df_descontos_mes.columns]
-                df_descontos_display = df_descontos_mes[cols_desc_exist]
-
-                for col in ['Preco_Mensal', 'Valor_Descontado']:
-                    if col in df_descontos_display:
-                        df_descontos_display[col] = df_descontos_display[col].map("R$ {:,.2f}".format)
-                if 'Desconto_Percentual' in df_descontos_display:
-                    df_descontos_display['Desconto_Percentual'] = df_descontos_display['Desconto_Percentual'].map(
-                        "{:,.1f}%".format)
-
-                st.dataframe(df_descontos_display.rename(
-                    columns={'Preco_Mensal': 'Plano (Valor Cheio)', 'Desconto_Percentual': 'Desc. (%)',
-                             'Valor_Descontado': 'Valor (R$)'}), use_container_width=True)
+        secao_descontos_mes(mes_selecionado, ano_selecionado)
 
         # Gráficos de Composição e Anual
         st.divider()
-        with st.expander("Ver Gráficos de Composição e Projeção Anual"):
-            col1, col2 = st.columns(2)
-            with col1:
-                st.subheader("Composição da Receita (Prevista, com desc.)")
-                if not df_receita_prevista_mes.empty and total_receita_prevista > 0 and 'Plano' in df_receita_prevista_mes.columns:
-                    df_receita_por_plano = df_receita_prevista_mes.groupby('Plano')[
-                        'Valor_Plano_Final'].sum().reset_index()
-                    df_receita_por_plano['Percentual'] = (
-                            df_receita_por_plano['Valor_Plano_Final'] / total_receita_prevista).apply(
-                        lambda x: f"{x:.1%}")
-                    base_receita = alt.Chart(df_receita_por_plano).encode(
-                        theta=alt.Theta("Valor_Plano_Final:Q", stack=True))
-                    donut_receita = base_receita.mark_arc(outerRadius=100, innerRadius=60).encode(
-                        color=alt.Color("Plano:N", title="Plano", scale=alt.Scale(scheme='spectral')),
-                        order=alt.Order("Valor_Plano_Final", sort="descending"),
-                        tooltip=["Plano", alt.Tooltip("Valor_Plano_Final", format=",.2f", title="Valor (R$)"),
-                                 "Percentual"])
-                    text_receita = base_receita.mark_text(radius=120).encode(text=alt.Text("Percentual:N"),
-                                                                             order=alt.Order("Valor_Plano_Final",
-                                                                                             sort="descending"),
-                                                                             color=alt.value("white"))
-                    st.altair_chart(donut_receita + text_receita, use_container_width=True)
-                else:
-                    st.info("Nenhuma receita prevista para este mês.")
-
-            with col2:
-                st.subheader(f"Composição dos Gastos (Previstos)")
-                if total_gastos_previstos > 0:
-                    df_gastos_composicao = df_despesas_mes.groupby('Tipo')['Valor'].sum().reset_index()
-                    df_gastos_composicao = df_gastos_composicao[df_gastos_composicao['Valor'] > 0]
-                    df_gastos_composicao['Percentual'] = (df_gastos_composicao['Valor'] / total_gastos_previstos).apply(
-                        lambda x: f"{x:.1%}")
-                    base_gastos = alt.Chart(df_gastos_composicao).encode(theta=alt.Theta("Valor:Q", stack=True))
-                    donut_gastos = base_gastos.mark_arc(outerRadius=100, innerRadius=60).encode(
-                        color=alt.Color("Tipo:N", title="Tipo de Gasto",
-                                        scale=alt.Scale(range=['#d62728', '#ff7f0e', '#9467bd'])),
-                        order=alt.Order("Valor", sort="descending"),
-                        tooltip=["Tipo", alt.Tooltip("Valor", format=",.2f", title="Valor (R$)"), "Percentual"])
-                    text_gastos = base_gastos.mark_text(radius=120).encode(text=alt.Text("Percentual:N"),
-                                                                           order=alt.Order("Valor", sort="descending"),
-                                                                           color=alt.value("white"))
-                    st.altair_chart(donut_gastos + text_gastos, use_container_width=True)
-                else:
-                    st.info("Nenhum gasto previsto para este mês.")
-
-            st.divider()
-
-            # Perspectiva Anual
-            st.subheader(f"Perspectiva Anual (Iniciando em {LISTA_MESES_NOMES[mes_selecionado]}/{ano_selecionado})")
-            meses_futuros = [data_filtro_inicio + relativedelta(months=i) for i in range(12)]
-
-            gastos_por_mes = {}
-            if not df_despesas.empty:
-                for mes_ref in meses_futuros:
-                    mes_num, ano_num = mes_ref.month, mes_ref.year
-                    df_lancados_mes = df_despesas[
-                        (df_despesas['Mes_Competencia'] == mes_num) & (df_despesas['Ano_Competencia'] == ano_num)]
-                    gastos_mes_atual = df_lancados_mes.get('Valor', 0).sum()
-                    gastos_por_mes[mes_ref.strftime('%Y-%m')] = gastos_mes_atual
-            df_gastos_anual = pd.DataFrame.from_dict(gastos_por_mes, orient='index',
-                                                     columns=['Gastos Previstos']).reset_index().rename(
-                columns={'index': 'Mes'})
-
-            receita_por_mes = {}
-            descontos_por_mes = {}
-            if not df_planos.empty and not df_matriculas.empty and 'Data_Fim' in df_receita_join.columns:
-                for mes_ref in meses_futuros:
-                    inicio_mes_ref = datetime(mes_ref.year, mes_ref.month, 1)
-                    ultimo_dia_mes_ref = calendar.monthrange(mes_ref.year, mes_ref.month)[1]
-                    fim_mes_ref = datetime(mes_ref.year, mes_ref.month, ultimo_dia_mes_ref)
-
-                    df_receita_mensal = df_receita_join[(df_receita_join['Data_Inicio'] <= fim_mes_ref) & (
-                            df_receita_join['Data_Fim'] > inicio_mes_ref)]
-
-                    if not df_receita_mensal.empty:
-                        preco_col_anual = df_receita_mensal.get('Preco_Mensal', 0)
-                        desc_col_anual = df_receita_mensal.get('Desconto_Percentual', 0)
-                        df_receita_mensal['Valor_Final'] = preco_col_anual * (1 - desc_col_anual / 100)
-                        df_receita_mensal['Valor_Descontado_Anual'] = preco_col_anual - df_receita_mensal['Valor_Final']
-                        receita_por_mes[mes_ref.strftime('%Y-%m')] = df_receita_mensal['Valor_Final'].sum()
-                        descontos_por_mes[mes_ref.strftime('%Y-%m')] = df_receita_mensal['Valor_Descontado_Anual'].sum()
-                    else:
-                        receita_por_mes[mes_ref.strftime('%Y-%m')] = 0
-                        descontos_por_mes[mes_ref.strftime('%Y-%m')] = 0
-
-            df_receita_anual = pd.DataFrame.from_dict(receita_por_mes, orient='index',
-                                                      columns=['Receita Prevista']).reset_index().rename(
-                columns={'index': 'Mes'})
-            df_descontos_anual = pd.DataFrame.from_dict(descontos_por_mes, orient='index',
-                                                        columns=['Valor_Descontado']).reset_index().rename(
-                columns={'index': 'Mes'})
-
-            st.markdown("#### Projeção de Descontos Concedidos (12 Meses)")
-            chart_descontos_anual = alt.Chart(df_descontos_anual).mark_bar(color='#ff7f0e').encode(
-                x=alt.X('Mes:O', title='Mês'),
-                y=alt.Y('Valor_Descontado:Q', title='Total Descontado (R$)'),
-                tooltip=['Mes', alt.Tooltip('Valor_Descontado', format=",.2f", title="Desconto (R$)")]
-            ).properties(height=300).interactive()
-            st.altair_chart(chart_descontos_anual, use_container_width=True)
-
-            st.markdown("#### Projeção de Receita Prevista vs. Gastos Previstos (12 Meses)")
-            df_comparativo_anual = pd.merge(df_gastos_anual, df_receita_anual, on='Mes', how='outer').fillna(0)
-            df_comparativo_anual_melted = df_comparativo_anual.melt('Mes', var_name='Tipo', value_name='Valor')
-            chart_anual = alt.Chart(df_comparativo_anual_melted).mark_bar().encode(
-                x=alt.X('Mes:O', title='Perspectiva 12 Meses'),
-                y=alt.Y('Valor:Q', title='Valor (R$)'),
-                color=alt.Color('Tipo:N', scale=alt.Scale(domain=['Receita Prevista', 'Gastos Previstos'],
-                                                          range=['#2ca02c', '#d62728']),
-                                legend=alt.Legend(title="Tipo de Fluxo")),
-                xOffset='Tipo:N',
-                tooltip=['Mes', 'Tipo', alt.Tooltip('Valor', format=",.2f")]
-            ).properties(height=400).interactive()
-            st.altair_chart(chart_anual, use_container_width=True)
-
-            with st.expander("Ver Tabelas de Detalhes de Gastos (Previstos) do Mês"):
-                st.subheader(f"Contas a Pagar Lançadas em {LISTA_MESES_NOMES[mes_selecionado]}")
-                cols_gastos = ['ID', 'Descricao', 'Valor', 'Status_Pagamento', 'Valor_Pago', 'Data_Vencimento',
-                               'Recorrente', 'Tipo']
-                cols_gastos_existem = [col for col in cols_gastos if col in df_despesas_mes.columns]
-                st.dataframe(df_despesas_mes[cols_gastos_existem], use_container_width=True)
+        secao_graficos_financeiro(mes_selecionado, ano_selecionado)
+
+        st.divider()
+        secao_exportacao("export_financeiro", {"Pagamentos Recebidos": tabela_pagamentos_periodo,
+                                               "Despesas": tabela_despesas_periodo})
 
     except gspread.exceptions.WorksheetNotFound:
         st.error(
@@ -1545,8 +1922,8 @@ def pagina_renovacoes():
     st.write("Controle aqui os alunos com planos vencidos ou prestes a vencer.")
 
     try:
-        df_matriculas = load_matriculas()
-        df_planos = load_planos()
+        df_matriculas = load_matriculas(estudio)
+        df_planos = load_planos(estudio)
 
         if df_matriculas.empty or 'Status' not in df_matriculas.columns:
             st.error("Não foi possível carregar as matrículas ou a coluna 'Status' está faltando.")
@@ -1555,29 +1932,11 @@ def pagina_renovacoes():
             st.error("Não foi possível carregar os planos ou a coluna 'Duracao_Meses' está faltando.")
             st.stop()
 
-        df_ativas = df_matriculas[df_matriculas['Status'].str.lower() == 'ativa'].copy()
-        if df_ativas.empty:
+        if not (df_matriculas['Status'].str.lower() == 'ativa').any():
             st.info("Nenhum aluno(a) 'Ativo(a)' encontrado para verificar renovações.")
             st.stop()
 
-        df_merged = df_ativas.merge(df_planos, on='Plano', how='left')
-        df_merged['Duracao_Meses'] = df_merged['Duracao_Meses'].fillna(0)
-        df_merged = df_merged.dropna(subset=['Data_Inicio'])
-        df_merged['Data_Fim'] = df_merged.apply(
-            lambda row: row['Data_Inicio'] + pd.DateOffset(months=int(row['Duracao_Meses']))
-            if pd.notna(row['Data_Inicio']) and row['Duracao_Meses'] > 0 else pd.NaT,
-            axis=1
-        )
-        df_merged = df_merged.dropna(subset=['Data_Fim'])
-
-        hoje_dt = hoje
-        limite_30_dias = hoje_dt + relativedelta(days=30)
-
-        df_expirados = df_merged[df_merged['Data_Fim'].dt.date < hoje_dt.date()].sort_values(by='Data_Fim',
-                                                                                             ascending=True)
-        df_a_vencer = df_merged[
-            (df_merged['Data_Fim'].dt.date >= hoje_dt.date()) & (df_merged['Data_Fim'].dt.date <= limite_30_dias.date())
-            ].sort_values(by='Data_Fim', ascending=True)
+        df_expirados, df_a_vencer = load_vencimentos(estudio, hoje.date())
 
         # Seção 1: Planos Expirados
         st.subheader("⚠️ Planos Expirados (Ação Imediata)")
@@ -1634,7 +1993,7 @@ def pagina_renovacoes():
                                     plano_info_hist = df_planos[df_planos['Plano'] == novo_plano].iloc[0]
                                     preco_plano_hist = plano_info_hist['Preco_Mensal']
                                     valor_final_contrato = preco_plano_hist * (1 - novo_desconto / 100)
-                                    df_hist = load_historico_renovacoes()
+                                    df_hist = load_historico_renovacoes(estudio)
                                     id_hist = (df_hist['ID_Historico'].max() + 1) if not df_hist.empty and not df_hist[
                                         'ID_Historico'].isnull().all() else 1
                                     linha_historico = [
@@ -1650,7 +2009,8 @@ def pagina_renovacoes():
 
                                 if atualizar_matricula_aluno(id_aluno, dados_renovacao):
                                     st.success(f"{aluno['Nome']} renovado(a) com sucesso!")
-                                    clear_all_caches();
+                                    clear_all_caches(estudio);
+                                    atualizar_resumo_mensal(estudio, contratos=True);
                                     time.sleep(1);
                                     st.rerun()
                                 else:
@@ -1666,7 +2026,8 @@ def pagina_renovacoes():
                             if atualizar_matricula_aluno(id_aluno,
                                                          {"Status": novo_status, "Data_Congelamento_Inicio": ""}):
                                 st.success(f"Status de {aluno['Nome']} alterado para '{novo_status}'.")
-                                clear_all_caches();
+                                clear_all_caches(estudio);
+                                atualizar_resumo_mensal(estudio, contratos=True);
                                 time.sleep(1);
                                 st.rerun()
                             else:
@@ -1729,7 +2090,7 @@ def pagina_renovacoes():
                                     plano_info_hist = df_planos[df_planos['Plano'] == novo_plano].iloc[0]
                                     preco_plano_hist = plano_info_hist['Preco_Mensal']
                                     valor_final_contrato = preco_plano_hist * (1 - novo_desconto / 100)
-                                    df_hist = load_historico_renovacoes()
+                                    df_hist = load_historico_renovacoes(estudio)
                                     id_hist = (df_hist['ID_Historico'].max() + 1) if not df_hist.empty and not df_hist[
                                         'ID_Historico'].isnull().all() else 1
                                     linha_historico = [
@@ -1745,7 +2106,8 @@ def pagina_renovacoes():
 
                                 if atualizar_matricula_aluno(id_aluno, dados_renovacao):
                                     st.success(f"{aluno['Nome']} renovado(a) com sucesso!")
-                                    clear_all_caches();
+                                    clear_all_caches(estudio);
+                                    atualizar_resumo_mensal(estudio, contratos=True);
                                     time.sleep(1);
                                     st.rerun()
                                 else:
@@ -1762,7 +2124,8 @@ def pagina_renovacoes():
                             if atualizar_matricula_aluno(id_aluno,
                                                          {"Status": novo_status, "Data_Congelamento_Inicio": ""}):
                                 st.success(f"Status de {aluno['Nome']} alterado para '{novo_status}'.")
-                                clear_all_caches();
+                                clear_all_caches(estudio);
+                                atualizar_resumo_mensal(estudio, contratos=True);
                                 time.sleep(1);
                                 st.rerun()
                             else:
@@ -1779,8 +2142,8 @@ def pagina_gerenciar_status():
     st.write("Use esta página para pausar (congelar) ou retomar (reativar) os contratos dos alunos.")
 
     try:
-        df_matriculas = load_matriculas()
-        df_planos = load_planos()
+        df_matriculas = load_matriculas(estudio)
+        df_planos = load_planos(estudio)
 
         if df_matriculas.empty or df_planos.empty:
             st.error("Dados de matrículas ou planos não carregados.")
@@ -1796,12 +2159,11 @@ def pagina_gerenciar_status():
     if df_ativas.empty:
         st.info("Nenhum aluno 'Ativo' para congelar.")
     else:
-        dict_ativas = pd.Series(df_ativas.ID.values, index=df_ativas.Nome).to_dict()
-        nome_aluno_cong = st.selectbox("Selecione um aluno(a) ATIVO para congelar:",
-                                       options=dict_ativas.keys(), index=None, placeholder="Selecione...")
+        aluno_cong = selecionar_aluno("Selecione um aluno(a) ATIVO para congelar:", "congelar",
+                                      status=('ativa',))
 
-        if nome_aluno_cong:
-            id_aluno_sel = dict_ativas[nome_aluno_cong]
+        if aluno_cong:
+            id_aluno_sel = aluno_cong['ID']
             aluno = df_ativas[df_ativas['ID'] == id_aluno_sel].iloc[0]
 
             with st.form(f"form_congelar_{id_aluno_sel}", clear_on_submit=True):
@@ -1818,7 +2180,8 @@ def pagina_gerenciar_status():
                 if atualizar_matricula_aluno(id_aluno_sel, dados_update):
                     st.success(
                         f"Matrícula de {aluno['Nome']} congelada com sucesso a partir de {data_congelamento.strftime('%d/%m/%Y')}.")
-                    clear_all_caches()
+                    clear_all_caches(estudio)
+                    atualizar_resumo_mensal(estudio, contratos=True)
                     time.sleep(2)
                     st.rerun()
                 else:
@@ -1832,12 +2195,11 @@ def pagina_gerenciar_status():
     if df_congelados.empty:
         st.info("Nenhum aluno 'Congelado' para reativar.")
     else:
-        dict_congelados = pd.Series(df_congelados.ID.values, index=df_congelados.Nome).to_dict()
-        nome_aluno_reat = st.selectbox("Selecione um aluno(a) CONGELADO para reativar:",
-                                       options=dict_congelados.keys(), index=None, placeholder="Selecione...")
+        aluno_reat = selecionar_aluno("Selecione um aluno(a) CONGELADO para reativar:", "reativar",
+                                      status=('congelado',))
 
-        if nome_aluno_reat:
-            id_aluno_sel = dict_congelados[nome_aluno_reat]
+        if aluno_reat:
+            id_aluno_sel = aluno_reat['ID']
             aluno = df_congelados[df_congelados['ID'] == id_aluno_sel].iloc[0]
 
             data_cong_inicio = aluno.get('Data_Congelamento_Inicio')
@@ -1879,7 +2241,8 @@ def pagina_gerenciar_status():
                 if atualizar_matricula_aluno(id_aluno_sel, dados_update):
                     st.success(
                         f"Matrícula de {aluno['Nome']} reativada com sucesso! O contrato foi estendido em {dias_congelados} dias.")
-                    clear_all_caches()
+                    clear_all_caches(estudio)
+                    atualizar_resumo_mensal(estudio, contratos=True)
                     time.sleep(2)
                     st.rerun()
                 else:
@@ -1889,13 +2252,28 @@ def pagina_gerenciar_status():
 # -----------------------------------------------------
 # PÁGINA: RESERVA (INVESTIMENTOS)
 # -----------------------------------------------------
+@st.fragment
+def projecao_investimentos(saldos, taxa_cdi_anual):
+    """Gráfico de projeção; mover o slider reexecuta só este trecho."""
+    meses_projecao = st.slider("Projetar Saldo para (meses):", min_value=1, max_value=120, value=12)
+
+    df_proj = calculos.projetar_saldos(saldos, taxa_cdi_anual, meses_projecao)
+    chart = alt.Chart(df_proj).mark_line(point=True).encode(
+        x=alt.X('Mês:O', axis=alt.Axis(title='Meses no Futuro')),
+        y=alt.Y('Saldo Projetado:Q', axis=alt.Axis(title='Saldo (R$)', format=",.2f")),
+        color=alt.Color('Produto:N', title="Produto"),
+        tooltip=['Mês', 'Produto', alt.Tooltip('Saldo Projetado', format=",.2f")]
+    ).properties(height=400).interactive()
+    st.altair_chart(chart, use_container_width=True)
+
+
 def pagina_investimentos():
     st.title("🏦 Reserva de Oportunidade (Investimentos)")
     st.info(
         "Aqui você gerencia sua reserva de caixa (meta: 12x o faturamento mensal). Os cálculos de rendimento são projeções brutas (sem IR).")
 
     try:
-        df_movimentacoes = load_investimentos()
+        df_movimentacoes = load_investimentos(estudio)
     except gspread.exceptions.WorksheetNotFound:
         st.error("Aba 'Investimentos_Caixa' não encontrada na planilha!")
         st.error("Por favor, crie a aba com os cabeçalhos: ID_Movimentacao, Data, Tipo, Produto, Valor, Descricao")
@@ -1904,57 +2282,65 @@ def pagina_investimentos():
         st.error(f"Erro ao carregar investimentos: {e}")
         st.stop()
 
+    df_saldos_diarios = load_saldos_investimentos(estudio, hoje.date())
+    serie_cdi = load_historico_cdi()
+    cdi_vigente = float(serie_cdi.iloc[-1] * 100) if not serie_cdi.empty else 10.50
+
     st.subheader("Parâmetros de Projeção")
     taxa_cdi_input = st.number_input(
         "Taxa CDI/Selic Anual Atual (%)",
         min_value=0.1,
-        value=10.50,
+        value=round(cdi_vigente, 2),
         step=0.1,
         format="%.2f",
-        help="Insira a taxa Selic ou CDI atual (Ex: 10.50 para 10,50% a.a.)"
+        help="Usada apenas nas projeções futuras. O rendimento já realizado usa o histórico em 'cdi_historico.csv'."
     )
     taxa_cdi_anual = taxa_cdi_input / 100.0
 
-    # Cálculo de Saldos
+    # Cálculo de Saldos (Principal e com Rendimentos)
+    lista_produtos = ["CDB 100% CDI", "CDB 102% CDI"]
     if df_movimentacoes.empty:
-        saldo_cdb100 = 0.0
-        saldo_cdb102 = 0.0
+        principal_por_produto = {}
+    else:
+        principal_por_produto = df_movimentacoes.groupby('Produto')['Valor'].sum().to_dict()
+    if df_saldos_diarios.empty:
+        saldo_por_produto = dict(principal_por_produto)
     else:
-        df_saldo = df_movimentacoes.groupby('Produto')['Valor'].sum().reset_index()
-        saldo_cdb100 = df_saldo[df_saldo['Produto'] == 'CDB 100% CDI']['Valor'].sum()
-        saldo_cdb102 = df_saldo[df_saldo['Produto'] == 'CDB 102% CDI']['Valor'].sum()
-    saldo_total = saldo_cdb100 + saldo_cdb102
+        saldo_por_produto = df_saldos_diarios.iloc[-1].to_dict()
+
+    saldo_cdb100 = saldo_por_produto.get("CDB 100% CDI", 0.0)
+    saldo_cdb102 = saldo_por_produto.get("CDB 102% CDI", 0.0)
+    principal_total = sum(principal_por_produto.values())
+    saldo_total = sum(saldo_por_produto.values())
 
     st.divider()
-    st.metric("Saldo Total Investido (Principal)", f"R$ {saldo_total:,.2f}",
-              help="Soma de todos os aportes menos todos os resgates. Não inclui rendimentos.")
+    col_tot1, col_tot2, col_tot3 = st.columns(3)
+    col_tot1.metric("Saldo Total Investido (Principal)", f"R$ {principal_total:,.2f}",
+                    help="Soma de todos os aportes menos todos os resgates. Não inclui rendimentos.")
+    col_tot2.metric("Saldo Atual (com Rendimentos)", f"R$ {saldo_total:,.2f}",
+                    help="Rendimento bruto acumulado dia útil a dia útil (252 d.u./ano) com o CDI histórico.")
+    col_tot3.metric("Rendimento Acumulado (Bruto)", f"R$ {saldo_total - principal_total:,.2f}")
 
     # Cálculo de Rendimentos
     st.subheader("Projeção de Rendimento Bruto (Diário e Mensal)")
-    taxa_diaria_bruta = (1 + taxa_cdi_anual) ** (1 / 252) - 1
-    taxa_mensal_bruta = (1 + taxa_cdi_anual) ** (1 / 12) - 1
-
-    col1, col2 = st.columns(2)
-    with col1:
-        st.markdown("##### CDB 100% CDI (Liquidez D+0)")
-        st.metric("Saldo (Principal)", f"R$ {saldo_cdb100:,.2f}")
-        rend_dia_100 = saldo_cdb100 * (taxa_diaria_bruta * 1.00)
-        rend_mes_100 = saldo_cdb100 * (taxa_mensal_bruta * 1.00)
-        st.metric("Rendimento Diário (Bruto)", f"R$ {rend_dia_100:,.2f}")
-        st.metric("Rendimento Mensal (Bruto)", f"R$ {rend_mes_100:,.2f}")
-    with col2:
-        st.markdown("##### CDB 102% CDI (Liquidez D+2)")
-        st.metric("Saldo (Principal)", f"R$ {saldo_cdb102:,.2f}")
-        rend_dia_102 = saldo_cdb102 * (taxa_diaria_bruta * 1.02)
-        rend_mes_102 = saldo_cdb102 * (taxa_mensal_bruta * 1.02)
-        st.metric("Rendimento Diário (Bruto)", f"R$ {rend_dia_102:,.2f}")
-        st.metric("Rendimento Mensal (Bruto)", f"R$ {rend_mes_102:,.2f}")
+    taxa_diaria_bruta = (1 + taxa_cdi_anual) ** (1 / calculos.DIAS_UTEIS_ANO) - 1
+
+    for coluna, produto, liquidez in zip(st.columns(2), lista_produtos, ["D+0", "D+2"]):
+        with coluna:
+            percentual = calculos.percentual_cdi_do_produto(produto)
+            saldo_produto = saldo_por_produto.get(produto, 0.0)
+            taxa_dia_produto = taxa_diaria_bruta * percentual
+            st.markdown(f"##### {produto} (Liquidez {liquidez})")
+            st.metric("Saldo (com Rendimentos)", f"R$ {saldo_produto:,.2f}",
+                      help=f"Principal: R$ {principal_por_produto.get(produto, 0.0):,.2f}")
+            st.metric("Rendimento Diário (Bruto)", f"R$ {saldo_produto * taxa_dia_produto:,.2f}")
+            st.metric("Rendimento Mensal (Bruto)",
+                      f"R$ {saldo_produto * ((1 + taxa_dia_produto) ** calculos.DIAS_UTEIS_MES - 1):,.2f}")
 
     st.divider()
 
     # Formulários de Aporte e Resgate
     st.subheader("Movimentar Valores")
-    lista_produtos = ["CDB 100% CDI", "CDB 102% CDI"]
 
     col3, col4 = st.columns(2)
     with col3:
@@ -1980,7 +2366,7 @@ def pagina_investimentos():
             st.warning("Insira um valor de aporte válido.")
             st.stop()
         try:
-            df_mov = load_investimentos()
+            df_mov = load_investimentos(estudio)
             novo_id = (df_mov['ID_Movimentacao'].max() + 1) if not df_mov.empty and not df_mov[
                 'ID_Movimentacao'].isnull().all() else 1
             nova_linha = [novo_id, data_aporte.strftime("%Y-%m-%d"), "Aporte", produto_aporte, valor_aporte,
@@ -1988,7 +2374,7 @@ def pagina_investimentos():
 
             invest_ws = sheet.worksheet("Investimentos_Caixa")
             invest_ws.append_row([str(item) for item in nova_linha], value_input_option='USER_ENTERED')
-            clear_all_caches()
+            clear_all_caches(estudio)
             st.success(f"Aporte de R$ {valor_aporte:,.2f} registrado com sucesso!")
             time.sleep(1);
             st.rerun()
@@ -2003,11 +2389,11 @@ def pagina_investimentos():
         saldo_atual_produto = saldo_cdb100 if produto_resgate == "CDB 100% CDI" else saldo_cdb102
         if valor_resgate > saldo_atual_produto:
             st.error(
-                f"Saldo insuficiente! Você tentou resgatar R$ {valor_resgate:,.2f}, mas o saldo (principal) deste produto é de R$ {saldo_atual_produto:,.2f}.")
+                f"Saldo insuficiente! Você tentou resgatar R$ {valor_resgate:,.2f}, mas o saldo (com rendimentos) deste produto é de R$ {saldo_atual_produto:,.2f}.")
             st.stop()
         else:
             try:
-                df_mov = load_investimentos()
+                df_mov = load_investimentos(estudio)
                 novo_id = (df_mov['ID_Movimentacao'].max() + 1) if not df_mov.empty and not df_mov[
                     'ID_Movimentacao'].isnull().all() else 1
                 nova_linha = [novo_id, data_resgate.strftime("%Y-%m-%d"), "Resgate", produto_resgate, -valor_resgate,
@@ -2015,7 +2401,7 @@ def pagina_investimentos():
 
                 invest_ws = sheet.worksheet("Investimentos_Caixa")
                 invest_ws.append_row([str(item) for item in nova_linha], value_input_option='USER_ENTERED')
-                clear_all_caches()
+                clear_all_caches(estudio)
                 st.success(f"Resgate de R$ {valor_resgate:,.2f} registrado com sucesso!")
                 time.sleep(1);
                 st.rerun()
@@ -2026,34 +2412,22 @@ def pagina_investimentos():
 
     # Gráfico de Projeção
     st.subheader("Projeção de Juros Compostos (Bruto)")
-    meses_projecao = st.slider("Projetar Saldo para (meses):", min_value=1, max_value=60, value=12)
-
-    data_projecao = []
-    taxa_mensal_100 = taxa_mensal_bruta * 1.00
-    taxa_mensal_102 = taxa_mensal_bruta * 1.02
-
-    s_100_proj = saldo_cdb100
-    s_102_proj = saldo_cdb102
-
-    for m in range(meses_projecao + 1):
-        if m == 0:
-            s_100, s_102 = saldo_cdb100, saldo_cdb102
-        else:
-            s_100 = s_100_proj * (1 + taxa_mensal_100) ** m
-            s_102 = s_102_proj * (1 + taxa_mensal_102) ** m
-
-        data_projecao.append({'Mês': m, 'Produto': 'CDB 100% CDI', 'Saldo Projetado': s_100})
-        data_projecao.append({'Mês': m, 'Produto': 'CDB 102% CDI', 'Saldo Projetado': s_102})
-        data_projecao.append({'Mês': m, 'Produto': 'Total', 'Saldo Projetado': s_100 + s_102})
-
-    df_proj = pd.DataFrame(data_projecao)
-    chart = alt.Chart(df_proj).mark_line(point=True).encode(
-        x=alt.X('Mês:O', axis=alt.Axis(title='Meses no Futuro')),
-        y=alt.Y('Saldo Projetado:Q', axis=alt.Axis(title='Saldo (R$)', format=",.2f")),
-        color=alt.Color('Produto:N', title="Produto"),
-        tooltip=['Mês', 'Produto', alt.Tooltip('Saldo Projetado', format=",.2f")]
-    ).properties(height=400).interactive()
-    st.altair_chart(chart, use_container_width=True)
+    projecao_investimentos({"CDB 100% CDI": saldo_cdb100, "CDB 102% CDI": saldo_cdb102}, taxa_cdi_anual)
+
+    # Evolução Realizada
+    if not df_saldos_diarios.empty:
+        st.subheader("Evolução do Saldo (Rendimento Realizado)")
+        df_evolucao = df_saldos_diarios.resample('ME').last()
+        df_evolucao.iloc[-1] = df_saldos_diarios.iloc[-1]
+        df_evolucao = df_evolucao.rename_axis('Data').reset_index().melt('Data', var_name='Produto',
+                                                                          value_name='Saldo')
+        chart_evolucao = alt.Chart(df_evolucao).mark_line(point=True).encode(
+            x=alt.X('yearmonth(Data):T', title='Mês'),
+            y=alt.Y('Saldo:Q', axis=alt.Axis(title='Saldo (R$)', format=",.2f")),
+            color=alt.Color('Produto:N', title="Produto"),
+            tooltip=[alt.Tooltip('Data', format="%d/%m/%Y"), 'Produto', alt.Tooltip('Saldo', format=",.2f")]
+        ).properties(height=300)
+        st.altair_chart(chart_evolucao, use_container_width=True)
 
     # Histórico de Movimentações
     st.subheader("Histórico de Movimentações")
@@ -2061,7 +2435,8 @@ def pagina_investimentos():
         if df_movimentacoes.empty:
             st.info("Nenhuma movimentação (aporte ou resgate) registrada.")
         else:
-            st.dataframe(df_movimentacoes.sort_values(by="Data", ascending=False), use_container_width=True)
+            st.dataframe(df_movimentacoes.sort_values(by="Data", ascending=False), use_container_width=True,
+                         column_config={'Valor': coluna_reais("Valor")})
 
 
 # -----------------------------------------------------
@@ -2072,7 +2447,7 @@ def pagina_relatorio_renovacoes():
     st.write("Visualize o histórico de todos os contratos (novos e renovações) por ano.")
 
     try:
-        df_historico = load_historico_renovacoes()
+        df_historico = load_historico_renovacoes(estudio)
     except gspread.exceptions.WorksheetNotFound:
         st.error("Aba 'Historico_Renovacoes' não encontrada!")
         st.info(
@@ -2112,18 +2487,117 @@ def pagina_relatorio_renovacoes():
     cols_display = ['Data_Inicio_Contrato', 'Nome_Aluno', 'Plano', 'Valor_Contrato', 'ID_Aluno']
     df_display_hist = df_filtrado[cols_display].sort_values(by="Data_Inicio_Contrato", ascending=False)
 
-    df_display_hist.rename(columns={
-        'Data_Inicio_Contrato': 'Data de Início',
-        'Nome_Aluno': 'Aluno(a)',
-        'Valor_Contrato': 'Valor Mensal (R$)'
-    }, inplace=True)
+    st.dataframe(df_display_hist, use_container_width=True,
+                 column_config={
+                     'Data_Inicio_Contrato': st.column_config.DateColumn("Data de Início", format="DD/MM/YYYY"),
+                     'Nome_Aluno': "Aluno(a)",
+                     'Valor_Contrato': coluna_reais("Valor Mensal (R$)"),
+                 })
+    secao_exportacao("export_renovacoes", {"Contratos": tabela_contratos_periodo})
+
+    st.divider()
+    st.subheader("Retenção por Coorte (Todo o Histórico)")
+    st.write("Alunos(as) agrupados(as) pela data da 1ª matrícula. Cada ciclo é um contrato (1 = contrato inicial).")
+
+    periodo_coorte = st.radio("Agrupar coortes por:", list(calculos.PERIODOS_COORTE.keys()), index=0,
+                              horizontal=True)
+    coortes = load_coortes(estudio, hoje.date(), periodo_coorte)
+    if coortes['retencao'].empty:
+        st.info("Histórico insuficiente para calcular coortes.")
+        return
+
+    df_churn = coortes['churn']
+    taxa_churn_geral = (df_churn['Nao_Renovados'].sum() / df_churn['Contratos_Encerrados'].sum()
+                        if not df_churn.empty and df_churn['Contratos_Encerrados'].sum() > 0 else 0.0)
+    col3, col4, col5 = st.columns(3)
+    col3.metric("Alunos(as) no Histórico", int(coortes['tamanho'].sum()))
+    col4.metric("Taxa de Não Renovação", f"{taxa_churn_geral:.1%}",
+                help="Contratos encerrados sem renovação / total de contratos encerrados.")
+    col5.metric("Permanência Média", f"{coortes['permanencia_media']:.1f} meses",
+                help="Da 1ª matrícula até o fim do último contrato (ou até hoje, para quem segue ativo).")
+
+    chart_curva = alt.Chart(coortes['curva']).mark_line(point=True).encode(
+        x=alt.X('Ciclo:O', title='Ciclo (Contrato)'),
+        y=alt.Y('Retencao:Q', title='Retenção', axis=alt.Axis(format='%')),
+        tooltip=['Ciclo', alt.Tooltip('Retencao', format='.1%', title='Retenção')]
+    ).properties(height=300)
+    st.altair_chart(chart_curva, use_container_width=True)
+
+    df_retencao = coortes['retencao'].copy()
+    df_retencao.columns = [f"Ciclo {ciclo}" for ciclo in df_retencao.columns]
+    df_retencao.insert(0, 'Alunos', coortes['tamanho'])
+    st.dataframe(df_retencao, use_container_width=True,
+                 column_config={col: st.column_config.NumberColumn(col, format="percent")
+                                for col in df_retencao.columns if col.startswith("Ciclo")})
+
+    with st.expander("Ver Não Renovações por Ciclo"):
+        st.dataframe(df_churn, use_container_width=True, hide_index=True,
+                     column_config={
+                         'Contratos_Encerrados': st.column_config.NumberColumn("Contratos Encerrados"),
+                         'Nao_Renovados': st.column_config.NumberColumn("Não Renovados"),
+                         'Taxa_Churn': st.column_config.NumberColumn("Taxa de Não Renovação", format="percent"),
+                     })
+
+
+# -----------------------------------------------------
+# PÁGINA: FREQUÊNCIA (ANÁLISES)
+# -----------------------------------------------------
+def pagina_frequencia():
+    st.title("📅 Frequência dos Alunos")
+    st.write("Acompanhe a frequência das aulas em relação ao plano contratado.")
+
+    try:
+        df_frequencia = load_frequencia_alunos(estudio, hoje.date())
+        df_mensal = calculos.presencas_por_mes(load_agregados_presencas(estudio))
+    except Exception as e:
+        st.error(f"Erro ao carregar a frequência: {e}")
+        st.stop()
 
-    if 'Valor Mensal (R$)' in df_display_hist:
-        df_display_hist['Valor Mensal (R$)'] = df_display_hist['Valor Mensal (R$)'].map("R$ {:,.2f}".format)
-    if 'Data de Início' in df_display_hist:
-        df_display_hist['Data de Início'] = df_display_hist['Data de Início'].dt.strftime('%d/%m/%Y')
+    if df_frequencia.empty:
+        st.info("Nenhum(a) aluno(a) cadastrado(a) ainda.")
+        st.stop()
 
-    st.dataframe(df_display_hist, use_container_width=True)
+    if 'Status' in df_frequencia.columns:
+        df_ativos = df_frequencia[df_frequencia['Status'].str.lower() == 'ativa']
+    else:
+        df_ativos = df_frequencia
+    limite_dias = st.slider("Alertar alunos(as) ativos(as) sem aula há mais de (dias):", 7, 60, 14)
+    df_ausentes = df_ativos[df_ativos['Dias_Sem_Aula'].isna() | (df_ativos['Dias_Sem_Aula'] > limite_dias)]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Alunos(as) Ativos(as)", len(df_ativos))
+    media_semanal = df_ativos['Media_4_Semanas'].mean() if not df_ativos.empty else 0.0
+    col2.metric("Média de Aulas/Semana (4 sem.)", f"{media_semanal:.2f}")
+    col3.metric(f"Sem Aula há +{limite_dias} dias", len(df_ausentes))
+
+    st.subheader("Aulas por Mês (Studio)")
+    if df_mensal.empty:
+        st.info("Nenhuma presença registrada ainda.")
+    else:
+        chart_mensal = alt.Chart(df_mensal.tail(12)).mark_bar(color='#1f77b4').encode(
+            x=alt.X('yearmonth(Mes):O', title='Mês'),
+            y=alt.Y('Aulas:Q', title='Aulas'),
+            tooltip=[alt.Tooltip('yearmonth(Mes)', title='Mês'), 'Aulas']
+        ).properties(height=300)
+        st.altair_chart(chart_mensal, use_container_width=True)
+
+    st.subheader("Frequência por Aluno(a) Ativo(a)")
+    cols_freq = ['Nome', 'Plano', 'Aulas_Mes', 'Media_4_Semanas', 'Aulas_Semana_Plano', 'Uso_Plano',
+                 'Ultima_Aula', 'Dias_Sem_Aula', 'Total_Aulas']
+    cols_freq_exist = [col for col in cols_freq if col in df_ativos.columns]
+    st.dataframe(
+        df_ativos[cols_freq_exist].sort_values(by='Dias_Sem_Aula', ascending=False),
+        use_container_width=True, hide_index=True,
+        column_config={
+            'Aulas_Mes': st.column_config.NumberColumn("Aulas no Mês"),
+            'Media_4_Semanas': st.column_config.NumberColumn("Média/Semana (4 sem.)", format="%.2f"),
+            'Aulas_Semana_Plano': st.column_config.NumberColumn("Aulas/Semana do Plano"),
+            'Uso_Plano': st.column_config.ProgressColumn("Uso do Plano", format="percent", min_value=0,
+                                                         max_value=1),
+            'Ultima_Aula': st.column_config.DateColumn("Última Aula", format="DD/MM/YYYY"),
+            'Dias_Sem_Aula': st.column_config.NumberColumn("Dias sem Aula"),
+            'Total_Aulas': st.column_config.NumberColumn("Total de Aulas"),
+        })
 
 
 # -----------------------------------------------------
@@ -2131,107 +2605,129 @@ def pagina_relatorio_renovacoes():
 # -----------------------------------------------------
 def pagina_aniversariantes():
     st.title("🎂 Aniversariantes e Celebrações")
-    st.write("Veja os aniversários de vida e de studio para este mês e o próximo.")
+    st.write("Veja os aniversários de vida e de studio dos alunos(as) ativos(as).")
 
     try:
-        df_matriculas = load_matriculas()
-        if df_matriculas.empty:
-            st.error("Não foi possível carregar as matrículas.")
+        indice_comemoracoes = load_indice_comemoracoes(estudio)
+        if not indice_comemoracoes['vida'] and not indice_comemoracoes['studio']:
+            st.info("Nenhum aniversário de aluno(a) 'Ativo(a)' encontrado.")
             st.stop()
-
-        df_ativas = df_matriculas[df_matriculas['Status'].str.lower() == 'ativa'].copy()
-        if df_ativas.empty:
-            st.info("Nenhum aluno(a) 'Ativo(a)' encontrado.")
-            st.stop()
-
     except Exception as e:
         st.error(f"Erro ao carregar dados: {e}")
         st.stop()
 
-    mes_seguinte = (hoje + relativedelta(months=1)).month
-    nome_mes_atual = LISTA_MESES_NOMES[MES_ATUAL]
-    nome_mes_seguinte = LISTA_MESES_NOMES[mes_seguinte]
-
-    st.subheader(f"Filtrando para: {nome_mes_atual} e {nome_mes_seguinte}")
-
-    if 'Data_Nascimento' in df_ativas.columns:
-        df_ativas['Mes_Nasc'] = df_ativas['Data_Nascimento'].dt.month
-        df_ativas['Dia_Nasc'] = df_ativas['Data_Nascimento'].dt.day
-    else:
-        st.error("Coluna 'Data_Nascimento' não encontrada em Matrículas.")
-        df_ativas['Mes_Nasc'] = pd.NaT
-        df_ativas['Dia_Nasc'] = pd.NaT
-
-    if 'Data_Primeira_Matricula' in df_ativas.columns:
-        df_ativas['Mes_Studio'] = df_ativas['Data_Primeira_Matricula'].dt.month
-        df_ativas['Dia_Studio'] = df_ativas['Data_Primeira_Matricula'].dt.day
-        df_ativas['Anos_Studio'] = df_ativas['Data_Primeira_Matricula'].apply(
-            lambda x: relativedelta(hoje.date(), x.date()).years if pd.notna(x) else 0
-        )
+    periodo = st.radio("Período:", ["Este Mês e o Próximo", "Esta Semana", "Próximos 45 Dias",
+                                    "Período Personalizado"], index=0, horizontal=True)
+
+    hoje_dt = pd.Timestamp(hoje.date())
+    if periodo == "Esta Semana":
+        inicio_semana = hoje_dt - pd.Timedelta(days=hoje_dt.weekday())
+        janelas = [("Esta Semana", inicio_semana, inicio_semana + pd.Timedelta(days=6), "nesta semana")]
+    elif periodo == "Próximos 45 Dias":
+        janelas = [("Próximos 45 Dias", hoje_dt, hoje_dt + pd.Timedelta(days=45), "nos próximos 45 dias")]
+    elif periodo == "Período Personalizado":
+        datas_escolhidas = st.date_input("Selecione o período:",
+                                         value=(hoje.date(), (hoje + relativedelta(days=30)).date()),
+                                         format="DD/MM/YYYY")
+        if len(datas_escolhidas) != 2:
+            st.info("Selecione a data inicial e a data final.")
+            st.stop()
+        janelas = [("Período Selecionado", pd.Timestamp(datas_escolhidas[0]), pd.Timestamp(datas_escolhidas[1]),
+                    "no período selecionado")]
     else:
-        st.error("Coluna 'Data_Primeira_Matricula' não encontrada em Matrículas.")
-        df_ativas['Mes_Studio'] = pd.NaT
-        df_ativas['Dia_Studio'] = pd.NaT
-        df_ativas['Anos_Studio'] = 0
+        mes_seguinte = hoje + relativedelta(months=1)
+        janelas = []
+        for data_mes, rotulo in [(hoje, "Mês Atual"), (mes_seguinte, "Próximo Mês")]:
+            inicio_mes = pd.Timestamp(data_mes.year, data_mes.month, 1)
+            nome_mes = LISTA_MESES_NOMES[data_mes.month]
+            janelas.append((f"{nome_mes} ({rotulo})", inicio_mes, inicio_mes + pd.offsets.MonthEnd(0),
+                            f"em {nome_mes}"))
+
+    def texto_anos_studio(anos):
+        # Se for menos de 1 ano, mas no mês de aniversário, celebramos o 1º ano.
+        if anos > 0:
+            return f"({anos} ano{'s' if anos > 1 else ''})"
+        return "(1º ano)"
 
     col1, col2 = st.columns(2)
+    for coluna, tipo, titulo, vazio in [(col1, 'vida', "🎉 Aniversários (Vida)", "Nenhum aniversariante"),
+                                        (col2, 'studio', "⭐ Aniversários (Studio)", "Nenhum aniversário de studio")]:
+        with coluna:
+            st.header(titulo)
+            for titulo_janela, inicio, fim, descricao_janela in janelas:
+                st.markdown(f"#### {titulo_janela}")
+                df_periodo = calculos.comemoracoes_no_periodo(indice_comemoracoes, tipo, inicio, fim)
+                if df_periodo.empty:
+                    st.info(f"{vazio} {descricao_janela}.")
+                    continue
+
+                linhas = []
+                for data, nome, anos in zip(df_periodo['Data'], df_periodo['Nome'], df_periodo['Anos']):
+                    sufixo = f" {texto_anos_studio(anos)}" if tipo == 'studio' else ""
+                    linhas.append(f"**{data:%d/%m}** - {nome}{sufixo}")
+                st.markdown("  \n".join(linhas))
 
-    with col1:
-        st.header(f"🎉 Aniversários (Vida)")
-        st.markdown(f"#### {nome_mes_atual} (Mês Atual)")
 
-        df_nasc_atual = df_ativas[df_ativas['Mes_Nasc'] == MES_ATUAL].sort_values(by="Dia_Nasc")
-        if df_nasc_atual.empty:
-            st.info(f"Nenhum aniversariante em {nome_mes_atual}.")
-        else:
-            for _, aluno in df_nasc_atual.iterrows():
-                st.markdown(f"**{aluno['Dia_Nasc']:02.0f}/{aluno['Mes_Nasc']:02.0f}** - {aluno['Nome']}")
-
-        st.markdown(f"#### {nome_mes_seguinte} (Próximo Mês)")
-        df_nasc_seguinte = df_ativas[df_ativas['Mes_Nasc'] == mes_seguinte].sort_values(by="Dia_Nasc")
-        if df_nasc_seguinte.empty:
-            st.info(f"Nenhum aniversariante em {nome_mes_seguinte}.")
-        else:
-            for _, aluno in df_nasc_seguinte.iterrows():
-                st.markdown(f"**{aluno['Dia_Nasc']:02.0f}/{aluno['Mes_Nasc']:02.0f}** - {aluno['Nome']}")
-
-    with col2:
-        st.header(f"⭐ Aniversários (Studio)")
-        st.markdown(f"#### {nome_mes_atual} (Mês Atual)")
-
-        df_studio_atual = df_ativas[df_ativas['Mes_Studio'] == MES_ATUAL].sort_values(by="Dia_Studio")
-        if df_studio_atual.empty:
-            st.info(f"Nenhum aniversário de studio em {nome_mes_atual}.")
-        else:
-            for _, aluno in df_studio_atual.iterrows():
-                anos = aluno['Anos_Studio']
-                # Ajuste para 0 anos -> 1º ano
-                texto_anos = f"({anos + 1}º ano)" if anos == 0 else f"({anos} anos)"
-                if anos > 0:
-                    texto_anos = f"({anos} ano{'s' if anos > 1 else ''})"
-                else:
-                    # Se for menos de 1 ano, mas no mês de aniversário, celebramos o 1º ano.
-                    texto_anos = "(1º ano)"
+# -----------------------------------------------------
+# PÁGINA: VISÃO CONSOLIDADA (TODOS OS ESTÚDIOS)
+# -----------------------------------------------------
+# Os totais vêm do Resumo_Mensal; estúdio sem a aba (ou sem o mês) calcula das abas de origem
+ABAS_FLUXO_MES = (resumo_mensal.ABA_RESUMO,)
 
-                st.markdown(
-                    f"**{aluno['Dia_Studio']:02.0f}/{aluno['Mes_Studio']:02.0f}** - {aluno['Nome']} {texto_anos}")
 
-        st.markdown(f"#### {nome_mes_seguinte} (Próximo Mês)")
-        df_studio_seguinte = df_ativas[df_ativas['Mes_Studio'] == mes_seguinte].sort_values(by="Dia_Studio")
-        if df_studio_seguinte.empty:
-            st.info(f"Nenhum aniversário de studio em {nome_mes_seguinte}.")
-        else:
-            for _, aluno in df_studio_seguinte.iterrows():
-                anos = aluno['Anos_Studio']
-                # Ajuste para 0 anos -> 1º ano
-                texto_anos = f"({anos + 1}º ano)" if anos == 0 else f"({anos} anos)"
-                if anos > 0:
-                    texto_anos = f"({anos} ano{'s' if anos > 1 else ''})"
-                else:
-                    texto_anos = "(1º ano)"
+def pagina_consolidado():
+    st.title("🏢 Visão Consolidada dos Studios")
+    st.write("Fluxo de caixa do mês de competência em cada studio e o total da rede.")
 
-                st.markdown(
-                    f"**{aluno['Dia_Studio']:02.0f}/{aluno['Mes_Studio']:02.0f}** - {aluno['Nome']} {texto_anos}")
+    col1, col2 = st.columns(2)
+    with col1:
+        mes_selecionado = st.selectbox("Mês de Competência", options=LISTA_MESES_NOMES.keys(),
+                                       format_func=lambda mes: f"{mes} - {LISTA_MESES_NOMES[mes]}",
+                                       index=MES_ATUAL - 1, key="consolidado_mes")
+    with col2:
+        ano_selecionado = st.number_input("Ano de Competência", min_value=2024, value=ANO_ATUAL, step=1,
+                                          key="consolidado_ano")
+    mes_selecionado, ano_selecionado = int(mes_selecionado), int(ano_selecionado)
+
+    # Conecta aqui (cache_resource precisa do contexto da sessão) e lê as abas de todos os estúdios em paralelo
+    conectados = [id_estudio for id_estudio in ESTUDIOS if connect_to_sheets(id_estudio) is not None]
+    with st.spinner("Carregando os studios..."):
+        falhas = conexao_sheets.aquecer_em_paralelo({id_estudio: load_cache_abas(id_estudio)
+                                                     for id_estudio in conectados}, ABAS_FLUXO_MES)
+    falhas = {chave: erro for chave, erro in falhas.items()
+              if not isinstance(erro, gspread.exceptions.WorksheetNotFound)}
+    for (id_estudio, aba), erro in falhas.items():
+        st.warning(f"{ESTUDIOS[id_estudio]['nome']}: falha ao ler a aba '{aba}': {erro}")
+
+    linhas = []
+    for id_estudio in conectados:
+        if any(chave[0] == id_estudio for chave in falhas):
+            continue
+        totais = totais_do_mes(id_estudio, mes_selecionado, ano_selecionado)
+        linhas.append({'Studio': ESTUDIOS[id_estudio]['nome'],
+                       'Receita Prevista': totais['receita_prevista'],
+                       'Receita Bruta': totais['receita_bruta'],
+                       'Receita Líquida': totais['receita_liquida'],
+                       'Gastos Previstos': totais['gastos_previstos'],
+                       'Gastos Pagos': totais['gastos_realizados'],
+                       'Lucro (Caixa)': totais['receita_liquida'] - totais['gastos_realizados']})
+    if not linhas:
+        st.error("Nenhum studio pôde ser carregado.")
+        return
+
+    df_consolidado = pd.DataFrame(linhas)
+    total = df_consolidado.drop(columns='Studio').sum()
+
+    st.subheader(f"Rede: {LISTA_MESES_NOMES[mes_selecionado]}/{ano_selecionado}")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Receita Prevista", f"R$ {total['Receita Prevista']:,.2f}")
+    col2.metric("Receita Realizada (Líquido)", f"R$ {total['Receita Líquida']:,.2f}")
+    col3.metric("Gastos Pagos", f"R$ {total['Gastos Pagos']:,.2f}")
+    col4.metric("Lucro (Caixa)", f"R$ {total['Lucro (Caixa)']:,.2f}")
+
+    df_consolidado = pd.concat([df_consolidado, pd.DataFrame([{'Studio': "Total", **total}])], ignore_index=True)
+    st.dataframe(df_consolidado, use_container_width=True, hide_index=True,
+                 column_config={coluna: coluna_reais(coluna) for coluna in df_consolidado.columns if coluna != 'Studio'})
 
 
 # -----------------------------------------------------
@@ -2257,8 +2753,12 @@ if sheet:
         "--- (Consultas) ---": None,
         "🔍 Alunos e Histórico": pagina_todos_alunos,
         "✅ Registrar Presença": pagina_presenca,
+        "📅 Frequência dos Alunos": pagina_frequencia,
         "🎂 Aniversariantes do Mês": pagina_aniversariantes,
     }
+    if len(ESTUDIOS) > 1:
+        paginas["--- (Rede) ---"] = None
+        paginas["🏢 Visão Consolidada"] = pagina_consolidado
 
     query_params = st.query_params.to_dict()
     default_page = query_params.get("page", [list(paginas.keys())[0]])[0]
@@ -2272,9 +2772,49 @@ if sheet:
 
     st.sidebar.divider()
     if st.sidebar.button("🔄 Forçar Atualização dos Dados"):
-        clear_all_caches()
+        clear_all_caches(estudio)
+        load_indice_documentos.clear(estudio)
+        _estado_agregados_presencas.clear(estudio)
         st.toast("Dados atualizados com sucesso!", icon="✅")
 
+    with st.sidebar.expander("📊 Resumo Mensal"):
+        st.caption("Totais por mês (aba Resumo_Mensal) lidos pelo Financeiro. Cada lançamento atualiza os meses "
+                   "que mudou; reconstrua depois de editar as abas direto na planilha.")
+        if st.button("Reconstruir resumo", key="reconstruir_resumo"):
+            try:
+                with st.spinner("Recalculando todos os meses..."):
+                    meses_gravados = reconstruir_resumo_mensal(estudio)
+                st.success(f"Resumo_Mensal reconstruído: {meses_gravados} mês(es).")
+            except Exception as e:
+                st.error(f"Erro ao reconstruir o resumo: {e}")
+
+    with st.sidebar.expander("🗄️ Arquivar Anos Fechados"):
+        ano_limite_arquivo = ANO_ATUAL - arquivamento.ANOS_QUENTES + 1
+        st.caption(f"Move presenças, pagamentos e despesas pagas de antes de {ano_limite_arquivo} para abas por ano "
+                   "(ex: Pagamentos_Recebidos_2023). As telas ficam mais leves e os relatórios de anos antigos "
+                   "continuam buscando essas abas quando precisam.")
+        if st.button("Arquivar agora", key="arquivar_anos"):
+            try:
+                with st.spinner("Arquivando..."):
+                    movidas = arquivamento.arquivar_anos_fechados(sheet, ano_limite_arquivo)
+                clear_all_caches(estudio)
+                # As abas de arquivo podem ter recebido linhas novas
+                load_presencas.clear()
+                load_pagamentos.clear()
+                load_despesas.clear()
+                for aba in ("Pagamentos_Recebidos", "Lancamentos_Despesas"):
+                    load_indice_periodos(estudio, aba).reconstruir()
+                if movidas:
+                    st.success("\n".join(f"- {aba} {ano}: {linhas} linha(s)" for (aba, ano), linhas in movidas.items()))
+                else:
+                    st.info("Nada a arquivar.")
+            except Exception as e:
+                st.error(f"Erro ao arquivar: {e}")
+
+    contadores_sheets = conexao_sheets.CLIENTE_PADRAO.contadores()
+    st.sidebar.caption(f"Google Sheets: {contadores_sheets['requisicoes']} requisições "
+                       f"({contadores_sheets['limitadas']} limitadas, {contadores_sheets['coalescidas']} compartilhadas)")
+
     if "page" in st.query_params:
         st.query_params.clear()
 
@@ -0,0 +1,221 @@
+import contextlib
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import conexao_sheets
+
+# -----------------------------------------------------
+# ARQUIVAMENTO POR ANO (SEM STREAMLIT)
+# -----------------------------------------------------
+# As abas de movimento só crescem e cada carga lê o histórico inteiro. O
+# arquivamento move as linhas dos anos fechados para abas "<Aba>_<ano>" na mesma
+# planilha e registra cada partição na aba Arquivo_Historico (linhas e maior ID,
+# para os novos IDs continuarem a sequência). O app lê só a aba principal (a
+# partição "quente") e busca os anos arquivados quando um relatório pede.
+# Despesas só são arquivadas depois de pagas: as contas a pagar continuam completas.
+# O arquivamento apaga linhas, então roda sob travar(planilha): uma trava por
+# planilha no processo (sessões do app) e um arquivo de trava na máquina (o app e o
+# precalculo.py --arquivar). Quem escreve numa linha pelo número dela, nas abas
+# arquivadas, usa a mesma trava, assim como quem recalcula e regrava o Resumo_Mensal.
+
+ABA_INDICE = "Arquivo_Historico"
+CABECALHO_INDICE = ["Aba", "Ano", "Aba_Arquivo", "Linhas", "ID_Maximo", "Arquivado_Em"]
+ANOS_QUENTES = 2  # o ano atual e o anterior ficam na aba principal (frequência e comparações recentes)
+ESPERA_ESCRITAS = 30  # segundos que uma escrita por número de linha espera um arquivamento em andamento
+TRAVA_EXPIRA = 2 * 3600  # segundos; arquivo de trava mais velho que isso ficou de um processo que morreu
+
+PARTICOES = {
+    'Presencas_Evolucao': {'id': 'ID_Presenca', 'ano': 'Data_Aula'},
+    'Pagamentos_Recebidos': {'id': 'ID_Pagamento', 'ano': 'Ano_Competencia'},
+    'Lancamentos_Despesas': {'id': 'ID', 'ano': 'Ano_Competencia', 'somente': ('Status_Pagamento', 'Pago')},
+}
+
+
+def titulo_particao(aba, ano):
+    """Nome da aba de arquivo de um ano (ex: Pagamentos_Recebidos_2023)."""
+    return f"{aba}_{ano}"
+
+
+def _coluna(valores, nome):
+    """Textos de uma coluna (pelo cabeçalho) em todas as linhas de dados; '' onde a linha é mais curta."""
+    cabecalho = [titulo.strip() for titulo in valores[0]]
+    if nome not in cabecalho:
+        return pd.Series([''] * (len(valores) - 1), dtype=object)
+    posicao = cabecalho.index(nome)
+    return pd.Series([linha[posicao].strip() if posicao < len(linha) else '' for linha in valores[1:]],
+                     dtype=object)
+
+
+def anos_das_linhas(valores, aba):
+    """Ano de cada linha de dados (valores crus, cabeçalho primeiro); NaN nas que não podem ser arquivadas."""
+    regra = PARTICOES[aba]
+    textos = _coluna(valores, regra['ano'])
+    if regra['ano'].startswith('Data'):
+        anos = pd.to_datetime(textos, errors='coerce').dt.year
+    else:
+        anos = pd.to_numeric(textos, errors='coerce')
+    if 'somente' in regra:
+        coluna, valor = regra['somente']
+        anos = anos.where(_coluna(valores, coluna) == valor)
+    return anos
+
+
+def linhas_a_arquivar(valores, aba, ano_limite):
+    """{ano: posições (base 0, sem o cabeçalho) das linhas} dos anos anteriores a `ano_limite`."""
+    if len(valores) < 2:
+        return {}
+    anos = anos_das_linhas(valores, aba)
+    anos = anos[(anos > 0) & (anos < ano_limite)]
+    return {int(ano): posicoes.index.tolist() for ano, posicoes in anos.groupby(anos)}
+
+
+def _blocos(posicoes):
+    """Agrupa posições ordenadas em intervalos contíguos [(inicio, fim)]."""
+    blocos = []
+    for posicao in posicoes:
+        if blocos and posicao == blocos[-1][1] + 1:
+            blocos[-1][1] = posicao
+        else:
+            blocos.append([posicao, posicao])
+    return [tuple(bloco) for bloco in blocos]
+
+
+_travas = {}
+_lock_travas = threading.Lock()
+
+
+def _trava_do_processo(planilha):
+    with _lock_travas:
+        return _travas.setdefault(planilha.id, threading.Lock())
+
+
+def _pegar_arquivo_de_trava(caminho, limite):
+    while True:
+        try:
+            os.close(os.open(caminho, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(caminho) > TRAVA_EXPIRA:
+                    os.remove(caminho)
+                    continue
+            except FileNotFoundError:
+                continue
+        if time.monotonic() >= limite:
+            return False
+        time.sleep(0.5)
+
+
+@contextlib.contextmanager
+def travar(planilha, espera=0):
+    """Exclusão mútua entre o arquivamento, as escritas por número de linha e o Resumo_Mensal na planilha.
+
+    Espera até `espera` segundos; sem conseguir, RuntimeError.
+    """
+    limite = time.monotonic() + espera
+    trava = _trava_do_processo(planilha)
+    if not trava.acquire(timeout=espera):
+        raise RuntimeError("Há um arquivamento ou atualização do resumo em andamento nesta planilha; "
+                           "tente de novo em alguns minutos.")
+    try:
+        caminho = os.path.join(tempfile.gettempdir(), f"arquivamento-{planilha.id}.lock")
+        if not _pegar_arquivo_de_trava(caminho, limite):
+            raise RuntimeError("Há um arquivamento ou atualização do resumo em andamento nesta planilha "
+                               "(precalculo.py); tente de novo em alguns minutos.")
+        try:
+            yield
+        finally:
+            os.remove(caminho)
+    finally:
+        trava.release()
+
+
+def _apagar_por_id(aba, cabecalho, coluna_id, ids_a_apagar):
+    """Apaga da aba as linhas com esses IDs, um bloco contíguo por vez, de baixo para cima.
+
+    A coluna de IDs é relida antes de cada bloco: apagar pelas posições de uma leitura
+    antiga levaria linhas erradas se a aba mudou nesse meio-tempo.
+    """
+    numero_coluna = [titulo.strip() for titulo in cabecalho].index(coluna_id) + 1
+    pendentes = set(ids_a_apagar)
+    while pendentes:
+        atuais = [valor.strip() for valor in aba.col_values(numero_coluna)[1:]]
+        posicoes = [posicao for posicao, valor in enumerate(atuais) if valor in pendentes]
+        if not posicoes:
+            break
+        inicio, fim = _blocos(posicoes)[-1]
+        # Linha 1 é o cabeçalho
+        aba.delete_rows(inicio + 2, fim + 2)
+        pendentes -= set(atuais[inicio:fim + 1])
+
+
+def ler_indice(planilha):
+    """Aba Arquivo_Historico (criada se faltar) e {(aba, ano): linha do índice}."""
+    aba_indice = conexao_sheets.abrir_ou_criar_aba(planilha, ABA_INDICE, CABECALHO_INDICE)
+    indice = {}
+    for linha in aba_indice.get_all_values()[1:]:
+        if len(linha) >= len(CABECALHO_INDICE) and linha[0]:
+            indice[(linha[0], int(linha[1]))] = linha[:len(CABECALHO_INDICE)]
+    return aba_indice, indice
+
+
+def arquivar_anos_fechados(planilha, ano_limite=None, abas=tuple(PARTICOES), agora=None):
+    """Move as linhas dos anos anteriores a `ano_limite` para as abas de arquivo de cada ano.
+
+    Sem `ano_limite`, mantém ANOS_QUENTES anos na aba principal. Pode ser repetido com
+    segurança: as linhas só saem da aba principal depois de gravadas no arquivo, e as
+    que já estão lá (mesmo ID) não são copiadas de novo. Linhas sem ID, ou com um ID que
+    também aparece numa linha que fica, não são arquivadas (são apagadas pelo ID).
+    Devolve {(aba, ano): linhas movidas}; RuntimeError se outro arquivamento está rodando.
+    """
+    agora = agora or datetime.now()
+    if ano_limite is None:
+        ano_limite = agora.year - ANOS_QUENTES + 1
+    with travar(planilha):
+        return _arquivar(planilha, ano_limite, abas, agora)
+
+
+def _arquivar(planilha, ano_limite, abas, agora):
+    aba_indice, indice = ler_indice(planilha)
+
+    movidas = {}
+    for aba in abas:
+        aba_principal = planilha.worksheet(aba)
+        valores = aba_principal.get_all_values()
+        ids = _coluna(valores, PARTICOES[aba]['id'])
+        grupos = linhas_a_arquivar(valores, aba, ano_limite)
+        arquivaveis = {posicao for posicoes in grupos.values() for posicao in posicoes}
+        ids_que_ficam = {ids[posicao] for posicao in range(len(ids)) if posicao not in arquivaveis}
+        grupos = {ano: [posicao for posicao in posicoes if ids[posicao] and ids[posicao] not in ids_que_ficam]
+                  for ano, posicoes in grupos.items()}
+        grupos = {ano: posicoes for ano, posicoes in grupos.items() if posicoes}
+        if not grupos:
+            continue
+
+        for ano, posicoes in sorted(grupos.items()):
+            titulo = titulo_particao(aba, ano)
+            aba_arquivo = conexao_sheets.abrir_ou_criar_aba(planilha, titulo, valores[0])
+            existentes = aba_arquivo.get_all_values()[1:]
+            ids_arquivo = set(_coluna([valores[0]] + existentes, PARTICOES[aba]['id']))
+            novas = [valores[posicao + 1] for posicao in posicoes if ids[posicao] not in ids_arquivo]
+            if novas:
+                aba_arquivo.append_rows(novas, value_input_option='USER_ENTERED')
+
+            ids_particao = pd.to_numeric(_coluna([valores[0]] + existentes + novas, PARTICOES[aba]['id']),
+                                         errors='coerce')
+            id_maximo = int(ids_particao.max()) if ids_particao.notna().any() else 0
+            indice[(aba, ano)] = [aba, str(ano), titulo, str(len(existentes) + len(novas)), str(id_maximo),
+                                  agora.strftime("%Y-%m-%d %H:%M:%S")]
+            movidas[(aba, ano)] = len(posicoes)
+
+        # O índice (com o maior ID) é gravado antes de apagar, para os IDs novos nunca repetirem os arquivados
+        aba_indice.update(values=[CABECALHO_INDICE] + [indice[chave] for chave in sorted(indice)], range_name='A1')
+        _apagar_por_id(aba_principal, valores[0], PARTICOES[aba]['id'],
+                       {ids[posicao] for posicoes in grupos.values() for posicao in posicoes})
+
+    return movidas
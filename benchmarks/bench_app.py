@@ -0,0 +1,163 @@
+"""
+Benchmark dos loaders (load_*) e das páginas (pagina_*) em várias escalas de dados.
+
+Usa a planilha sintética de dados_sinteticos.py em memória, sem acesso ao Google Sheets.
+Cada medida é o melhor tempo de `--repeticoes` execuções (o menos sujeito a ruído), em ms:
+
+- loaders: a função é chamada com o próprio cache limpo e as dependências já em cache
+  (mede só o trabalho dela); load_agregados_presencas é medido na carga completa;
+- páginas: a função pagina_* chamada com o app importado fora do servidor (widgets no
+  valor padrão, sem renderização), "quente" (caches cheios) e "fria" (todos os caches
+  limpos, incluindo a leitura das abas).
+
+Os resultados são comparados com benchmarks/baseline.json; medidas acima de
+baseline * (1 + tolerância) e mais de 10 ms mais lentas contam como regressão e o
+script sai com código 1. A baseline depende da máquina: grave de novo ao trocar
+de ambiente.
+
+    python benchmarks/bench_app.py [--escalas pequeno medio] [--repeticoes 5]
+    python benchmarks/bench_app.py --salvar-baseline
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+
+import streamlit as st
+
+from comum import RAIZ, importar_app
+from dados_sinteticos import ESCALAS, gerar_escala
+from sheets_memoria import PlanilhaMemoria
+
+BASELINE = os.path.join(RAIZ, "benchmarks", "baseline.json")
+FOLGA_MINIMA_MS = 10.0
+
+
+def argumentos_loaders(app):
+    """Argumentos usados para medir os loaders que recebem mais que o estúdio (os mesmos das páginas)."""
+    hoje = date.today()
+    estudio = app.estudio
+    return {
+        'load_historico_cdi': (),
+        'load_frequencia_alunos': (estudio, hoje),
+        'load_saldos_investimentos': (estudio, hoje),
+        'load_ciclos_contrato': (estudio, hoje),
+        'load_coortes': (estudio, hoje, list(app.calculos.PERIODOS_COORTE)[0]),
+        'load_pagina_alunos': (estudio, "Ativa", (), "", "ID", False, 1, 50),
+        'load_pagamentos_do_mes': (estudio, hoje.month, hoje.year),
+        'load_despesas_do_mes': (estudio, hoje.month, hoje.year),
+        'load_fluxo_mes': (estudio, hoje.month, hoje.year),
+        'load_projecao_anual': (estudio, hoje.month, hoje.year),
+        'load_status_pagamentos': (estudio, hoje.month, hoje.year),
+        'load_vencimentos': (estudio, hoje),
+    }
+
+
+def medir_loaders(app, repeticoes):
+    argumentos = argumentos_loaders(app)
+    loaders = sorted(nome for nome in dir(app)
+                     if nome.startswith('load_') and hasattr(getattr(app, nome), 'clear')
+                     and nome not in ('load_cache_abas', 'load_indice_documentos', 'load_indice_periodos'))
+    resultados = {}
+    for nome in loaders:
+        funcao = getattr(app, nome)
+        args = argumentos.get(nome, (app.estudio,))
+        funcao(*args)  # aquece as dependências
+        tempos = []
+        for _ in range(repeticoes):
+            funcao.clear()
+            if nome == 'load_agregados_presencas':
+                app._estado_agregados_presencas.clear(app.estudio)
+            inicio = time.perf_counter()
+            funcao(*args)
+            tempos.append(time.perf_counter() - inicio)
+        resultados[nome] = min(tempos) * 1000
+    return resultados
+
+
+def medir_paginas(app, repeticoes):
+    paginas = sorted(nome for nome in dir(app) if nome.startswith('pagina_'))
+    resultados = {}
+    for nome in paginas:
+        pagina = getattr(app, nome)
+        pagina()
+        quente, fria = [], []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            pagina()
+            quente.append(time.perf_counter() - inicio)
+        for _ in range(repeticoes):
+            st.cache_data.clear()
+            st.cache_resource.clear()
+            inicio = time.perf_counter()
+            pagina()
+            fria.append(time.perf_counter() - inicio)
+        resultados[f"{nome} (quente)"] = min(quente) * 1000
+        resultados[f"{nome} (fria)"] = min(fria) * 1000
+    return resultados
+
+
+def comparar(resultados, baseline, tolerancia):
+    """Lista de (escala, medida, ms, ms da baseline) que regrediram."""
+    regressoes = []
+    for escala, medidas in resultados.items():
+        for nome, ms in medidas.items():
+            referencia = baseline.get(escala, {}).get(nome)
+            if referencia is not None and ms > referencia * (1 + tolerancia) and ms - referencia > FOLGA_MINIMA_MS:
+                regressoes.append((escala, nome, ms, referencia))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--escalas", nargs="+", choices=list(ESCALAS), default=list(ESCALAS))
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--tolerancia", type=float, default=0.5,
+                        help="aumento relativo aceito sobre a baseline (padrão: 0.5 = 50%%)")
+    parser.add_argument("--salvar-baseline", action="store_true",
+                        help="grava os resultados em benchmarks/baseline.json")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding="utf-8") as arquivo:
+            baseline = json.load(arquivo)
+
+    resultados = {}
+    for escala in args.escalas:
+        inicio = time.perf_counter()
+        planilha = PlanilhaMemoria(gerar_escala(escala, hoje=date.today()))
+        linhas = sum(len(aba.linhas) - 1 for aba in planilha.abas.values())
+        print(f"\n== {escala}: {ESCALAS[escala]['alunos']} alunos, {linhas} linhas "
+              f"(gerado em {time.perf_counter() - inicio:.1f} s)")
+        app = importar_app(planilha)
+        resultados[escala] = medir_loaders(app, args.repeticoes)
+        resultados[escala].update(medir_paginas(app, args.repeticoes))
+
+        print(f"{'Medida':<58}{'Atual':>11}{'Baseline':>12}")
+        for nome, ms in resultados[escala].items():
+            referencia = baseline.get(escala, {}).get(nome)
+            coluna_referencia = f"{referencia:>9.1f} ms" if referencia is not None else f"{'-':>12}"
+            print(f"{nome:<58}{ms:>8.1f} ms{coluna_referencia}")
+
+    if args.salvar_baseline:
+        baseline.update({escala: {nome: round(ms, 1) for nome, ms in medidas.items()}
+                         for escala, medidas in resultados.items()})
+        with open(BASELINE, "w", encoding="utf-8") as arquivo:
+            json.dump(baseline, arquivo, ensure_ascii=False, indent=2)
+        print(f"\nBaseline gravada em {BASELINE}")
+        return
+
+    regressoes = comparar(resultados, baseline, args.tolerancia)
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}:")
+        for escala, nome, ms, referencia in regressoes:
+            print(f"  [{escala}] {nome}: {ms:.1f} ms (baseline {referencia:.1f} ms, {ms / referencia - 1:+.0%})")
+        sys.exit(1)
+    print("\nSem regressões." if baseline else "\nSem baseline: use --salvar-baseline para gravar uma.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Teste de carga: N sessões da recepção usando o app ao mesmo tempo.
+
+Cada sessão é um AppTest rodando em sua própria thread (como o servidor do
+Streamlit, que executa cada sessão numa thread do mesmo processo) e repete fluxos
+reais: registrar presença, lançar pagamento, abrir o dashboard e renovar um
+aluno. O backend é a planilha em memória com latência e cota do Sheets, acessada
+pelo ClienteComCota do app (60 req/min).
+
+Para cada quantidade de sessões, informa:
+- latência de cada interação (rerun do app), p50/p95 por fluxo;
+- requisições ao backend por fluxo (medidas numa passada de uma sessão só);
+- acerto dos caches: st.cache_data/st.cache_resource e o cache de abas (CacheDeAbas).
+
+A pausa de 2 s que o app faz depois de salvar (para mostrar os balões) é pulada.
+
+    python benchmarks/bench_carga.py [--sessoes 1 2 4 8] [--fluxos 6] [--alunos 200] [--latencia 0.2]
+"""
+import argparse
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date
+from unittest import mock
+
+import numpy as np
+from streamlit.runtime.caching import cache_utils
+
+from comum import APP, SessaoSimultanea, ambiente_sessoes_simultaneas, conexao_falsa
+import conexao_sheets
+from dados_sinteticos import gerar_planilha
+from sheets_memoria import PlanilhaMemoria
+
+PESOS_FLUXOS = {'presenca': 40, 'pagamento': 25, 'dashboard': 25, 'renovacao': 10}
+METODOS_ESCRITA = ('append_row', 'append_rows', 'update_cells', 'update', 'batch_update')
+
+
+# -----------------------------------------------------
+# INSTRUMENTAÇÃO
+# -----------------------------------------------------
+class Medidor:
+    """Latências por fluxo e acertos de cache, compartilhados entre as threads."""
+
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.erros = Counter()
+        self.mensagens_erro = Counter()
+        self.cache_st = Counter()
+        self._lock = threading.Lock()
+
+    def registrar(self, fluxo, segundos, mensagens_erro=()):
+        with self._lock:
+            self.latencias[fluxo].append(segundos)
+            if mensagens_erro:
+                self.erros[fluxo] += 1
+                self.mensagens_erro.update(str(mensagem)[:150] for mensagem in mensagens_erro)
+
+    def contar_cache(self, resultado):
+        with self._lock:
+            self.cache_st[resultado] += 1
+
+
+def instrumentar_cache_streamlit(medidor):
+    """Conta acertos e faltas de st.cache_data/st.cache_resource (métodos internos: ver comum.VERSAO_STREAMLIT)."""
+    hit, miss = cache_utils.CachedFunc._handle_cache_hit, cache_utils.CachedFunc._handle_cache_miss
+
+    def contar_hit(self, *args, **kwargs):
+        medidor.contar_cache('acertos')
+        return hit(self, *args, **kwargs)
+
+    def contar_miss(self, *args, **kwargs):
+        medidor.contar_cache('faltas')
+        return miss(self, *args, **kwargs)
+
+    return [mock.patch.object(cache_utils.CachedFunc, "_handle_cache_hit", contar_hit),
+            mock.patch.object(cache_utils.CachedFunc, "_handle_cache_miss", contar_miss)]
+
+
+class CachesDeAbasRegistrados(conexao_sheets.CacheDeAbas):
+    """CacheDeAbas que se registra para o relatório de acertos."""
+
+    instancias = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instancias.append(self)
+
+
+_sleep_original = time.sleep
+
+
+def _sleep_fora_do_app(segundos):
+    # Pula as pausas de interface do app.py; latência do backend e backoff continuam
+    if sys._getframe(1).f_code.co_filename != APP:
+        _sleep_original(segundos)
+
+
+# -----------------------------------------------------
+# FLUXOS DA RECEPÇÃO
+# -----------------------------------------------------
+class Recepcao:
+    """Uma sessão (tablet) executando fluxos e medindo cada interação."""
+
+    def __init__(self, medidor, nomes_ativos, rnd):
+        self.medidor = medidor
+        self.nomes_ativos = nomes_ativos
+        self.rnd = rnd
+        self.at = SessaoSimultanea(APP, default_timeout=300)
+        self.fluxo = 'abertura'
+        self._interagir(lambda: self.at)
+
+    def _interagir(self, preparar):
+        """Aplica a interação (troca de widget/clique) e mede o rerun que ela dispara."""
+        elemento = preparar()
+        inicio = time.perf_counter()
+        elemento.run()
+        segundos = time.perf_counter() - inicio
+        mensagens = [e.value for e in self.at.exception] + [e.value for e in self.at.error]
+        self.medidor.registrar(self.fluxo, segundos, mensagens)
+
+    def _ir_para(self, pagina):
+        self._interagir(lambda: self.at.sidebar.radio[0].set_value(pagina))
+
+    def _buscar_aluno(self, chave):
+        self._interagir(lambda: self.at.text_input(key=f"busca_{chave}").input(self.rnd.choice(self.nomes_ativos)))
+        selecao = self.at.selectbox(key=f"sel_{chave}")
+        if selecao.value is None and selecao.options:
+            # As opções vêm formatadas ("Nome (ID 12)"); o valor do widget é o ID
+            id_aluno = int(re.search(r"\(ID (\d+)\)$", selecao.options[0]).group(1))
+            self._interagir(lambda: selecao.set_value(id_aluno))
+
+    def _widget(self, tipo, rotulo):
+        return next(w for w in getattr(self.at, tipo) if w.label == rotulo)
+
+    def presenca(self):
+        self._ir_para("✅ Registrar Presença")
+        self._buscar_aluno("presenca")
+        self._interagir(lambda: self._widget('button', "Registrar Presença e Salvar Notas").click())
+
+    def pagamento(self):
+        self._ir_para("💰 Lançar Pagamento")
+        self._buscar_aluno("pagamento")
+        self._interagir(lambda: self._widget('number_input', "Valor Pago (Bruto) (R$)*").set_value(350.0))
+        self._interagir(lambda: self._widget('selectbox', "Bandeira*").set_value("PIX"))
+        self._interagir(lambda: self.at.selectbox(key="tipo_PIX").set_value("N/A"))
+        self._interagir(lambda: self._widget('button', "Lançar Pagamento").click())
+
+    def dashboard(self):
+        self._ir_para("📈 Dashboard Financeiro")
+        self._interagir(lambda: self.at.toggle(key="dash_graficos").set_value(True))
+        mes_anterior = (date.today().month - 2) % 12 + 1
+        self._interagir(lambda: self._widget('selectbox', "Mês de Competência").set_value(mes_anterior))
+
+    def renovacao(self):
+        self._ir_para("🔔 Gestão de Renovações")
+        botoes = [b for b in self.at.button if b.label == "✅ Confirmar Renovação"]
+        if botoes:
+            self._interagir(lambda: self.rnd.choice(botoes).click())
+
+    def executar(self, fluxo):
+        self.fluxo = fluxo
+        try:
+            getattr(self, fluxo)()
+        except (KeyError, StopIteration):
+            # A página não mostrou o widget esperado (ex: parou num erro); o fluxo é abandonado
+            self.medidor.registrar(fluxo, 0.0, [f"Fluxo '{fluxo}' interrompido: widget não encontrado"])
+
+
+# -----------------------------------------------------
+# EXECUÇÃO
+# -----------------------------------------------------
+def rodar_carga(abas, n_sessoes, n_fluxos, args, semente=0):
+    planilha = PlanilhaMemoria(abas, latencia=args.latencia, variacao=args.latencia / 2,
+                               cota_por_minuto=args.cota, semente=semente)
+    cliente = conexao_sheets.ClienteComCota(conexao_sheets.JanelaDeRequisicoes(args.cota))
+    medidor = Medidor()
+    CachesDeAbasRegistrados.instancias = []
+    nomes_ativos = [linha[2] for linha in abas['Matriculas'][1:] if linha[8] == 'Ativa']
+
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    patches = instrumentar_cache_streamlit(medidor) + [
+        mock.patch.object(conexao_sheets, "CacheDeAbas", CachesDeAbasRegistrados),
+        mock.patch("time.sleep", _sleep_fora_do_app),
+    ]
+    for patch in patches:
+        patch.start()
+    falhas = []
+    try:
+        with conexao_falsa(planilha, cliente), ambiente_sessoes_simultaneas():
+            largada = threading.Barrier(n_sessoes)
+
+            def sessao(indice):
+                rnd = random.Random(semente * 1000 + indice)
+                try:
+                    largada.wait()
+                    recepcao = Recepcao(medidor, nomes_ativos, rnd)
+                    for _ in range(n_fluxos):
+                        time.sleep(rnd.uniform(0, 2 * args.pausa))
+                        recepcao.executar(rnd.choices(list(PESOS_FLUXOS), list(PESOS_FLUXOS.values()))[0])
+                except Exception as e:
+                    falhas.append(e)
+
+            inicio = time.perf_counter()
+            threads = [threading.Thread(target=sessao, args=(i,)) for i in range(n_sessoes)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            duracao = time.perf_counter() - inicio
+    finally:
+        for patch in reversed(patches):
+            patch.stop()
+    if falhas:
+        raise falhas[0]
+
+    cache_abas = Counter()
+    for cache in CachesDeAbasRegistrados.instancias:
+        cache_abas.update(cache.contadores())
+    return {'medidor': medidor, 'duracao': duracao, 'backend': planilha.contadores(),
+            'cliente': cliente.contadores(), 'cache_abas': cache_abas}
+
+
+def requisicoes_por_fluxo(abas, args):
+    """Requisições ao backend de cada fluxo, numa sessão só e com caches aquecidos pela abertura."""
+    planilha = PlanilhaMemoria(abas)
+    medidor = Medidor()
+    nomes_ativos = [linha[2] for linha in abas['Matriculas'][1:] if linha[8] == 'Ativa']
+    resultado = {}
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    with conexao_falsa(planilha), ambiente_sessoes_simultaneas(), mock.patch("time.sleep", _sleep_fora_do_app):
+        recepcao = Recepcao(medidor, nomes_ativos, random.Random(0))
+        for fluxo in PESOS_FLUXOS:
+            antes = planilha.contadores().get('requisicoes', 0)
+            recepcao.executar(fluxo)
+            resultado[fluxo] = planilha.contadores().get('requisicoes', 0) - antes
+    return resultado
+
+
+def percentil(valores, p):
+    return float(np.percentile(valores, p)) * 1000 if valores else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessoes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--fluxos", type=int, default=6, help="fluxos executados por sessão")
+    parser.add_argument("--alunos", type=int, default=200)
+    parser.add_argument("--latencia", type=float, default=0.2, help="segundos por requisição ao backend")
+    parser.add_argument("--cota", type=int, default=60, help="requisições por minuto aceitas pelo backend")
+    parser.add_argument("--pausa", type=float, default=1.0, help="pausa média entre fluxos (s)")
+    args = parser.parse_args()
+
+    abas = gerar_planilha(args.alunos)
+    print(f"{args.alunos} alunos; backend com {args.latencia * 1000:.0f} ms/req e cota de {args.cota}/min\n")
+
+    print("Requisições ao backend por fluxo (uma sessão, caches aquecidos):")
+    for fluxo, requisicoes in requisicoes_por_fluxo(abas, args).items():
+        print(f"  {fluxo:<12}{requisicoes:>4}")
+
+    for n_sessoes in args.sessoes:
+        r = rodar_carga(abas, n_sessoes, args.fluxos, args)
+        medidor = r['medidor']
+        print(f"\n== {n_sessoes} sessão(ões), {args.fluxos} fluxos cada: {r['duracao']:.1f} s")
+        print(f"{'Fluxo':<12}{'Interações':>12}{'p50':>11}{'p95':>11}{'Erros':>7}")
+        todas = []
+        for fluxo in ['abertura'] + list(PESOS_FLUXOS):
+            latencias = medidor.latencias.get(fluxo, [])
+            todas += latencias
+            if latencias:
+                print(f"{fluxo:<12}{len(latencias):>12}{percentil(latencias, 50):>8.0f} ms"
+                      f"{percentil(latencias, 95):>8.0f} ms{medidor.erros[fluxo]:>7}")
+        print(f"{'total':<12}{len(todas):>12}{percentil(todas, 50):>8.0f} ms{percentil(todas, 95):>8.0f} ms"
+              f"{sum(medidor.erros.values()):>7}")
+
+        backend, cliente, cache_abas = r['backend'], r['cliente'], r['cache_abas']
+        cache_st = medidor.cache_st
+        consultas_abas = cache_abas['acertos'] + cache_abas['aguardaram'] + cache_abas['vencidos_servidos']
+        total_abas = consultas_abas + cache_abas['leituras']
+        escritas = sum(backend.get(metodo, 0) for metodo in METODOS_ESCRITA)
+        print(f"Backend: {backend.get('requisicoes', 0)} requisições, {escritas} de escrita "
+              f"({backend.get('requisicoes', 0) / len(todas):.2f} por interação), "
+              f"{backend.get('limitadas', 0)} respostas 429; cliente esperou na cota "
+              f"{cliente['limitadas']}x, {cliente['coalescidas']} leituras compartilhadas")
+        for mensagem, vezes in medidor.mensagens_erro.most_common(3):
+            print(f"  erro ({vezes}x): {mensagem}")
+        print(f"Cache st.cache_*: {cache_st['acertos'] / max(1, sum(cache_st.values())):.1%} de acertos "
+              f"({sum(cache_st.values())} consultas); cache de abas: "
+              f"{consultas_abas / max(1, total_abas):.1%} ({total_abas} consultas)")
+
+
+if __name__ == "__main__":
+    main()
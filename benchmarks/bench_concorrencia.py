@@ -0,0 +1,90 @@
+"""
+Benchmark: várias sessões lendo as abas ao mesmo tempo contra um Sheets simulado.
+
+A planilha em memória (sheets_memoria.py) responde com latência, cota por minuto e
+falhas injetadas. Cada sessão lê todas as abas, como na primeira carga do app, em
+três arranjos da camada de acesso:
+
+- direto: cada sessão chama a API sozinha (como antes do controle de cota);
+- cliente com cota: ClienteComCota (janela de cota, retentativas e coalescência);
+- cache de abas: CacheDeAbas sobre o ClienteComCota (uma leitura por aba para todas).
+
+    python benchmarks/bench_concorrencia.py [--sessoes 10] [--latencia 0.3] [--cota 60] [--taxa-falha 0.02]
+"""
+import argparse
+import threading
+import time
+
+import comum  # noqa: F401 (coloca a raiz do projeto no sys.path)
+import conexao_sheets
+from dados_sinteticos import gerar_planilha
+from sheets_memoria import PlanilhaMemoria
+
+
+def rodar_sessoes(n_sessoes, ler_aba, titulos):
+    """Dispara as sessões juntas; devolve (segundos, leituras que falharam para a sessão)."""
+    falhas = []
+    largada = threading.Barrier(n_sessoes)
+
+    def sessao():
+        largada.wait()
+        for titulo in titulos:
+            try:
+                ler_aba(titulo)
+            except Exception as e:
+                falhas.append(e)
+
+    threads = [threading.Thread(target=sessao) for _ in range(n_sessoes)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - inicio, len(falhas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessoes", type=int, default=10)
+    parser.add_argument("--alunos", type=int, default=300)
+    parser.add_argument("--latencia", type=float, default=0.3, help="segundos por requisição")
+    parser.add_argument("--cota", type=int, default=60, help="requisições por minuto")
+    parser.add_argument("--taxa-falha", type=float, default=0.02, help="fração de respostas 503")
+    args = parser.parse_args()
+
+    abas = gerar_planilha(args.alunos)
+    titulos = list(abas)
+
+    def nova_planilha():
+        return PlanilhaMemoria(abas, latencia=args.latencia, variacao=args.latencia / 2,
+                               cota_por_minuto=args.cota, taxa_falha=args.taxa_falha, semente=1)
+
+    def direto():
+        planilha = nova_planilha()
+        return planilha, lambda titulo: planilha.worksheet(titulo).get_all_values()
+
+    def com_cota():
+        planilha = nova_planilha()
+        cliente = conexao_sheets.ClienteComCota(conexao_sheets.JanelaDeRequisicoes(args.cota),
+                                                espera_base=0.5)
+        planilha_com_cota = conexao_sheets.PlanilhaComCota(planilha, cliente)
+        return planilha, lambda titulo: planilha_com_cota.worksheet(titulo).get_all_values()
+
+    def com_cache():
+        planilha, ler_aba = com_cota()
+        cache = conexao_sheets.CacheDeAbas(ler_aba)
+        return planilha, cache.obter
+
+    print(f"{args.sessoes} sessões x {len(titulos)} abas; latência {args.latencia * 1000:.0f} ms, "
+          f"cota {args.cota}/min, {args.taxa_falha:.0%} de falhas\n")
+    print(f"{'Arranjo':<20}{'Tempo':>9}{'Requisições':>13}{'429':>6}{'5xx':>6}{'Falhas p/ sessão':>18}")
+    for nome, montar in (("direto", direto), ("cliente com cota", com_cota), ("cache de abas", com_cache)):
+        planilha, ler_aba = montar()
+        segundos, falhas_sessao = rodar_sessoes(args.sessoes, ler_aba, titulos)
+        contadores = planilha.contadores()
+        print(f"{nome:<20}{segundos:>7.1f} s{contadores.get('requisicoes', 0):>13}"
+              f"{contadores.get('limitadas', 0):>6}{contadores.get('falhas', 0):>6}{falhas_sessao:>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: latência por interação com e sem fragmentos (st.fragment).
+
+Mede, para cada widget interativo, o tempo de um rerun completo do app
+(o que acontecia antes) contra o rerun só do fragmento que contém o widget.
+Roda com uma planilha em memória, sem acesso ao Google Sheets:
+
+    python benchmarks/bench_fragmentos.py [--alunos 300] [--repeticoes 10]
+"""
+import argparse
+import statistics
+import time
+
+from comum import abrir_app, conexao_falsa
+from dados_sinteticos import gerar_planilha
+from sheets_memoria import PlanilhaMemoria
+
+
+# -----------------------------------------------------
+# MEDIÇÃO
+# -----------------------------------------------------
+INTERACOES = [
+    # (página, fragmento, tipo do widget, rótulo, valores alternados)
+    ("💰 Lançar Pagamento", "formulario_pagamento", "selectbox", "Bandeira*", ["Visa", "Master"]),
+    ("🏦 Reserva (Investimentos)", "projecao_investimentos", "slider", "Projetar Saldo para (meses):", [24, 12]),
+]
+# A lista de contas a pagar não é fragmento: ela é quase a página inteira e o rerun
+# só dela não mediu ganho (257 -> 253 ms com 300 alunos).
+
+
+def _widget(arvore, tipo, rotulo):
+    return next(w for w in getattr(arvore, tipo) if w.label == rotulo)
+
+
+def medir(at, pagina, fragmento, tipo, rotulo, valores, repeticoes):
+    """Mediana (ms) do rerun completo e do rerun do fragmento para a mesma troca de valor."""
+    at.sidebar.radio[0].set_value(pagina).run()
+    tempos_app, tempos_fragmento = [], []
+    for i in range(repeticoes):
+        valor = valores[i % len(valores)]
+        inicio = time.perf_counter()
+        _widget(at, tipo, rotulo).set_value(valor).run()
+        tempos_app.append(time.perf_counter() - inicio)
+
+    for i in range(repeticoes):
+        valor = valores[i % len(valores)]
+        _widget(at, tipo, rotulo).set_value(valor)
+        estados = at._tree.get_widget_states()
+        inicio = time.perf_counter()
+        at.rodar_fragmento(fragmento, estados)
+        tempos_fragmento.append(time.perf_counter() - inicio)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        # O rerun de fragmento só devolve o trecho do fragmento; um rerun completo
+        # (fora da medição) refaz a árvore de widgets para a próxima troca.
+        at._run(estados)
+    return statistics.median(tempos_app) * 1000, statistics.median(tempos_fragmento) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--alunos", type=int, default=300)
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+
+    with conexao_falsa(PlanilhaMemoria(gerar_planilha(args.alunos))):
+        at = abrir_app()
+
+        print(f"{'Interação':<60}{'App inteiro':>14}{'Fragmento':>12}{'Redução':>10}")
+        for pagina, fragmento, tipo, rotulo, valores in INTERACOES:
+            ms_app, ms_fragmento = medir(at, pagina, fragmento, tipo, rotulo, valores, args.repeticoes)
+            print(f"{pagina + ' / ' + rotulo:<60}{ms_app:>11.1f} ms{ms_fragmento:>9.1f} ms"
+                  f"{1 - ms_fragmento / ms_app:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
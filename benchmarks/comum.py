@@ -0,0 +1,203 @@
+"""
+Peças compartilhadas pelos benchmarks: conexão falsa com a planilha em memória,
+importação do app fora do servidor e AppTest com rerun de fragmento.
+
+O rerun de fragmento, as sessões simultâneas e a contagem de acertos de cache
+(bench_carga.py) não têm API pública no Streamlit: usam partes internas dele
+(MemoryFragmentStorage e o closure dos fragmentos, RerunData, Runtime._instance,
+CachedFunc._handle_cache_hit/_miss). Por isso os benchmarks só rodam com a versão
+fixada em requirements.txt (VERSAO_STREAMLIT); ao atualizar o Streamlit, revise
+essas peças e mude as duas juntas.
+"""
+import contextlib
+import importlib
+import os
+import sys
+import tempfile
+from unittest import mock
+from urllib import parse
+
+import streamlit as st
+import streamlit.config
+import streamlit.logger
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.fragment import MemoryFragmentStorage
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner, require_widgets_deltas
+from streamlit.testing.v1.element_tree import parse_tree_from_messages
+from streamlit.testing.v1.util import patch_config_options
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(RAIZ, "app.py")
+VERSAO_STREAMLIT = "1.50.0"
+
+if st.__version__ != VERSAO_STREAMLIT:
+    raise ImportError(f"Os benchmarks usam partes internas do Streamlit {VERSAO_STREAMLIT} (a de requirements.txt); "
+                      f"instalado: {st.__version__}.")
+
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+# Menos ruído na saída: sem avisos de "No runtime found" e de depreciação
+streamlit.config.set_option("logger.level", "error")
+streamlit.logger.set_log_level("error")
+
+
+@contextlib.contextmanager
+def conexao_falsa(planilha, cliente_sheets=None):
+    """Faz o connect_to_sheets do app abrir `planilha` em vez do Google Sheets.
+
+    Sem `cliente_sheets`, as chamadas passam por um ClienteComCota sem limite de taxa,
+    para que a cota de 60 req/min não entre nas medidas. Os snapshots da carga noturna
+    ficam num diretório temporário (os da planilha real não valem para a de memória).
+    """
+    import conexao_sheets
+    import precalculo
+
+    if cliente_sheets is None:
+        cliente_sheets = conexao_sheets.ClienteComCota(conexao_sheets.BaldeDeTokens(float('inf'), 1))
+    cliente = mock.Mock()
+    cliente.open.return_value = planilha
+    with tempfile.TemporaryDirectory() as diretorio_snapshots, \
+            mock.patch.object(conexao_sheets, "conectar_gspread", return_value=cliente), \
+            mock.patch.object(conexao_sheets, "CLIENTE_PADRAO", cliente_sheets), \
+            mock.patch.object(precalculo, "DIRETORIO_PADRAO", diretorio_snapshots):
+        yield cliente
+
+
+# Referência global: se o ExitStack fosse coletado, os patches seriam desfeitos
+_PATCHES_APP = contextlib.ExitStack()
+
+
+def importar_app(planilha):
+    """Importa app.py fora do `streamlit run` (bare mode) ligado à planilha em memória.
+
+    Os widgets devolvem o valor padrão e nada é renderizado, o que permite chamar
+    loaders e páginas diretamente. Fragmentos viram funções comuns (em bare mode o
+    Streamlit não os executaria). Os patches ficam ativos enquanto o processo durar.
+    """
+    os.chdir(RAIZ)
+    _PATCHES_APP.close()
+    _PATCHES_APP.enter_context(conexao_falsa(planilha))
+    _PATCHES_APP.enter_context(mock.patch.object(st, "secrets", {"gcp_service_account": {}}))
+    _PATCHES_APP.enter_context(mock.patch.object(st, "fragment", lambda func=None, **kwargs: func))
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    if "app" in sys.modules:
+        return importlib.reload(sys.modules["app"])
+    return importlib.import_module("app")
+
+
+# -----------------------------------------------------
+# APPTEST COM RERUN DE FRAGMENTO
+# -----------------------------------------------------
+class RunnerComFragmentos(LocalScriptRunner):
+    """LocalScriptRunner que guarda os fragmentos entre execuções e sabe rodar só um deles."""
+
+    def __init__(self, *args, fragmentos, script_cache, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fragment_storage = fragmentos
+        # Como no servidor, o bytecode do script é compilado uma vez e reaproveitado
+        self._script_cache = script_cache
+
+    def run_fragmento(self, widget_state, fragment_id, timeout):
+        self.request_rerun(RerunData(widget_states=widget_state, fragment_id_queue=[fragment_id],
+                                     is_fragment_scoped_rerun=True))
+        if not self._script_thread:
+            self.start()
+        require_widgets_deltas(self, timeout)
+        return parse_tree_from_messages(self.forward_msgs())
+
+
+class AppTestComFragmentos(AppTest):
+    """AppTest em que o rerun pode ser restrito a um fragmento, como faz o servidor do Streamlit."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fragmentos = MemoryFragmentStorage()
+        self.script_cache = ScriptCache()
+        self._fragment_id = None
+
+    def id_fragmento(self, nome_funcao):
+        for fragment_id, fragmento in self.fragmentos._fragments.items():
+            celulas = dict(zip(fragmento.__code__.co_freevars, fragmento.__closure__))
+            if celulas["non_optional_func"].cell_contents.__name__ == nome_funcao:
+                return fragment_id
+        raise KeyError(nome_funcao)
+
+    def rodar_fragmento(self, nome_funcao, widget_state):
+        self._fragment_id = self.id_fragmento(nome_funcao)
+        try:
+            return self._run(widget_state)
+        finally:
+            self._fragment_id = None
+
+    def _run(self, widget_state=None, timeout=None):
+        fragment_id = self._fragment_id
+        fragmentos, script_cache = self.fragmentos, self.script_cache
+
+        class Runner(RunnerComFragmentos):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, fragmentos=fragmentos, script_cache=script_cache, **kwargs)
+
+            def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+                if fragment_id is None:
+                    return super().run(widget_state, query_params, timeout, page_hash)
+                return self.run_fragmento(widget_state, fragment_id, timeout)
+
+        with mock.patch("streamlit.testing.v1.app_test.LocalScriptRunner", Runner):
+            return super()._run(widget_state, timeout)
+
+
+def abrir_app(timeout=120):
+    """AppTest do app.py já executado uma vez (usar dentro de conexao_falsa)."""
+    os.chdir(RAIZ)
+    at = AppTestComFragmentos(APP, default_timeout=timeout)
+    at.secrets["gcp_service_account"] = {}
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return at
+
+
+# -----------------------------------------------------
+# SESSÕES SIMULTÂNEAS
+# -----------------------------------------------------
+# O AppTest troca Runtime, st.secrets e config globais a cada execução e os desfaz
+# no fim, o que quebra quando várias sessões rodam ao mesmo tempo. Aqui esse
+# ambiente é montado uma vez e cada SessaoSimultanea só cria o próprio runner.
+
+@contextlib.contextmanager
+def ambiente_sessoes_simultaneas():
+    """Runtime falso, secrets e config de teste compartilhados por todas as SessaoSimultanea."""
+    runtime = mock.MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    with mock.patch.object(Runtime, "_instance", runtime), \
+            mock.patch.object(st, "secrets", {"gcp_service_account": {}}), \
+            patch_config_options({"global.appTest": True}):
+        yield
+
+
+class SessaoSimultanea(AppTest):
+    """AppTest que pode rodar em paralelo com outros (usar dentro de ambiente_sessoes_simultaneas)."""
+
+    script_cache = ScriptCache()
+
+    def _run(self, widget_state=None, timeout=None):
+        pages_manager = PagesManager(self._script_path, self.script_cache, setup_watcher=False)
+        runner = LocalScriptRunner(self._script_path, self.session_state, pages_manager,
+                                   args=self.args, kwargs=self.kwargs)
+        runner._script_cache = self.script_cache
+        self._tree = runner.run(widget_state, self.query_params, timeout or self.default_timeout,
+                                self._page_hash)
+        self._tree._runner = self
+        # Espera a thread do script terminar a finalização (ela ainda usa o Runtime)
+        runner.join()
+        self.query_params = parse.parse_qs(runner.event_data[-1]["client_state"].query_string)
+        return self
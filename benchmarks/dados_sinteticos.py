@@ -0,0 +1,193 @@
+"""
+Gerador de dados sintéticos para todas as abas da planilha do estúdio.
+
+As linhas saem como texto, no formato que get_all_values devolve numa planilha
+pt-BR: datas ISO, valores em reais como "R$ 1.234,56" ou "350,5", taxas como "3,1".
+O mesmo (escala, semente, data de referência) gera sempre os mesmos dados.
+"""
+import random
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+ESCALAS = {
+    'pequeno': {'alunos': 200, 'aulas_por_aluno': 40},
+    'medio': {'alunos': 1000, 'aulas_por_aluno': 40},
+    'grande': {'alunos': 5000, 'aulas_por_aluno': 40},
+}
+
+CABECALHOS = {
+    'Matriculas': ["ID", "Data_Cadastro", "Nome", "CPF", "Telefone", "Email", "Plano", "Data_Inicio", "Status",
+                   "CEP", "Endereco", "Data_Nascimento", "Onde_Conheceu", "Sexo", "Emprego", "Notas",
+                   "Desconto_Percentual", "Justificativa_Desconto", "Data_Congelamento_Inicio",
+                   "Data_Primeira_Matricula"],
+    'Planos': ["Plano", "Preco_Mensal", "Duracao_Meses"],
+    'Presencas_Evolucao': ["ID_Presenca", "ID_Aluno", "Nome_Aluno", "Data_Aula", "Horario_Inicio",
+                           "Notas_Evolucao"],
+    'Pagamentos_Recebidos': ["ID_Pagamento", "ID_Aluno", "Nome_Aluno", "Data_Pagamento", "Mes_Competencia",
+                             "Ano_Competencia", "Valor_Pago", "Forma_Pagamento", "Notas", "Valor_Liquido"],
+    'Lancamentos_Despesas': ["ID", "Data_Cadastro", "Descricao", "Valor", "Mes_Competencia", "Ano_Competencia",
+                             "Tipo", "Status_Pagamento", "Data_Pagamento", "Valor_Pago", "Forma_Pagamento",
+                             "Recorrente", "Data_Vencimento"],
+    'Historico_Renovacoes': ["ID_Historico", "ID_Aluno", "Nome_Aluno", "Plano", "Data_Inicio_Contrato",
+                             "Valor_Contrato", "Data_Registro"],
+    'Investimentos_Caixa': ["ID_Movimentacao", "Data", "Tipo", "Produto", "Valor", "Descricao"],
+    'Config_Taxas': ["Bandeira", "Tipo", "Parcela", "Taxa"],
+}
+
+PLANOS = [("Mensal 1x", 220.0, 1), ("Mensal 2x", 350.0, 1), ("Mensal 3x", 450.0, 1),
+          ("Trimestral 2x", 320.0, 3), ("Semestral 2x", 300.0, 6), ("Anual 3x", 380.0, 12)]
+TAXAS = [("PIX", "N/A", "N/A", 0.0), ("Dinheiro", "N/A", "N/A", 0.0), ("Visa", "Débito", "N/A", 1.2),
+         ("Master", "Débito", "N/A", 1.3)] + \
+        [(bandeira, "Crédito", f"{parcela}x", base + 0.9 * (parcela - 1))
+         for bandeira, base in (("Visa", 3.1), ("Master", 3.2)) for parcela in range(1, 7)]
+HORARIOS = [f"{hora:02d}:00:00" for hora in range(7, 21)]
+NOMES = ["Ana", "Beatriz", "Camila", "Daniela", "Eduarda", "Fernanda", "Gabriela", "Helena", "Isabela", "Júlia",
+         "Larissa", "Mariana", "Natália", "Patrícia", "Renata", "Sofia", "Tatiane", "Vanessa", "João", "Pedro"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Ferreira", "Costa", "Rodrigues",
+              "Almeida", "Nascimento", "Araújo", "Carvalho", "Gonçalves", "Conceição", "Ribeiro"]
+
+
+def formatar_reais(valor):
+    """1234.5 -> 'R$ 1.234,50' (formato de moeda do Sheets em pt-BR)."""
+    texto = f"{valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+    return f"R$ {texto}"
+
+
+def formatar_numero(valor):
+    """350.5 -> '350,5' (número com vírgula decimal, sem formatação de moeda)."""
+    return f"{valor:.2f}".rstrip('0').rstrip('.').replace('.', ',')
+
+
+def _cpf(rnd):
+    return f"{rnd.randint(100, 999)}.{rnd.randint(100, 999)}.{rnd.randint(100, 999)}-{rnd.randint(10, 99)}"
+
+
+def gerar_planilha(alunos, aulas_por_aluno=40, meses=24, semente=42, hoje=None):
+    """Todas as abas como {título: linhas de texto com o cabeçalho primeiro}."""
+    rnd = random.Random(semente)
+    hoje = hoje or date.today()
+    abas = {titulo: [list(cabecalho)] for titulo, cabecalho in CABECALHOS.items()}
+
+    for nome, preco, duracao in PLANOS:
+        abas['Planos'].append([nome, formatar_reais(preco), str(duracao)])
+    for bandeira, tipo, parcela, taxa in TAXAS:
+        abas['Config_Taxas'].append([bandeira, tipo, parcela, formatar_numero(taxa)])
+    precos = {nome: preco for nome, preco, _ in PLANOS}
+    duracoes = {nome: duracao for nome, _, duracao in PLANOS}
+
+    id_presenca = id_pagamento = id_historico = 1
+    inicio_historico = hoje - relativedelta(months=meses)
+    for id_aluno in range(1, alunos + 1):
+        nome = f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}"
+        plano = rnd.choice(PLANOS)[0]
+        status = rnd.choices(["Ativa", "Inativa", "Cancelada", "Congelado"], weights=[70, 18, 7, 5])[0]
+        primeira_matricula = inicio_historico + timedelta(days=rnd.randint(0, meses * 30))
+        desconto = rnd.choices([0, 5, 10, 15], weights=[75, 10, 10, 5])[0]
+
+        # Contratos: da 1ª matrícula até hoje (ou até a saída, para inativos)
+        contratos = []
+        inicio_contrato = primeira_matricula
+        while inicio_contrato <= hoje:
+            contratos.append(inicio_contrato)
+            if status != "Ativa" and rnd.random() < 0.35:
+                break
+            inicio_contrato += relativedelta(months=duracoes[plano])
+        for inicio in contratos:
+            abas['Historico_Renovacoes'].append([
+                str(id_historico), str(id_aluno), nome, plano, inicio.isoformat(),
+                formatar_reais(precos[plano] * (1 - desconto / 100)), f"{inicio.isoformat()} 10:00:00"])
+            id_historico += 1
+
+        data_inicio = contratos[-1]
+        congelamento = (hoje - timedelta(days=rnd.randint(1, 40))).isoformat() if status == "Congelado" else ""
+        abas['Matriculas'].append([
+            str(id_aluno), f"{primeira_matricula.isoformat()} 09:30:00", nome, _cpf(rnd),
+            f"(11) 9{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}", f"aluno{id_aluno}@exemplo.com.br", plano,
+            data_inicio.isoformat(), status, f"0{rnd.randint(1000, 9999)}-{rnd.randint(100, 999)}",
+            f"Rua {rnd.choice(SOBRENOMES)}, {rnd.randint(1, 999)}",
+            date(rnd.randint(1955, 2006), rnd.randint(1, 12), rnd.randint(1, 28)).isoformat(),
+            rnd.choice(["Instagram", "Indicação", "Google", "Passou na frente"]),
+            rnd.choice(["Mulher", "Mulher", "Mulher", "Homem"]), rnd.choice(["", "Professora", "Engenheira"]), "",
+            str(desconto), "Convênio" if desconto else "", congelamento, primeira_matricula.isoformat()])
+
+        # Presenças espalhadas entre a 1ª matrícula e hoje
+        dias_matriculado = max((hoje - primeira_matricula).days, 1)
+        for _ in range(rnd.randint(aulas_por_aluno // 2, aulas_por_aluno * 3 // 2)):
+            data_aula = primeira_matricula + timedelta(days=rnd.randint(0, dias_matriculado))
+            abas['Presencas_Evolucao'].append([
+                str(id_presenca), str(id_aluno), nome, data_aula.isoformat(), rnd.choice(HORARIOS),
+                rnd.choice(["", "", "Boa evolução no core", "Dor lombar leve"])])
+            id_presenca += 1
+
+        # Um pagamento por mês de competência desde a 1ª matrícula (inativos param antes)
+        ultima_competencia = hoje if status == "Ativa" else contratos[-1] + relativedelta(
+            months=duracoes[plano])
+        competencia = primeira_matricula.replace(day=1)
+        while competencia <= min(ultima_competencia, hoje):
+            bandeira, tipo, parcela, taxa = rnd.choice(TAXAS[:6])
+            valor = precos[plano] * (1 - desconto / 100)
+            data_pagamento = competencia + timedelta(days=rnd.randint(0, 12))
+            abas['Pagamentos_Recebidos'].append([
+                str(id_pagamento), str(id_aluno), nome, data_pagamento.isoformat(), str(competencia.month),
+                str(competencia.year), formatar_numero(valor), _forma_pagamento(bandeira, tipo, parcela), "",
+                formatar_numero(valor * (1 - taxa / 100))])
+            id_pagamento += 1
+            competencia += relativedelta(months=1)
+
+    # Na planilha real as linhas entram na ordem em que acontecem, com IDs crescentes
+    for titulo in ('Presencas_Evolucao', 'Pagamentos_Recebidos'):
+        coluna_data = CABECALHOS[titulo].index('Data_Aula' if titulo == 'Presencas_Evolucao' else 'Data_Pagamento')
+        linhas = sorted(abas[titulo][1:], key=lambda linha: linha[coluna_data])
+        for novo_id, linha in enumerate(linhas, start=1):
+            linha[0] = str(novo_id)
+        abas[titulo][1:] = linhas
+
+    # Despesas: fixas todo mês e algumas pontuais, de `meses` atrás até 3 meses à frente
+    id_despesa = 1
+    competencia = inicio_historico.replace(day=1)
+    while competencia <= hoje + relativedelta(months=3):
+        lancamentos = [("Aluguel", 4500.0, "Fixo"), ("Salário Instrutora", 3200.0, "Fixo"),
+                       ("Energia", rnd.uniform(350, 600), "Variável"), ("Água", rnd.uniform(90, 160), "Variável")]
+        lancamentos += [(f"Manutenção {i}", rnd.uniform(100, 900), "Pontual") for i in range(rnd.randint(0, 3))]
+        for descricao, valor, tipo in lancamentos:
+            passado = competencia < hoje.replace(day=1)
+            status = "Pago" if passado else rnd.choice(["Pendente", "Pendente", "Parcial", "Pago"])
+            valor_pago = valor if status == "Pago" else (valor / 2 if status == "Parcial" else 0.0)
+            vencimento = competencia + timedelta(days=9)
+            abas['Lancamentos_Despesas'].append([
+                str(id_despesa), f"{competencia.isoformat()} 08:00:00", descricao, formatar_reais(valor),
+                str(competencia.month), str(competencia.year), tipo, status,
+                vencimento.isoformat() if status != "Pendente" else "", formatar_numero(valor_pago),
+                "PIX" if status != "Pendente" else "", "Sim" if tipo == "Fixo" else "Não", vencimento.isoformat()])
+            id_despesa += 1
+        competencia += relativedelta(months=1)
+
+    # Reserva: aportes mensais e resgates ocasionais
+    id_movimentacao = 1
+    data_movimento = inicio_historico
+    while data_movimento <= hoje:
+        produto = rnd.choice(["CDB 100% CDI", "CDB 102% CDI"])
+        resgate = rnd.random() < 0.1
+        valor = rnd.uniform(500, 3000) * (-1 if resgate else 1)
+        abas['Investimentos_Caixa'].append([
+            str(id_movimentacao), data_movimento.isoformat(), "Resgate" if resgate else "Aporte", produto,
+            formatar_reais(valor) if not resgate else formatar_numero(valor), ""])
+        id_movimentacao += 1
+        data_movimento += relativedelta(months=1)
+
+    return abas
+
+
+def _forma_pagamento(bandeira, tipo, parcela):
+    forma = bandeira
+    if tipo != 'N/A':
+        forma += f" - {tipo}"
+    if parcela not in ('N/A', '1x'):
+        forma += f" {parcela}"
+    return forma
+
+
+def gerar_escala(nome, semente=42, hoje=None):
+    """Atalho para gerar_planilha com os parâmetros de uma das ESCALAS."""
+    return gerar_planilha(semente=semente, hoje=hoje, **ESCALAS[nome])
@@ -0,0 +1,276 @@
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+import gspread
+from gspread.utils import a1_range_to_grid_range
+
+# -----------------------------------------------------
+# PLANILHA EM MEMÓRIA (SUBSTITUTA DO GOOGLE SHEETS)
+# -----------------------------------------------------
+# Implementa o subconjunto do gspread usado pelo app, guardando cada aba como
+# lista de linhas de texto (o mesmo formato que get_all_values devolve).
+# Para testes de carga, cada chamada pode simular o servidor:
+# - latência por requisição (fixa + variação aleatória);
+# - cota de requisições por minuto (excedida -> APIError 429, como o Sheets);
+# - falhas injetadas (aleatórias ou as próximas N chamadas).
+# Cada chamada de método conta como uma requisição (batch_get é uma só).
+
+
+class _RespostaErro:
+    """Imita o requests.Response que o gspread.exceptions.APIError espera."""
+
+    def __init__(self, codigo, mensagem):
+        self.status_code = codigo
+        self.text = mensagem
+        self._erro = {'error': {'code': codigo, 'message': mensagem, 'status': 'SIMULADO'}}
+
+    def json(self):
+        return self._erro
+
+
+def erro_api(codigo, mensagem="Erro simulado"):
+    """gspread.exceptions.APIError com o código HTTP dado."""
+    return gspread.exceptions.APIError(_RespostaErro(codigo, mensagem))
+
+
+def _intervalo(range_name):
+    """'A2:C10' -> (linha_ini, linha_fim, col_ini, col_fim), base 0 e fim exclusivo (None = até o fim)."""
+    if '!' in range_name:
+        range_name = range_name.split('!', 1)[1]
+    grade = a1_range_to_grid_range(range_name)
+    return (grade.get('startRowIndex', 0), grade.get('endRowIndex'),
+            grade.get('startColumnIndex', 0), grade.get('endColumnIndex'))
+
+
+class AbaMemoria:
+    """Worksheet em memória."""
+
+    def __init__(self, titulo, linhas, planilha=None, id_aba=0):
+        self.title = titulo
+        self.id = id_aba
+        self.linhas = [[str(valor) for valor in linha] for linha in linhas]
+        self._planilha = planilha
+
+    def _requisicao(self, metodo):
+        if self._planilha is not None:
+            self._planilha._requisicao(metodo)
+
+    def _contar_celulas(self, linhas):
+        if self._planilha is not None:
+            self._planilha._contar('celulas_lidas', sum(len(linha) for linha in linhas))
+        return linhas
+
+    @property
+    def row_count(self):
+        return len(self.linhas)
+
+    @property
+    def col_count(self):
+        return max((len(linha) for linha in self.linhas), default=0)
+
+    def _recortar(self, range_name):
+        linha_ini, linha_fim, col_ini, col_fim = _intervalo(range_name)
+        recorte = [linha[col_ini:col_fim] for linha in self.linhas[linha_ini:linha_fim]]
+        # Como a API, não devolve linhas vazias no fim do intervalo
+        while recorte and not any(recorte[-1]):
+            recorte.pop()
+        return recorte
+
+    # --- leituras ---
+    def get_all_values(self, *args, **kwargs):
+        self._requisicao('get_all_values')
+        return self._contar_celulas([list(linha) for linha in self.linhas])
+
+    def get_all_records(self, head=1, **kwargs):
+        self._requisicao('get_all_records')
+        cabecalho = self.linhas[head - 1] if len(self.linhas) >= head else []
+        self._contar_celulas(self.linhas)
+        return [dict(zip(cabecalho, linha)) for linha in self.linhas[head:]]
+
+    def get_values(self, range_name=None, **kwargs):
+        if range_name is None:
+            return self.get_all_values()
+        self._requisicao('get_values')
+        return self._contar_celulas(self._recortar(range_name))
+
+    def get(self, range_name=None, **kwargs):
+        return self.get_values(range_name, **kwargs)
+
+    def batch_get(self, ranges, **kwargs):
+        self._requisicao('batch_get')
+        return [self._contar_celulas(self._recortar(range_name)) for range_name in ranges]
+
+    def row_values(self, linha, **kwargs):
+        self._requisicao('row_values')
+        return self._contar_celulas([list(self.linhas[linha - 1]) if linha <= len(self.linhas) else []])[0]
+
+    def col_values(self, coluna, **kwargs):
+        self._requisicao('col_values')
+        valores = [linha[coluna - 1] if coluna <= len(linha) else '' for linha in self.linhas]
+        while valores and not valores[-1]:
+            valores.pop()
+        self._contar_celulas([valores])
+        return valores
+
+    # --- escritas ---
+    def _escrever(self, linha, coluna, valor):
+        while len(self.linhas) < linha:
+            self.linhas.append([])
+        atual = self.linhas[linha - 1]
+        while len(atual) < coluna:
+            atual.append('')
+        atual[coluna - 1] = str(valor)
+
+    def append_row(self, valores, value_input_option=None, **kwargs):
+        self._requisicao('append_row')
+        with self._trava():
+            self.linhas.append([str(valor) for valor in valores])
+
+    def append_rows(self, linhas, value_input_option=None, **kwargs):
+        self._requisicao('append_rows')
+        with self._trava():
+            self.linhas.extend([str(valor) for valor in valores] for valores in linhas)
+
+    def update_cells(self, celulas, value_input_option=None, **kwargs):
+        self._requisicao('update_cells')
+        with self._trava():
+            for celula in celulas:
+                self._escrever(celula.row, celula.col, celula.value)
+
+    def _atualizar_intervalo(self, range_name, valores):
+        linha_ini, _, col_ini, _ = _intervalo(range_name)
+        for i, linha in enumerate(valores):
+            for j, valor in enumerate(linha):
+                self._escrever(linha_ini + i + 1, col_ini + j + 1, valor)
+
+    def update(self, values=None, range_name=None, **kwargs):
+        self._requisicao('update')
+        with self._trava():
+            self._atualizar_intervalo(range_name or 'A1', values or [])
+
+    def batch_update(self, data, **kwargs):
+        self._requisicao('batch_update')
+        with self._trava():
+            for bloco in data:
+                self._atualizar_intervalo(bloco['range'], bloco['values'])
+
+    def delete_rows(self, start_index, end_index=None):
+        self._requisicao('delete_rows')
+        with self._trava():
+            del self.linhas[start_index - 1:end_index or start_index]
+
+    def clear(self):
+        self._requisicao('clear')
+        with self._trava():
+            self.linhas = []
+
+    def _trava(self):
+        return self._planilha._lock_dados if self._planilha is not None else threading.Lock()
+
+
+class PlanilhaMemoria:
+    """Spreadsheet em memória: {título da aba: linhas (cabeçalho primeiro)}.
+
+    latencia/variacao: segundos de espera por requisição (variação uniforme somada).
+    cota_por_minuto: requisições aceitas numa janela de 60 s; além disso, APIError 429.
+    taxa_falha/codigo_falha: fração das requisições que falham com o código dado.
+    id_planilha: como o Spreadsheet.id do gspread (padrão: um id único por instância).
+    Sem parâmetros, responde na hora e nunca falha.
+    """
+
+    def __init__(self, abas, latencia=0.0, variacao=0.0, cota_por_minuto=None, taxa_falha=0.0,
+                 codigo_falha=503, semente=None, id_planilha=None):
+        self.id = id_planilha or uuid.uuid4().hex
+        self.latencia = latencia
+        self.variacao = variacao
+        self.cota_por_minuto = cota_por_minuto
+        self.taxa_falha = taxa_falha
+        self.codigo_falha = codigo_falha
+        self._aleatorio = random.Random(semente)
+        self._janela = deque()
+        self._falhas_forcadas = deque()
+        self._contadores = Counter()
+        self._lock = threading.Lock()
+        self._lock_dados = threading.Lock()
+        self.abas = {titulo: AbaMemoria(titulo, linhas, self, id_aba)
+                     for id_aba, (titulo, linhas) in enumerate(abas.items())}
+
+    def _contar(self, nome, quantidade=1):
+        with self._lock:
+            self._contadores[nome] += quantidade
+
+    def contadores(self):
+        """Cópia dos contadores: requisicoes, uma chave por método, limitadas (429), falhas, celulas_lidas."""
+        with self._lock:
+            return dict(self._contadores)
+
+    def zerar_contadores(self):
+        with self._lock:
+            self._contadores.clear()
+
+    def falhar_proximas(self, quantidade, codigo=503):
+        """As próximas `quantidade` requisições falham com `codigo` (ex: 429, 500)."""
+        with self._lock:
+            self._falhas_forcadas.extend([codigo] * quantidade)
+
+    def _requisicao(self, metodo):
+        """Contabiliza uma requisição e aplica cota, falhas injetadas e latência."""
+        with self._lock:
+            agora = time.monotonic()
+            self._contadores['requisicoes'] += 1
+            self._contadores[metodo] += 1
+            espera = self.latencia + (self._aleatorio.uniform(0, self.variacao) if self.variacao else 0.0)
+
+            erro = None
+            if self._falhas_forcadas:
+                erro = erro_api(self._falhas_forcadas.popleft(), "Falha injetada")
+            elif self.cota_por_minuto is not None:
+                while self._janela and agora - self._janela[0] >= 60:
+                    self._janela.popleft()
+                if len(self._janela) >= self.cota_por_minuto:
+                    erro = erro_api(429, "Quota exceeded: requisições por minuto (simulado)")
+                else:
+                    self._janela.append(agora)
+            if erro is None and self.taxa_falha and self._aleatorio.random() < self.taxa_falha:
+                erro = erro_api(self.codigo_falha, "Falha aleatória injetada")
+            if erro is not None:
+                self._contadores['limitadas' if erro.code == 429 else 'falhas'] += 1
+
+        if espera:
+            time.sleep(espera)
+        if erro is not None:
+            raise erro
+
+    def worksheet(self, titulo):
+        self._requisicao('worksheet')
+        if titulo not in self.abas:
+            raise gspread.exceptions.WorksheetNotFound(titulo)
+        return self.abas[titulo]
+
+    def worksheets(self):
+        self._requisicao('worksheets')
+        return list(self.abas.values())
+
+    def add_worksheet(self, title, rows=1000, cols=26, index=None):
+        self._requisicao('add_worksheet')
+        with self._lock_dados:
+            if title in self.abas:
+                raise erro_api(400, f"A sheet with the name \"{title}\" already exists.")
+            self.abas[title] = AbaMemoria(title, [], self, len(self.abas))
+            return self.abas[title]
+
+    def values_batch_get(self, ranges, params=None):
+        """Vários intervalos ('Aba!A1:C10') numa requisição só, no formato da API."""
+        self._requisicao('values_batch_get')
+        resposta = []
+        for range_name in ranges:
+            titulo = range_name.split('!', 1)[0].strip("'")
+            if titulo not in self.abas:
+                raise erro_api(400, f"Unable to parse range: {range_name}")
+            aba = self.abas[titulo]
+            valores = aba._recortar(range_name) if '!' in range_name else [list(linha) for linha in aba.linhas]
+            resposta.append({'range': range_name, 'values': aba._contar_celulas(valores)})
+        return {'valueRanges': resposta}
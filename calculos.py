@@ -0,0 +1,831 @@
+import heapq
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from validate_docbr import CPF
+
+# -----------------------------------------------------
+# CÁLCULOS DE NEGÓCIO (SEM STREAMLIT)
+# -----------------------------------------------------
+# Funções puras sobre os DataFrames já limpos pelos loaders do app.py.
+# O app.py envolve estas funções com @st.cache_data.
+
+
+def somar_meses(datas, meses):
+    """Soma a cada data a sua quantidade de meses (um DateOffset por duração distinta, não por linha)."""
+    meses = pd.Series(meses, index=datas.index).fillna(0).astype(int)
+    resultado = datas.copy()
+    for quantidade in meses.unique():
+        mesma_duracao = meses == quantidade
+        resultado[mesma_duracao] = datas[mesma_duracao] + pd.DateOffset(months=int(quantidade))
+    return resultado
+
+
+# -----------------------------------------------------
+# TAXAS DE CARTÃO (Config_Taxas)
+# -----------------------------------------------------
+def montar_forma_pagamento(bandeira, tipo, parcela):
+    """Monta o texto salvo em 'Forma_Pagamento' (ex: 'Visa - Crédito 2x')."""
+    forma_pagamento_str = f"{bandeira}"
+    if tipo != 'N/A':
+        forma_pagamento_str += f" - {tipo}"
+    if parcela != 'N/A' and parcela != '1x':
+        forma_pagamento_str += f" {parcela}"
+    return forma_pagamento_str
+
+
+def indexar_taxas(df_taxas):
+    """Compila a tabela de taxas em dicionários {(Bandeira, Tipo, Parcela): taxa} e listas de opções."""
+    indice = {
+        'taxas': {},
+        'bandeiras': [],
+        'tipos': {},
+        'parcelas': {},
+        'por_forma': {}
+    }
+    if df_taxas.empty or not {'Bandeira', 'Tipo', 'Parcela', 'Taxa'}.issubset(df_taxas.columns):
+        return indice
+
+    # Mantém a ordem da planilha e a primeira ocorrência de cada combinação
+    for bandeira, tipo, parcela, taxa in zip(df_taxas['Bandeira'], df_taxas['Tipo'],
+                                             df_taxas['Parcela'], df_taxas['Taxa']):
+        chave = (bandeira, tipo, parcela)
+        if chave in indice['taxas']:
+            continue
+        indice['taxas'][chave] = float(taxa)
+
+        if bandeira not in indice['tipos']:
+            indice['bandeiras'].append(bandeira)
+            indice['tipos'][bandeira] = []
+        if tipo not in indice['tipos'][bandeira]:
+            indice['tipos'][bandeira].append(tipo)
+        indice['parcelas'].setdefault((bandeira, tipo), []).append(parcela)
+        indice['por_forma'].setdefault(montar_forma_pagamento(bandeira, tipo, parcela), float(taxa))
+
+    return indice
+
+
+def buscar_taxa(indice, bandeira, tipo, parcela):
+    """Retorna a taxa (fração) da combinação ou None se ela não existir."""
+    return indice['taxas'].get((bandeira, tipo, parcela))
+
+
+def aplicar_taxas(df_pagamentos, indice):
+    """Recalcula em lote 'Taxa' e 'Valor_Liquido' a partir da 'Forma_Pagamento' de cada pagamento."""
+    df = df_pagamentos.copy()
+    if df.empty or 'Forma_Pagamento' not in df.columns or 'Valor_Pago' not in df.columns:
+        return df
+
+    taxas = df['Forma_Pagamento'].astype(str).str.strip().map(indice['por_forma'])
+    df['Taxa'] = taxas
+    # Formas de pagamento desconhecidas mantêm o líquido já registrado
+    liquido_recalculado = df['Valor_Pago'] * (1 - taxas)
+    if 'Valor_Liquido' in df.columns:
+        df['Valor_Liquido'] = liquido_recalculado.fillna(df['Valor_Liquido'])
+    else:
+        df['Valor_Liquido'] = liquido_recalculado.fillna(df['Valor_Pago'])
+    return df
+
+
+# -----------------------------------------------------
+# FREQUÊNCIA (Presencas_Evolucao)
+# -----------------------------------------------------
+def _agregar_linhas_presenca(df):
+    """Agrega um bloco de presenças em contagens por aluno/semana, aluno/mês e última aula."""
+    df = df.dropna(subset=['ID_Aluno', 'Data_Aula'])
+    semana = df['Data_Aula'].dt.to_period('W').dt.start_time
+    mes = df['Data_Aula'].dt.to_period('M').dt.start_time
+    return {
+        'semanal': df.groupby([df['ID_Aluno'], semana.rename('Semana')]).size(),
+        'mensal': df.groupby([df['ID_Aluno'], mes.rename('Mes')]).size(),
+        'ultima_aula': df.groupby('ID_Aluno')['Data_Aula'].max(),
+    }
+
+
+def _assinatura_presencas(df_presencas):
+    """Soma dos hashes das linhas (ID_Presenca, ID_Aluno, Data_Aula): muda se alguma for editada ou apagada."""
+    colunas = ['ID_Presenca', 'ID_Aluno', 'Data_Aula']
+    return int(pd.util.hash_pandas_object(df_presencas[colunas], index=False).sum())
+
+
+def agregar_presencas(df_presencas, agregados=None):
+    """Agrega as presenças por aluno; se 'agregados' for informado, processa só as linhas novas (ID_Presenca maior).
+
+    As linhas já agregadas (ID até o 'max_id' anterior) são conferidas pela assinatura:
+    qualquer edição nelas feita direto na planilha faz o reagrupamento completo.
+    """
+    colunas = {'ID_Presenca', 'ID_Aluno', 'Data_Aula'}
+    if df_presencas.empty or not colunas.issubset(df_presencas.columns):
+        vazio = pd.Series(dtype='int64')
+        return {'semanal': vazio, 'mensal': vazio, 'ultima_aula': pd.Series(dtype='datetime64[ns]'),
+                'max_id': 0, 'linhas': 0, 'assinatura': 0}
+
+    ids = df_presencas['ID_Presenca']
+    max_id = int(ids.max()) if ids.notna().any() else 0
+
+    incremental = False
+    if agregados is not None and agregados['linhas'] > 0:
+        antigas = ids <= agregados['max_id']
+        incremental = (int(antigas.sum()) == agregados['linhas'] and
+                       _assinatura_presencas(df_presencas[antigas]) == agregados['assinatura'])
+
+    if incremental:
+        df_novas = df_presencas[ids > agregados['max_id']]
+        if df_novas.empty:
+            return agregados
+        parcial = _agregar_linhas_presenca(df_novas)
+        semanal = agregados['semanal'].add(parcial['semanal'], fill_value=0).astype('int64')
+        mensal = agregados['mensal'].add(parcial['mensal'], fill_value=0).astype('int64')
+        ultima_aula = pd.concat([agregados['ultima_aula'], parcial['ultima_aula']]).groupby(level=0).max()
+    else:
+        parcial = _agregar_linhas_presenca(df_presencas)
+        semanal, mensal, ultima_aula = parcial['semanal'], parcial['mensal'], parcial['ultima_aula']
+
+    return {'semanal': semanal, 'mensal': mensal, 'ultima_aula': ultima_aula,
+            'max_id': max_id, 'linhas': int(ids.notna().sum()),
+            'assinatura': _assinatura_presencas(df_presencas[ids.notna()])}
+
+
+def aulas_semanais_do_plano(df_planos):
+    """Retorna {Plano: aulas por semana} usando a coluna 'Aulas_Semana' ou o 'Nx' do nome do plano."""
+    if df_planos.empty or 'Plano' not in df_planos.columns:
+        return {}
+    if 'Aulas_Semana' in df_planos.columns:
+        aulas = pd.to_numeric(df_planos['Aulas_Semana'], errors='coerce')
+    else:
+        aulas = pd.to_numeric(df_planos['Plano'].astype(str).str.extract(r'(\d+)\s*[xX]')[0], errors='coerce')
+    return dict(zip(df_planos['Plano'], aulas))
+
+
+def calcular_frequencia(agregados, df_matriculas, df_planos, data_referencia):
+    """Monta o resumo de frequência por aluno (mês atual, média de 4 semanas, dias sem aula, % do plano)."""
+    if df_matriculas.empty or 'ID' not in df_matriculas.columns:
+        return pd.DataFrame()
+
+    data_referencia = pd.Timestamp(data_referencia).normalize()
+    semana_ref = data_referencia.to_period('W').start_time
+    mes_ref = data_referencia.to_period('M').start_time
+
+    colunas_base = [col for col in ['ID', 'Nome', 'Plano', 'Status'] if col in df_matriculas.columns]
+    df = df_matriculas[colunas_base].drop_duplicates(subset=['ID']).set_index('ID')
+
+    semanal = agregados['semanal']
+    if not semanal.empty:
+        semanas = semanal.index.get_level_values('Semana')
+        ultimas_4 = semanal[(semanas > semana_ref - pd.Timedelta(weeks=4)) & (semanas <= semana_ref)]
+        df['Media_4_Semanas'] = ultimas_4.groupby(level='ID_Aluno').sum().reindex(df.index).fillna(0) / 4
+    else:
+        df['Media_4_Semanas'] = 0.0
+
+    mensal = agregados['mensal']
+    if not mensal.empty:
+        do_mes = mensal[mensal.index.get_level_values('Mes') == mes_ref]
+        df['Aulas_Mes'] = do_mes.droplevel('Mes').reindex(df.index).fillna(0).astype(int)
+        df['Total_Aulas'] = mensal.groupby(level='ID_Aluno').sum().reindex(df.index).fillna(0).astype(int)
+    else:
+        df['Aulas_Mes'] = 0
+        df['Total_Aulas'] = 0
+
+    df['Ultima_Aula'] = agregados['ultima_aula'].reindex(df.index)
+    df['Dias_Sem_Aula'] = (data_referencia - df['Ultima_Aula']).dt.days
+
+    aulas_plano = aulas_semanais_do_plano(df_planos)
+    if 'Plano' in df.columns:
+        df['Aulas_Semana_Plano'] = df['Plano'].map(aulas_plano)
+    else:
+        df['Aulas_Semana_Plano'] = float('nan')
+    df['Uso_Plano'] = df['Media_4_Semanas'] / df['Aulas_Semana_Plano']
+
+    return df.reset_index().rename(columns={'ID': 'ID_Aluno'})
+
+
+def presencas_por_mes(agregados):
+    """Total de aulas do studio por mês (para o gráfico de tendência)."""
+    mensal = agregados['mensal']
+    if mensal.empty:
+        return pd.DataFrame(columns=['Mes', 'Aulas'])
+    return mensal.groupby(level='Mes').sum().rename('Aulas').reset_index()
+
+
+# -----------------------------------------------------
+# INVESTIMENTOS (Investimentos_Caixa)
+# -----------------------------------------------------
+DIAS_UTEIS_ANO = 252
+DIAS_UTEIS_MES = 21
+
+
+def carregar_historico_cdi(caminho):
+    """Lê o CSV local de CDI (Data, CDI_Anual em %) como série de taxas anuais (fração) por data de vigência."""
+    df = pd.read_csv(caminho)
+    df['Data'] = pd.to_datetime(df['Data'], errors='coerce')
+    df['CDI_Anual'] = pd.to_numeric(df['CDI_Anual'], errors='coerce') / 100.0
+    df = df.dropna().sort_values(by='Data')
+    return pd.Series(df['CDI_Anual'].values, index=pd.DatetimeIndex(df['Data']), name='CDI_Anual')
+
+
+def percentual_cdi_do_produto(produto):
+    """Extrai o percentual do CDI do nome do produto (ex: 'CDB 102% CDI' -> 1.02); padrão 100%."""
+    encontrado = re.search(r'(\d+(?:[.,]\d+)?)\s*%\s*CDI', str(produto))
+    if not encontrado:
+        return 1.0
+    return float(encontrado.group(1).replace(',', '.')) / 100.0
+
+
+def acumular_investimentos(df_movimentacoes, serie_cdi, data_fim):
+    """Saldo com rendimentos por produto em cada dia útil (convenção 252), a partir do livro de movimentações."""
+    colunas = {'Data', 'Produto', 'Valor'}
+    if df_movimentacoes.empty or not colunas.issubset(df_movimentacoes.columns) or serie_cdi.empty:
+        return pd.DataFrame()
+
+    df_mov = df_movimentacoes.dropna(subset=['Data'])
+    if df_mov.empty:
+        return pd.DataFrame()
+
+    dias = pd.bdate_range(df_mov['Data'].min().normalize(), pd.Timestamp(data_fim).normalize())
+    if dias.empty:
+        return pd.DataFrame()
+
+    # CDI vigente em cada dia útil (última taxa conhecida vale para os dias seguintes)
+    cdi_anual = serie_cdi.reindex(serie_cdi.index.union(dias)).ffill().bfill().reindex(dias).to_numpy()
+    taxa_dia_cdi = (1 + cdi_anual) ** (1 / DIAS_UTEIS_ANO) - 1
+
+    # Movimentações em fim de semana entram no próximo dia útil
+    posicao = dias.searchsorted(df_mov['Data'].dt.normalize().to_numpy())
+    df_mov = df_mov.assign(_posicao=posicao)
+    df_mov = df_mov[df_mov['_posicao'] < len(dias)]
+
+    saldos = {}
+    for produto, df_produto in df_mov.groupby('Produto'):
+        fator_dia = 1 + taxa_dia_cdi * percentual_cdi_do_produto(produto)
+        # G[t] = produto dos fatores dos dias anteriores a t: o dia do aporte ainda não rende
+        fator_acumulado = np.concatenate(([1.0], np.cumprod(fator_dia)[:-1]))
+        fluxo = np.bincount(df_produto['_posicao'], weights=df_produto['Valor'], minlength=len(dias))
+        saldos[produto] = fator_acumulado * np.cumsum(fluxo / fator_acumulado)
+
+    return pd.DataFrame(saldos, index=dias)
+
+
+def projetar_saldos(saldos, taxa_cdi_anual, meses):
+    """Projeção mensal vetorizada (21 dias úteis/mês) para {Produto: saldo}; inclui a linha 'Total'."""
+    taxa_dia_cdi = (1 + taxa_cdi_anual) ** (1 / DIAS_UTEIS_ANO) - 1
+    vetor_meses = np.arange(meses + 1)
+    projecoes = {}
+    for produto, saldo in saldos.items():
+        fator_mes = (1 + taxa_dia_cdi * percentual_cdi_do_produto(produto)) ** DIAS_UTEIS_MES
+        fatores = np.cumprod(np.concatenate(([1.0], np.full(meses, fator_mes))))
+        projecoes[produto] = saldo * fatores
+
+    df_proj = pd.DataFrame(projecoes, index=pd.Index(vetor_meses, name='Mês'))
+    df_proj['Total'] = df_proj.sum(axis=1)
+    return df_proj.reset_index().melt('Mês', var_name='Produto', value_name='Saldo Projetado')
+
+
+# -----------------------------------------------------
+# ANIVERSÁRIOS (Matriculas)
+# -----------------------------------------------------
+def indexar_comemoracoes(df_matriculas):
+    """Índice de aniversários de vida e de studio dos alunos ativos.
+
+    indice['tabelas'][tipo] tem os alunos (ID, Nome, Ano) ordenados por nome e
+    indice[tipo] leva cada (mês, dia) às posições deles nessa tabela.
+    """
+    indice = {'vida': {}, 'studio': {}, 'tabelas': {}}
+    if df_matriculas.empty or 'Status' not in df_matriculas.columns:
+        return indice
+
+    df_ativas = df_matriculas[df_matriculas['Status'].astype(str).str.lower() == 'ativa']
+    colunas = {'vida': 'Data_Nascimento', 'studio': 'Data_Primeira_Matricula'}
+    for tipo, coluna in colunas.items():
+        if coluna not in df_ativas.columns:
+            continue
+        datas = pd.to_datetime(df_ativas[coluna], errors='coerce')
+        df_tipo = pd.DataFrame({
+            'ID': df_ativas['ID'].values,
+            'Nome': df_ativas['Nome'].values,
+            'Mes': datas.dt.month.values,
+            'Dia': datas.dt.day.values,
+            'Ano': datas.dt.year.values,
+        }).dropna(subset=['Mes', 'Dia', 'Ano']).astype({'Mes': int, 'Dia': int, 'Ano': int})
+        df_tipo = df_tipo.sort_values(by='Nome', kind='stable').reset_index(drop=True)
+        indice['tabelas'][tipo] = df_tipo[['ID', 'Nome', 'Ano']]
+        indice[tipo] = {(int(mes), int(dia)): posicoes
+                        for (mes, dia), posicoes in df_tipo.groupby(['Mes', 'Dia']).indices.items()}
+    return indice
+
+
+def comemoracoes_no_periodo(indice, tipo, inicio, fim):
+    """Lista as comemorações de 'tipo' ('vida' ou 'studio') entre 'inicio' e 'fim' (inclusive), olhando só os dias da janela."""
+    datas, posicoes = [], []
+    for data in pd.date_range(pd.Timestamp(inicio).normalize(), pd.Timestamp(fim).normalize(), freq='D'):
+        chaves = [(data.month, data.day)]
+        # Quem nasceu em 29/02 comemora em 28/02 nos anos não bissextos
+        if data.month == 2 and data.day == 28 and not data.is_leap_year:
+            chaves.append((2, 29))
+        for chave in chaves:
+            encontradas = indice[tipo].get(chave)
+            if encontradas is not None:
+                datas.append(np.full(len(encontradas), data.to_datetime64()))
+                posicoes.append(encontradas)
+    if not posicoes:
+        return pd.DataFrame(columns=['Data', 'ID', 'Nome', 'Anos'])
+
+    alunos = indice['tabelas'][tipo].take(np.concatenate(posicoes))
+    datas = pd.DatetimeIndex(np.concatenate(datas))
+    return pd.DataFrame({'Data': datas, 'ID': alunos['ID'].values, 'Nome': alunos['Nome'].values,
+                         'Anos': datas.year.values - alunos['Ano'].values})
+
+
+# -----------------------------------------------------
+# COORTES E RETENÇÃO (Historico_Renovacoes)
+# -----------------------------------------------------
+PERIODOS_COORTE = {'Mês': 'M', 'Trimestre': 'Q', 'Ano': 'Y'}
+
+
+def montar_ciclos_contrato(df_historico, df_matriculas, df_planos, data_referencia):
+    """Um registro por contrato com coorte (1ª matrícula), nº do ciclo e situação (Renovado/Não Renovado/Vigente)."""
+    colunas = {'ID_Aluno', 'Data_Inicio_Contrato'}
+    if df_historico.empty or not colunas.issubset(df_historico.columns):
+        return pd.DataFrame()
+
+    data_referencia = pd.Timestamp(data_referencia).normalize()
+    df = df_historico.dropna(subset=['ID_Aluno', 'Data_Inicio_Contrato']).copy()
+    df = df.sort_values(by=['ID_Aluno', 'Data_Inicio_Contrato'], kind='stable')
+
+    df['Ciclo'] = df.groupby('ID_Aluno').cumcount() + 1
+    df['Inicio_Coorte'] = df.groupby('ID_Aluno')['Data_Inicio_Contrato'].transform('min')
+    df['Proximo_Inicio'] = df.groupby('ID_Aluno')['Data_Inicio_Contrato'].shift(-1)
+
+    # Fim do contrato pela duração do plano (planos sem duração contam como 1 mês)
+    duracao = pd.Series(1, index=df.index)
+    if not df_planos.empty and {'Plano', 'Duracao_Meses'}.issubset(df_planos.columns) and 'Plano' in df.columns:
+        duracao_por_plano = dict(zip(df_planos['Plano'], df_planos['Duracao_Meses']))
+        duracao = df['Plano'].map(duracao_por_plano).fillna(1).clip(lower=1).astype(int)
+    df['Fim_Contrato'] = somar_meses(df['Data_Inicio_Contrato'], duracao)
+
+    # Alunos ainda ativos/congelados sem novo contrato estão em andamento, não perdidos
+    em_andamento = pd.Series(False, index=df.index)
+    if not df_matriculas.empty and {'ID', 'Status'}.issubset(df_matriculas.columns):
+        status_por_id = dict(zip(df_matriculas['ID'], df_matriculas['Status'].astype(str).str.lower()))
+        em_andamento = df['ID_Aluno'].map(status_por_id).isin(['ativa', 'congelado'])
+
+    df['Situacao'] = 'Renovado'
+    sem_renovacao = df['Proximo_Inicio'].isna()
+    df.loc[sem_renovacao, 'Situacao'] = 'Não Renovado'
+    df.loc[sem_renovacao & (em_andamento | (df['Fim_Contrato'] > data_referencia)), 'Situacao'] = 'Vigente'
+    return df
+
+
+def calcular_coortes(df_ciclos, data_referencia, periodo='Mês'):
+    """Tabela de retenção por coorte x ciclo, churn por ciclo e permanência média (em meses)."""
+    if df_ciclos.empty:
+        return {'retencao': pd.DataFrame(), 'tamanho': pd.Series(dtype='int64'),
+                'churn': pd.DataFrame(), 'permanencia_media': 0.0, 'curva': pd.DataFrame()}
+
+    data_referencia = pd.Timestamp(data_referencia).normalize()
+    freq = PERIODOS_COORTE.get(periodo, 'M')
+    df = df_ciclos.assign(Coorte=df_ciclos['Inicio_Coorte'].dt.to_period(freq).astype(str))
+
+    # Retenção: % da coorte que chegou a cada ciclo
+    alunos_por_ciclo = df.pivot_table(index='Coorte', columns='Ciclo', values='ID_Aluno', aggfunc='nunique',
+                                      fill_value=0)
+    tamanho = alunos_por_ciclo[1] if 1 in alunos_por_ciclo.columns else alunos_por_ciclo.iloc[:, 0]
+    retencao = alunos_por_ciclo.div(tamanho, axis=0)
+
+    # Churn: entre os contratos já encerrados de cada ciclo, % que não renovou
+    encerrados = df[df['Situacao'] != 'Vigente']
+    churn = encerrados.groupby('Ciclo')['Situacao'].agg(
+        Contratos_Encerrados='size',
+        Nao_Renovados=lambda situacao: int((situacao == 'Não Renovado').sum()))
+    churn['Taxa_Churn'] = churn['Nao_Renovados'] / churn['Contratos_Encerrados']
+
+    # Permanência: da 1ª matrícula até o fim do último contrato (ou hoje, se ainda vigente)
+    ultimo = df.groupby('ID_Aluno').tail(1)
+    fim = ultimo['Fim_Contrato'].where(ultimo['Situacao'] != 'Vigente', data_referencia)
+    fim = fim.where(fim <= data_referencia, data_referencia)
+    permanencia_meses = (fim - ultimo['Inicio_Coorte']).dt.days / 30.4375
+    permanencia_media = float(permanencia_meses.mean()) if not permanencia_meses.empty else 0.0
+
+    # Curva geral ponderada pelo tamanho das coortes
+    curva = (alunos_por_ciclo.sum() / tamanho.sum()).rename('Retencao').rename_axis('Ciclo').reset_index()
+
+    return {'retencao': retencao, 'tamanho': tamanho, 'churn': churn.reset_index(),
+            'permanencia_media': permanencia_media, 'curva': curva}
+
+
+# -----------------------------------------------------
+# VENCIMENTO DE PLANOS (Gestão de Renovações)
+# -----------------------------------------------------
+def separar_vencimentos(df_matriculas, df_planos, data_referencia, dias=30):
+    """Alunos ativos com plano já vencido e com plano vencendo nos próximos `dias`, ambos por Data_Fim."""
+    df = df_matriculas[df_matriculas['Status'].str.lower() == 'ativa'].merge(df_planos, on='Plano', how='left')
+    df['Duracao_Meses'] = df['Duracao_Meses'].fillna(0)
+    df = df.dropna(subset=['Data_Inicio'])
+    # Planos sem duração não vencem
+    df['Data_Fim'] = somar_meses(df['Data_Inicio'], df['Duracao_Meses']).where(df['Duracao_Meses'] > 0)
+    df = df.dropna(subset=['Data_Fim'])
+
+    referencia = pd.Timestamp(data_referencia).normalize()
+    data_fim = df['Data_Fim'].dt.normalize()
+    df_expirados = df[data_fim < referencia].sort_values(by='Data_Fim', ascending=True)
+    df_a_vencer = df[(data_fim >= referencia) & (data_fim <= referencia + pd.Timedelta(days=dias))].sort_values(
+        by='Data_Fim', ascending=True)
+    return df_expirados, df_a_vencer
+
+
+# -----------------------------------------------------
+# BUSCA DE ALUNOS (Nome, CPF, Telefone)
+# -----------------------------------------------------
+def normalizar_texto(texto):
+    """Minúsculas, sem acentos e com espaços simples (ex: 'Conceição ' -> 'conceicao')."""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def somente_digitos(texto):
+    """Mantém só os dígitos (ex: '123.456.789-00' -> '12345678900')."""
+    return re.sub(r'\D', '', str(texto))
+
+
+def _ngramas(texto, n=3):
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+
+def indexar_alunos(df_matriculas):
+    """Índice de busca por n-gramas do nome (sem acento) e dos dígitos de CPF e telefone."""
+    indice = {'alunos': [], 'ngramas': {}, 'status': np.array([], dtype=object)}
+    if df_matriculas.empty or not {'ID', 'Nome'}.issubset(df_matriculas.columns):
+        return indice
+
+    df = df_matriculas.dropna(subset=['ID']).sort_values(by='Nome', kind='stable')
+    vazio = pd.Series('', index=df.index)
+    colunas = zip(df['ID'], df['Nome'], df.get('CPF', vazio), df.get('Telefone', vazio), df.get('Status', vazio))
+    ngramas = {}
+    for posicao, (id_aluno, nome, cpf, telefone, status) in enumerate(colunas):
+        nome_norm = normalizar_texto(nome)
+        aluno = {
+            'ID': id_aluno,
+            'Nome': nome,
+            'Nome_Norm': nome_norm,
+            'Tokens': nome_norm.split(),
+            'CPF': somente_digitos(cpf),
+            'Telefone': somente_digitos(telefone),
+            'Status': str(status).strip().lower(),
+        }
+        indice['alunos'].append(aluno)
+        chaves = _ngramas(f" {nome_norm} ")
+        chaves |= {f"#{ng}" for ng in _ngramas(aluno['CPF']) | _ngramas(aluno['Telefone'])}
+        for chave in chaves:
+            ngramas.setdefault(chave, []).append(posicao)
+
+    indice['ngramas'] = {chave: np.array(posicoes, dtype=np.int32) for chave, posicoes in ngramas.items()}
+    indice['status'] = np.array([aluno['Status'] for aluno in indice['alunos']], dtype=object)
+    return indice
+
+
+def buscar_alunos(indice, consulta, limite=10, status=None):
+    """Retorna os 'limite' alunos mais parecidos com a consulta (nome, CPF ou telefone), opcionalmente filtrando status."""
+    consulta_norm = normalizar_texto(consulta)
+    digitos = somente_digitos(consulta)
+    # Sem letras e com dígitos suficientes: busca por CPF/telefone
+    busca_numerica = len(digitos) >= 3 and not re.search(r'[a-z]', consulta_norm)
+    if not busca_numerica and len(consulta_norm) < 2:
+        return []
+
+    if busca_numerica:
+        chaves = {f"#{ng}" for ng in _ngramas(digitos)}
+    else:
+        # Espaço só no início: cada palavra digitada pode ser um prefixo
+        chaves = set()
+        for token in consulta_norm.split():
+            chaves |= _ngramas(f" {token}")
+
+    postings = [indice['ngramas'][chave] for chave in chaves if chave in indice['ngramas']]
+    if not postings:
+        return []
+
+    # Contagem de n-gramas em comum por aluno, vetorizada
+    acertos = np.bincount(np.concatenate(postings), minlength=len(indice['alunos']))
+    candidatos = acertos >= max(1, int(len(chaves) * 0.5))
+    if status is not None:
+        candidatos &= np.isin(indice['status'], list(status))
+    posicoes = np.flatnonzero(candidatos)
+    if posicoes.size == 0:
+        return []
+
+    # Pré-seleção pelos acertos (empate: ordem alfabética, que é a ordem do índice)
+    ordem = np.lexsort((posicoes, -acertos[posicoes]))
+    posicoes = posicoes[ordem[:limite * 5]]
+
+    tokens_consulta = consulta_norm.split()
+    resultados = []
+    for posicao in posicoes.tolist():
+        aluno = indice['alunos'][posicao]
+        pontuacao = acertos[posicao] / len(chaves)
+        if busca_numerica:
+            if aluno['CPF'].startswith(digitos) or aluno['Telefone'].startswith(digitos):
+                pontuacao += 2
+            elif digitos in aluno['CPF'] or digitos in aluno['Telefone']:
+                pontuacao += 1
+        else:
+            if aluno['Nome_Norm'] == consulta_norm:
+                pontuacao += 3
+            if all(any(t.startswith(q) for t in aluno['Tokens']) for q in tokens_consulta):
+                pontuacao += 1
+        resultados.append((-pontuacao, posicao))
+
+    return [indice['alunos'][posicao] for _, posicao in heapq.nsmallest(limite, resultados)]
+
+
+# -----------------------------------------------------
+# UNICIDADE DE CPF / EMAIL (Matriculas)
+# -----------------------------------------------------
+def normalizar_email(email):
+    """Email sem espaços e em minúsculas."""
+    return str(email).strip().lower()
+
+
+def indexar_documentos(df_matriculas):
+    """Índice {CPF só dígitos: ID} e {email normalizado: ID} para checagem de duplicidade em O(1)."""
+    indice = {'cpf': {}, 'email': {}, 'max_id': 0}
+    if df_matriculas.empty or 'ID' not in df_matriculas.columns:
+        return indice
+
+    ids = df_matriculas['ID']
+    if 'CPF' in df_matriculas.columns:
+        cpfs = df_matriculas['CPF'].astype(str).str.replace(r'\D', '', regex=True)
+        indice['cpf'] = {cpf: id_aluno for cpf, id_aluno in zip(cpfs, ids) if cpf}
+    if 'Email' in df_matriculas.columns:
+        emails = df_matriculas['Email'].astype(str).str.strip().str.lower()
+        indice['email'] = {email: id_aluno for email, id_aluno in zip(emails, ids) if email}
+    if ids.notna().any():
+        indice['max_id'] = int(ids.max())
+    return indice
+
+
+def registrar_documentos(indice, id_aluno, cpf, email):
+    """Inclui no índice os documentos de um cadastro recém-salvo."""
+    cpf_digitos = somente_digitos(cpf)
+    if cpf_digitos:
+        indice['cpf'][cpf_digitos] = id_aluno
+    email_norm = normalizar_email(email)
+    if email_norm:
+        indice['email'][email_norm] = id_aluno
+    indice['max_id'] = max(indice['max_id'], int(id_aluno))
+
+
+def validar_importacao_alunos(df_novos, indice):
+    """Valida um lote de cadastros: CPF inválido, CPF/email já cadastrados e repetidos dentro do próprio lote."""
+    validador_cpf = CPF()
+    df = pd.DataFrame(index=df_novos.index)
+    cpfs = df_novos.get('CPF', pd.Series('', index=df_novos.index)).astype(str).str.replace(r'\D', '', regex=True)
+    emails = df_novos.get('Email', pd.Series('', index=df_novos.index)).astype(str).str.strip().str.lower()
+
+    df['CPF_Valido'] = [bool(cpf) and validador_cpf.validate(cpf) for cpf in cpfs]
+    df['CPF_Ja_Cadastrado'] = cpfs.isin(indice['cpf'].keys()) & (cpfs != '')
+    df['CPF_Repetido_No_Lote'] = cpfs.duplicated(keep=False) & (cpfs != '')
+    df['Email_Ja_Cadastrado'] = emails.isin(indice['email'].keys()) & (emails != '')
+    df['Email_Repetido_No_Lote'] = emails.duplicated(keep=False) & (emails != '')
+    df['Apto'] = df['CPF_Valido'] & ~df['CPF_Ja_Cadastrado'] & ~df['CPF_Repetido_No_Lote']
+    return df
+
+
+# -----------------------------------------------------
+# LISTA DE ALUNOS PAGINADA (Matriculas)
+# -----------------------------------------------------
+COLUNAS_LISTA_ALUNOS = ['ID', 'Nome', 'Email', 'Telefone', 'Plano', 'Status',
+                        'Data_Primeira_Matricula', 'Data_Inicio',
+                        'Data_Congelamento_Inicio', 'Data_Nascimento', 'Emprego', 'Desconto_Percentual']
+
+
+def preparar_lista_alunos(df_matriculas):
+    """Projeta as colunas da lista e pré-calcula as chaves de filtro (status minúsculo e texto de busca)."""
+    colunas = [col for col in COLUNAS_LISTA_ALUNOS if col in df_matriculas.columns]
+    df = df_matriculas[colunas].copy()
+    vazio = pd.Series('', index=df_matriculas.index)
+    df['_Status'] = df_matriculas.get('Status', vazio).astype(str).str.strip().str.lower()
+    nome_norm = df_matriculas.get('Nome', vazio).map(normalizar_texto)
+    digitos = (df_matriculas.get('CPF', vazio).astype(str) + ' ' +
+               df_matriculas.get('Telefone', vazio).astype(str)).str.replace(r'[^\d ]', '', regex=True)
+    df['_Busca'] = nome_norm + ' ' + digitos
+    return df
+
+
+def paginar_alunos(df_lista, status=None, planos=None, texto='', ordenar_por='ID', crescente=False,
+                   pagina=1, tamanho_pagina=50):
+    """Filtra, ordena e corta uma página da lista; retorna (página sem as colunas internas, total filtrado)."""
+    mascara = pd.Series(True, index=df_lista.index)
+    if status:
+        mascara &= df_lista['_Status'] == status.lower()
+    if planos and 'Plano' in df_lista.columns:
+        mascara &= df_lista['Plano'].isin(planos)
+    for termo in normalizar_texto(texto).split():
+        if not re.search(r'[a-z]', termo):
+            termo = somente_digitos(termo)
+        if termo:
+            mascara &= df_lista['_Busca'].str.contains(termo, regex=False)
+
+    df = df_lista[mascara]
+    total = len(df)
+    if ordenar_por in df.columns:
+        df = df.sort_values(by=ordenar_por, ascending=crescente, kind='stable', na_position='last')
+
+    inicio = (max(pagina, 1) - 1) * tamanho_pagina
+    colunas_visiveis = [col for col in df.columns if not col.startswith('_')]
+    return df.iloc[inicio:inicio + tamanho_pagina][colunas_visiveis], total
+
+
+# -----------------------------------------------------
+# DASHBOARD FINANCEIRO (Matriculas, Planos, Pagamentos, Despesas)
+# -----------------------------------------------------
+def montar_contratos_ativos(df_matriculas, df_planos):
+    """Matrículas ativas com o plano, a Data_Fim do contrato e o valor mensal com desconto."""
+    if df_matriculas.empty or df_planos.empty:
+        return pd.DataFrame()
+    df_ativas = df_matriculas[df_matriculas.get('Status', pd.Series(dtype=str)).str.lower() == 'ativa']
+    df = df_ativas.merge(df_planos, left_on='Plano', right_on='Plano')
+    if 'Data_Inicio' not in df.columns or 'Duracao_Meses' not in df.columns:
+        return pd.DataFrame()
+
+    df = df.dropna(subset=['Data_Inicio']).copy()
+    df['Data_Fim'] = somar_meses(df['Data_Inicio'], df['Duracao_Meses'])
+    df = df.dropna(subset=['Data_Fim'])
+    preco = df.get('Preco_Mensal', 0)
+    desconto = df.get('Desconto_Percentual', 0)
+    df['Valor_Plano_Final'] = preco * (1 - desconto / 100)
+    df['Valor_Descontado'] = preco - df['Valor_Plano_Final']
+    return df
+
+
+def contratos_vigentes_no_mes(df_contratos, inicio, fim):
+    """Contratos que cobrem ao menos um dia do mês [inicio, fim]."""
+    if df_contratos.empty:
+        return df_contratos
+    return df_contratos[(df_contratos['Data_Inicio'] <= fim) & (df_contratos['Data_Fim'] > inicio)]
+
+
+def composicao_percentual(df, chave, valor):
+    """Soma de `valor` por `chave` (só fatias positivas) com o percentual do total já formatado."""
+    df_composicao = df.groupby(chave)[valor].sum().reset_index()
+    df_composicao = df_composicao[df_composicao[valor] > 0]
+    total = df_composicao[valor].sum()
+    df_composicao['Percentual'] = ((df_composicao[valor] / total * 100).round(1).astype(str) + '%'
+                                   if total > 0 else '')
+    return df_composicao
+
+
+def _receita_prevista_por_mes(df_contratos, inicios, fins):
+    """Receita prevista e descontos de cada mês [inicio, fim]: soma dos contratos que cobrem ao menos um dia dele."""
+    if df_contratos.empty:
+        return np.zeros(len(inicios)), np.zeros(len(inicios))
+    # Matriz contrato x mês: o contrato cobre o mês?
+    vigente = ((df_contratos['Data_Inicio'].to_numpy()[:, None] <= fins.to_numpy()[None, :]) &
+               (df_contratos['Data_Fim'].to_numpy()[:, None] > inicios.to_numpy()[None, :]))
+    return (df_contratos['Valor_Plano_Final'].to_numpy() @ vigente,
+            df_contratos['Valor_Descontado'].to_numpy() @ vigente)
+
+
+def _somar_por_competencia(df, coluna, anos, meses):
+    """Soma de `coluna` em cada (ano, mês) de competência pedido (0 onde não há linhas)."""
+    if df.empty or coluna not in df.columns:
+        return np.zeros(len(anos))
+    somas = df.groupby(['Ano_Competencia', 'Mes_Competencia'])[coluna].sum()
+    return somas.reindex(pd.MultiIndex.from_arrays([anos, meses]), fill_value=0.0).to_numpy()
+
+
+def projetar_fluxo_anual(df_contratos, df_despesas, inicio, meses=12):
+    """Receita prevista, descontos e gastos previstos por mês nos `meses` a partir de `inicio`."""
+    inicios = pd.date_range(pd.Timestamp(inicio).replace(day=1), periods=meses, freq='MS')
+    fins = inicios + pd.offsets.MonthEnd(0)
+    df = pd.DataFrame({'Mes': inicios.strftime('%Y-%m')})
+    df['Receita Prevista'], df['Valor_Descontado'] = _receita_prevista_por_mes(df_contratos, inicios, fins)
+    df['Gastos Previstos'] = _somar_por_competencia(df_despesas, 'Valor', inicios.year, inicios.month)
+    return df
+
+
+def resumir_fluxo_mes(df_contratos, df_pagamentos_mes, df_despesas_mes, mes, ano):
+    """Receita prevista, pagamentos e despesas de um mês de competência, com os totais do dashboard."""
+    data_inicio = pd.Timestamp(ano, mes, 1)
+    data_fim = data_inicio + pd.offsets.MonthEnd(0)
+    df_receita = contratos_vigentes_no_mes(df_contratos, data_inicio, data_fim)
+
+    receita_bruta = df_pagamentos_mes['Valor_Pago'].sum() if 'Valor_Pago' in df_pagamentos_mes else 0
+    # Fallback para o bruto se a coluna Valor_Liquido ainda não existir
+    receita_liquida = (df_pagamentos_mes['Valor_Liquido'].sum() if 'Valor_Liquido' in df_pagamentos_mes
+                       else receita_bruta)
+    totais = {
+        'receita_prevista': df_receita['Valor_Plano_Final'].sum() if not df_receita.empty else 0,
+        'descontos': df_receita['Valor_Descontado'].sum() if not df_receita.empty else 0,
+        'receita_bruta': receita_bruta,
+        'receita_liquida': receita_liquida,
+        'gastos_previstos': df_despesas_mes['Valor'].sum() if 'Valor' in df_despesas_mes else 0,
+        'gastos_realizados': df_despesas_mes['Valor_Pago'].sum() if 'Valor_Pago' in df_despesas_mes else 0,
+    }
+    return {'receita': df_receita, 'pagamentos': df_pagamentos_mes, 'despesas': df_despesas_mes, 'totais': totais}
+
+
+def status_pagamentos_alunos(df_receita, df_pagamentos_mes):
+    """Situação de cada aluno no mês (Pago/Parcial/Não Pago): valor com desconto menos o pago (bruto)."""
+    df_status_cols = ['ID', 'Nome', 'Plano', 'Preco_Mensal', 'Desconto_Percentual', 'Valor_Plano_Final',
+                      'Justificativa_Desconto']
+    df_status_cols_exist = [col for col in df_status_cols if col in df_receita.columns]
+    df_status = df_receita[df_status_cols_exist].copy()
+    df_status.rename(
+        columns={'ID': 'ID_Aluno', 'Preco_Mensal': 'Valor_Cheio', 'Valor_Plano_Final': 'Valor_Plano_com_Desc'},
+        inplace=True)
+    df_status = df_status.drop_duplicates(subset=['ID_Aluno'])
+
+    if not df_pagamentos_mes.empty and 'ID_Aluno' in df_pagamentos_mes.columns:
+        # Agrupa pelo Valor_Pago (Bruto) para abater a dívida
+        df_pagos_agrupado = df_pagamentos_mes.groupby('ID_Aluno')['Valor_Pago'].sum().reset_index()
+        df_status = pd.merge(df_status, df_pagos_agrupado, on='ID_Aluno', how='left')
+    else:
+        df_status['Valor_Pago'] = 0
+
+    df_status['Valor_Pago'] = df_status['Valor_Pago'].fillna(0)
+    if 'Valor_Plano_com_Desc' not in df_status.columns:
+        df_status['Valor_Plano_com_Desc'] = df_status.get('Valor_Cheio', 0)
+
+    # Saldo Devedor é (Previsto com Desconto - Pago Bruto)
+    df_status['Saldo_Devedor'] = df_status['Valor_Plano_com_Desc'] - df_status['Valor_Pago']
+
+    df_status['Status_Pagamento'] = np.select(
+        [df_status['Saldo_Devedor'] <= 0.01, df_status['Saldo_Devedor'] < df_status['Valor_Plano_com_Desc']],
+        ["Pago", "Parcial"], default="Não Pago")
+    cols_display_status = ['Nome', 'Plano', 'Valor_Cheio', 'Desconto_Percentual', 'Valor_Plano_com_Desc',
+                           'Valor_Pago', 'Saldo_Devedor', 'Status_Pagamento']
+    cols_status_exist = [col for col in cols_display_status if col in df_status.columns]
+    return df_status[cols_status_exist].sort_values(by="Nome", ascending=True)
+
+
+# -----------------------------------------------------
+# RESUMO MENSAL (aba Resumo_Mensal)
+# -----------------------------------------------------
+COLUNAS_RESUMO_MENSAL = ['Receita_Prevista', 'Descontos', 'Receita_Bruta', 'Receita_Liquida', 'Taxas',
+                         'Gastos_Previstos', 'Gastos_Pagos']
+# Chave dos totais de resumir_fluxo_mes -> coluna do resumo
+TOTAIS_DO_RESUMO = {'receita_prevista': 'Receita_Prevista', 'descontos': 'Descontos',
+                    'receita_bruta': 'Receita_Bruta', 'receita_liquida': 'Receita_Liquida',
+                    'gastos_previstos': 'Gastos_Previstos', 'gastos_realizados': 'Gastos_Pagos'}
+
+
+def meses_do_resumo(df_contratos, df_pagamentos, df_despesas, data_referencia, horizonte=12):
+    """(Ano, Mes) do primeiro mês com contrato, pagamento ou despesa até `horizonte` meses após a referência."""
+    referencia = pd.Timestamp(data_referencia)
+    primeiro = referencia.year * 12 + referencia.month - 1
+    for df in (df_pagamentos, df_despesas):
+        if not df.empty and {'Ano_Competencia', 'Mes_Competencia'}.issubset(df.columns):
+            competencias = df['Ano_Competencia'] * 12 + df['Mes_Competencia'] - 1
+            competencias = competencias[(df['Ano_Competencia'] > 0) & df['Mes_Competencia'].between(1, 12)]
+            if not competencias.empty:
+                primeiro = min(primeiro, int(competencias.min()))
+    if not df_contratos.empty and df_contratos['Data_Inicio'].notna().any():
+        inicio_contratos = df_contratos['Data_Inicio'].min()
+        primeiro = min(primeiro, inicio_contratos.year * 12 + inicio_contratos.month - 1)
+    ultimo = referencia.year * 12 + referencia.month - 1 + horizonte
+    return [(indice // 12, indice % 12 + 1) for indice in range(primeiro, ultimo + 1)]
+
+
+def resumir_meses(meses, df_contratos=None, df_pagamentos=None, df_despesas=None):
+    """Totais do dashboard por mês de competência, uma linha por (Ano, Mes) de `meses`.
+
+    Cada grupo de colunas (contratos, pagamentos, despesas) só entra quando o DataFrame
+    correspondente é informado. Os valores são os mesmos de resumir_fluxo_mes
+    (pagamentos e despesas devem trazer todas as linhas dos meses pedidos).
+    """
+    indice = pd.MultiIndex.from_tuples(list(meses), names=['Ano', 'Mes'])
+    anos, numeros_mes = indice.get_level_values('Ano'), indice.get_level_values('Mes')
+    inicios = pd.DatetimeIndex(pd.to_datetime(pd.DataFrame({'year': anos, 'month': numeros_mes, 'day': 1})))
+    fins = inicios + pd.offsets.MonthEnd(0)
+
+    df = pd.DataFrame(index=indice)
+    if df_contratos is not None:
+        df['Receita_Prevista'], df['Descontos'] = _receita_prevista_por_mes(df_contratos, inicios, fins)
+    if df_pagamentos is not None:
+        df['Receita_Bruta'] = _somar_por_competencia(df_pagamentos, 'Valor_Pago', anos, numeros_mes)
+        df['Receita_Liquida'] = _somar_por_competencia(df_pagamentos, 'Valor_Liquido', anos, numeros_mes)
+        df['Taxas'] = df['Receita_Bruta'] - df['Receita_Liquida']
+    if df_despesas is not None:
+        df['Gastos_Previstos'] = _somar_por_competencia(df_despesas, 'Valor', anos, numeros_mes)
+        df['Gastos_Pagos'] = _somar_por_competencia(df_despesas, 'Valor_Pago', anos, numeros_mes)
+    return df
+
+
+def totais_do_resumo(linha):
+    """Linha do Resumo_Mensal no formato dos totais de resumir_fluxo_mes."""
+    return {chave: float(linha[coluna]) for chave, coluna in TOTAIS_DO_RESUMO.items()}
+
+
+def projecao_do_resumo(df_resumo, inicio, meses=12):
+    """A projeção de projetar_fluxo_anual lida do Resumo_Mensal; None se faltar algum dos meses."""
+    inicios = pd.date_range(pd.Timestamp(inicio).replace(day=1), periods=meses, freq='MS')
+    chaves = list(zip(inicios.year, inicios.month))
+    if df_resumo.empty or not all(chave in df_resumo.index for chave in chaves):
+        return None
+    linhas = df_resumo.loc[chaves]
+    return pd.DataFrame({'Mes': inicios.strftime('%Y-%m'),
+                         'Receita Prevista': linhas['Receita_Prevista'].to_numpy(),
+                         'Valor_Descontado': linhas['Descontos'].to_numpy(),
+                         'Gastos Previstos': linhas['Gastos_Previstos'].to_numpy()})
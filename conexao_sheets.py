@@ -0,0 +1,592 @@
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import gspread
+import requests
+from google.auth.exceptions import RefreshError, TransportError
+from google.auth.transport.requests import AuthorizedSession
+from google.oauth2.service_account import Credentials
+
+# -----------------------------------------------------
+# ACESSO AO GOOGLE SHEETS COM CONTROLE DE COTA (SEM STREAMLIT)
+# -----------------------------------------------------
+# SessaoGoogle é a conexão HTTP única do processo (keep-alive, token renovado antes
+# de vencer, reconexão em erro de autenticação).
+# PlanilhaComCota envolve o gspread.Spreadsheet aberto em connect_to_sheets:
+# - uma janela deslizante de cota por processo (todas as sessões dividem os mesmos
+#   REQUISICOES_POR_MINUTO em quaisquer 60 s, como o Sheets conta);
+# - nova tentativa com backoff exponencial + jitter em 429/5xx (escritas: só em 429);
+# - leituras idênticas em andamento viram uma só chamada à API;
+# - contadores de requisições para diagnóstico.
+
+REQUISICOES_POR_MINUTO = 60  # cota padrão do Sheets por usuário/minuto
+ESCOPOS_GOOGLE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+ANTECEDENCIA_RENOVACAO = 600  # segundos antes do vencimento do token (que dura 1 h)
+ESPERA_APOS_FALHA_RENOVACAO = 30
+PLANILHA_PADRAO = "StudioPilatesDB"
+MAX_INTERVALOS_POR_LEITURA = 100  # intervalos num batch_get (a URL da requisição tem limite de tamanho)
+CODIGOS_RETENTAVEIS = {429, 500, 502, 503, 504}
+METODOS_LEITURA = {'get_all_values', 'get_all_records', 'get_values', 'get', 'batch_get',
+                   'row_values', 'col_values', 'acell', 'cell'}
+# Apagar linhas é por posição: nem o 429 é repetido (quem apaga relê as posições antes; ver arquivamento.py)
+METODOS_SEM_RETENTATIVA = {'delete_rows'}
+
+
+class SessaoGoogle(AuthorizedSession):
+    """Sessão HTTP autorizada de vida longa para a conta de serviço.
+
+    O pool de conexões (keep-alive) é reaproveitado por todas as requisições. O token
+    é renovado em segundo plano `antecedencia` segundos antes de vencer, então nenhuma
+    leitura espera pela renovação. Se a autenticação falhar mesmo assim (401 após a
+    renovação automática, erro ao renovar ou conexão caída numa leitura), as
+    credenciais e as conexões são recriadas e a requisição é repetida uma vez.
+    """
+
+    def __init__(self, info_conta, escopos=ESCOPOS_GOOGLE, antecedencia=ANTECEDENCIA_RENOVACAO):
+        self._info_conta = dict(info_conta)
+        self._escopos = escopos
+        self.antecedencia = antecedencia
+        self._contadores = Counter()
+        self._lock_renovacao = threading.Lock()
+        self._agendada = None
+        super().__init__(self._novas_credenciais())
+        self.renovar_token()
+
+    def _novas_credenciais(self):
+        return Credentials.from_service_account_info(self._info_conta, scopes=self._escopos)
+
+    def contadores(self):
+        """Cópia dos contadores: renovacoes, falhas_renovacao, reconexoes."""
+        with self._lock_renovacao:
+            return {nome: self._contadores[nome] for nome in ('renovacoes', 'falhas_renovacao', 'reconexoes')}
+
+    def renovar_token(self):
+        """Renova o token agora e agenda a próxima renovação para antes do vencimento."""
+        with self._lock_renovacao:
+            try:
+                self.credentials.refresh(self._auth_request)
+                self._contadores['renovacoes'] += 1
+                agora = datetime.now(timezone.utc).replace(tzinfo=None)  # expiry do google-auth é UTC sem fuso
+                espera = max((self.credentials.expiry - agora).total_seconds() - self.antecedencia,
+                             ESPERA_APOS_FALHA_RENOVACAO)
+            except (RefreshError, TransportError):
+                # A renovação automática do google-auth (na próxima requisição) continua valendo
+                self._contadores['falhas_renovacao'] += 1
+                espera = ESPERA_APOS_FALHA_RENOVACAO
+            if self._agendada is not None:
+                self._agendada.cancel()
+            self._agendada = threading.Timer(espera, self.renovar_token)
+            self._agendada.daemon = True
+            self._agendada.start()
+
+    def reconectar(self):
+        """Recria as credenciais e descarta as conexões abertas (as próximas requisições abrem novas)."""
+        with self._lock_renovacao:
+            self.credentials = self._novas_credenciais()
+            self.close()
+            self._contadores['reconexoes'] += 1
+        self.renovar_token()
+
+    def request(self, method, url, *args, **kwargs):
+        try:
+            resposta = super().request(method, url, *args, **kwargs)
+        except (RefreshError, TransportError):
+            self.reconectar()
+            return super().request(method, url, *args, **kwargs)
+        except requests.ConnectionError:
+            # Escritas não são repetidas: a requisição pode ter chegado ao servidor
+            if method.upper() != 'GET':
+                raise
+            self.reconectar()
+            return super().request(method, url, *args, **kwargs)
+        if resposta.status_code == 401:
+            self.reconectar()
+            return super().request(method, url, *args, **kwargs)
+        return resposta
+
+
+def conectar_gspread(info_conta):
+    """Cliente gspread sobre uma SessaoGoogle (guardar e reaproveitar por todo o processo)."""
+    return gspread.Client(auth=None, session=SessaoGoogle(info_conta))
+
+
+def estudios_configurados(configurados):
+    """{id: {nome, planilha}} a partir da seção [estudios] do secrets.toml; sem ela, um estúdio só."""
+    if not configurados:
+        return {"principal": {"nome": "Studio Pilates", "planilha": PLANILHA_PADRAO}}
+    return {id_estudio: {"nome": config.get("nome", id_estudio), "planilha": config.get("planilha", PLANILHA_PADRAO)}
+            for id_estudio, config in configurados.items()}
+
+
+def abrir_ou_criar_aba(planilha, titulo, cabecalho):
+    """Aba `titulo` da planilha; se não existir, é criada só com o cabeçalho."""
+    try:
+        return planilha.worksheet(titulo)
+    except gspread.exceptions.WorksheetNotFound:
+        planilha.add_worksheet(title=titulo, rows=1000, cols=len(cabecalho))
+        aba = planilha.worksheet(titulo)
+        aba.update(values=[cabecalho], range_name='A1')
+        return aba
+
+
+class BaldeDeTokens:
+    """Limita a taxa de requisições: rajadas de até `capacidade`, repondo `por_segundo` tokens."""
+
+    def __init__(self, capacidade, por_segundo):
+        self.capacidade = capacidade
+        self.por_segundo = por_segundo
+        self._tokens = float(capacidade)
+        self._ultima_reposicao = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consumir(self):
+        """Retira um token, esperando se preciso; retorna quantos segundos esperou."""
+        esperado = 0.0
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade,
+                                   self._tokens + (agora - self._ultima_reposicao) * self.por_segundo)
+                self._ultima_reposicao = agora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return esperado
+                espera = (1 - self._tokens) / self.por_segundo
+            time.sleep(espera)
+            esperado += espera
+
+
+class JanelaDeRequisicoes:
+    """Limita a `limite` requisições em quaisquer `segundos` consecutivos (janela deslizante).
+
+    Um balde de `limite` tokens repostos a `limite`/minuto deixa passar quase o dobro no
+    primeiro minuto (a rajada inicial mais a reposição); aqui a conta é a mesma do Sheets.
+    """
+
+    def __init__(self, limite, segundos=60):
+        self.limite = limite
+        self.segundos = segundos
+        self._horarios = deque()
+        self._lock = threading.Lock()
+
+    def consumir(self):
+        """Registra uma requisição, esperando se preciso; retorna quantos segundos esperou."""
+        esperado = 0.0
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                while self._horarios and agora - self._horarios[0] >= self.segundos:
+                    self._horarios.popleft()
+                if len(self._horarios) < self.limite:
+                    self._horarios.append(agora)
+                    return esperado
+                espera = self.segundos - (agora - self._horarios[0])
+            time.sleep(espera)
+            esperado += espera
+
+
+class _ChamadaEmAndamento:
+    def __init__(self):
+        self.pronta = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class ClienteComCota:
+    """Executa chamadas ao Sheets pelo limitador de taxa (`balde`), com retentativas e coalescência de leituras.
+
+    Leituras são repetidas em 429 e 5xx. Escritas só em 429 (a requisição foi recusada):
+    um 5xx pode chegar depois de a escrita ter sido aplicada, e repeti-la duplicaria linhas.
+    """
+
+    def __init__(self, balde, max_tentativas=5, espera_base=1.0, espera_maxima=32.0):
+        self.balde = balde
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self._contadores = Counter()
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+
+    def _contar(self, nome):
+        with self._lock:
+            self._contadores[nome] += 1
+
+    def contadores(self):
+        """Cópia dos contadores: requisicoes, limitadas (espera no limitador ou 429), retentativas, coalescidas."""
+        with self._lock:
+            return {nome: self._contadores[nome]
+                    for nome in ('requisicoes', 'limitadas', 'retentativas', 'coalescidas')}
+
+    def executar(self, funcao, *args, chave=None, leitura=False, repetir=True, **kwargs):
+        """Chama funcao(*args, **kwargs); com `chave`, chamadas iguais simultâneas compartilham o resultado.
+
+        `leitura` indica que a chamada pode ser repetida em erro do servidor (5xx); com
+        `repetir` falso, ela é feita uma vez só (ainda esperando a cota).
+        """
+        if chave is None:
+            return self._executar_com_retentativas(funcao, args, kwargs, leitura, repetir)
+
+        with self._lock:
+            chamada = self._em_andamento.get(chave)
+            primeira = chamada is None
+            if primeira:
+                chamada = self._em_andamento[chave] = _ChamadaEmAndamento()
+            else:
+                self._contadores['coalescidas'] += 1
+
+        if not primeira:
+            chamada.pronta.wait()
+            if chamada.erro is not None:
+                raise chamada.erro
+            return chamada.resultado
+
+        try:
+            chamada.resultado = self._executar_com_retentativas(funcao, args, kwargs, leitura, repetir)
+            return chamada.resultado
+        except Exception as e:
+            chamada.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._em_andamento[chave]
+            chamada.pronta.set()
+
+    def _executar_com_retentativas(self, funcao, args, kwargs, leitura, repetir):
+        for tentativa in range(self.max_tentativas):
+            if self.balde.consumir() > 0:
+                self._contar('limitadas')
+            self._contar('requisicoes')
+            try:
+                return funcao(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                retentavel = e.code in CODIGOS_RETENTAVEIS if leitura else e.code == 429
+                if not repetir or not retentavel or tentativa == self.max_tentativas - 1:
+                    raise
+                if e.code == 429:
+                    self._contar('limitadas')
+                self._contar('retentativas')
+                # Backoff exponencial com "full jitter" para as sessões não voltarem juntas
+                time.sleep(random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** tentativa)))
+
+
+class AbaComCota:
+    """Worksheet cujas chamadas passam pelo ClienteComCota (leituras são coalescidas)."""
+
+    def __init__(self, aba, id_planilha, titulo, cliente):
+        self._aba = aba
+        self._id_planilha = id_planilha
+        self._titulo = titulo
+        self._cliente = cliente
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._aba, nome)
+        if not callable(atributo):
+            return atributo
+
+        def chamar(*args, **kwargs):
+            chave = None
+            leitura = nome in METODOS_LEITURA
+            if leitura:
+                # O cliente é do processo todo: a chave inclui a planilha, ou estúdios diferentes lendo a
+                # mesma aba receberiam os dados um do outro
+                chave = (self._id_planilha, self._titulo, nome, repr(args), repr(sorted(kwargs.items())))
+            return self._cliente.executar(atributo, *args, chave=chave, leitura=leitura,
+                                          repetir=nome not in METODOS_SEM_RETENTATIVA, **kwargs)
+
+        return chamar
+
+
+class PlanilhaComCota:
+    """Spreadsheet com controle de cota; guarda as abas já abertas (evita buscar metadados a cada leitura)."""
+
+    def __init__(self, planilha, cliente):
+        self._planilha = planilha
+        self._cliente = cliente
+        self._abas = {}
+        self._lock = threading.Lock()
+
+    def worksheet(self, titulo):
+        with self._lock:
+            aba = self._abas.get(titulo)
+        if aba is None:
+            id_planilha = self._planilha.id
+            original = self._cliente.executar(self._planilha.worksheet, titulo,
+                                              chave=('worksheet', id_planilha, titulo), leitura=True)
+            aba = AbaComCota(original, id_planilha, titulo, self._cliente)
+            with self._lock:
+                self._abas[titulo] = aba
+        return aba
+
+    def __getattr__(self, nome):
+        return getattr(self._planilha, nome)
+
+
+class _EntradaAba:
+    def __init__(self, valores, lido_em):
+        self.valores = valores
+        self.lido_em = lido_em
+
+
+class CacheDeAbas:
+    """Valores das abas compartilhados entre sessões.
+
+    Uma leitura por aba por vez (single-flight): quem chega durante a leitura espera o
+    mesmo resultado. Vencido o `ttl`, o valor antigo continua sendo servido enquanto uma
+    única atualização roda em segundo plano (stale-while-revalidate); passado o
+    `ttl_maximo`, a leitura volta a ser síncrona. `ao_atualizar` é chamado quando uma
+    atualização em segundo plano traz dados diferentes.
+    """
+
+    def __init__(self, ler_aba, ttl=300, ttl_maximo=3600, ao_atualizar=None):
+        self._ler_aba = ler_aba
+        self.ttl = ttl
+        self.ttl_maximo = ttl_maximo
+        self._ao_atualizar = ao_atualizar
+        self._entradas = {}
+        self._leituras = {}
+        self._atualizando = set()
+        self._geracao = 0
+        self._contadores = Counter()
+        self._lock = threading.Lock()
+
+    def contadores(self):
+        """Cópia dos contadores: acertos, leituras, aguardaram (outra sessão já lia), vencidos_servidos,
+        falhas_atualizacao."""
+        with self._lock:
+            return {nome: self._contadores[nome]
+                    for nome in ('acertos', 'leituras', 'aguardaram', 'vencidos_servidos', 'falhas_atualizacao')}
+
+    def obter(self, titulo):
+        """Valores da aba (lista de linhas); compartilhados, não devem ser alterados."""
+        with self._lock:
+            entrada = self._entradas.get(titulo)
+            idade = time.monotonic() - entrada.lido_em if entrada else None
+            if entrada and idade < self.ttl:
+                self._contadores['acertos'] += 1
+                return entrada.valores
+            if entrada and idade < self.ttl_maximo:
+                self._contadores['vencidos_servidos'] += 1
+                if titulo not in self._atualizando:
+                    self._atualizando.add(titulo)
+                    threading.Thread(target=self._revalidar, args=(titulo, self._geracao), daemon=True).start()
+                return entrada.valores
+
+            leitura = self._leituras.get(titulo)
+            primeira = leitura is None
+            if primeira:
+                leitura = self._leituras[titulo] = _ChamadaEmAndamento()
+                geracao = self._geracao
+            else:
+                self._contadores['aguardaram'] += 1
+
+        if not primeira:
+            leitura.pronta.wait()
+            if leitura.erro is not None:
+                raise leitura.erro
+            return leitura.resultado
+
+        try:
+            leitura.resultado, _ = self._ler_e_guardar(titulo, geracao)
+            return leitura.resultado
+        except Exception as e:
+            leitura.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._leituras[titulo]
+            leitura.pronta.set()
+
+    def _ler_e_guardar(self, titulo, geracao):
+        """Lê a aba e guarda o resultado, a menos que o cache tenha sido invalidado durante a leitura."""
+        valores = self._ler_aba(titulo)
+        with self._lock:
+            self._contadores['leituras'] += 1
+            anterior = self._entradas.get(titulo)
+            if geracao == self._geracao:
+                self._entradas[titulo] = _EntradaAba(valores, time.monotonic())
+        return valores, anterior
+
+    def _revalidar(self, titulo, geracao):
+        try:
+            valores, anterior = self._ler_e_guardar(titulo, geracao)
+            if self._ao_atualizar and (anterior is None or anterior.valores != valores):
+                self._ao_atualizar()
+        except Exception:
+            # Mantém o valor antigo; a próxima leitura vencida tenta de novo
+            with self._lock:
+                self._contadores['falhas_atualizacao'] += 1
+        finally:
+            with self._lock:
+                self._atualizando.discard(titulo)
+
+    def invalidar(self, titulo=None):
+        """Descarta tudo (ex: após uma escrita) ou só a aba `titulo`; leituras em andamento não são guardadas."""
+        with self._lock:
+            if titulo is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(titulo, None)
+            self._geracao += 1
+
+
+class IndiceDePeriodos:
+    """Índice (ano, mês) de competência -> linhas de uma aba, para ler só as linhas de um mês.
+
+    O índice é montado lendo apenas as colunas de competência. Como a aba só cresce
+    no fim, as atualizações (vencido o `ttl` ou após `invalidar`) leem só a partir da
+    última linha conhecida; se ela não bate mais (linhas apagadas), o índice é refeito,
+    como também a cada `ttl_maximo`. As linhas lidas são filtradas de novo pela
+    competência: um índice defasado pode deixar de fora linhas recentes, nunca trazer
+    linhas de outro mês.
+    """
+
+    def __init__(self, abrir_aba, coluna_mes='Mes_Competencia', coluna_ano='Ano_Competencia', ttl=300,
+                 ttl_maximo=3600, folga=2):
+        self._abrir_aba = abrir_aba
+        self._colunas = (coluna_mes, coluna_ano)
+        self.ttl = ttl
+        self.ttl_maximo = ttl_maximo
+        self.folga = folga  # linhas de outros meses aceitas entre dois blocos para ler um intervalo só
+        self._cabecalho = None
+        self._faixa = self._relativas = None
+        self._posicoes = {}
+        self._ultimo = None
+        self._total = 0
+        self._montado_em = None
+        self._conferido_em = None
+        self._contadores = Counter()
+        self._lock = threading.Lock()
+
+    def contadores(self):
+        """Cópia dos contadores: montagens, atualizacoes, consultas, linhas_lidas."""
+        with self._lock:
+            return {nome: self._contadores[nome] for nome in ('montagens', 'atualizacoes', 'consultas', 'linhas_lidas')}
+
+    def invalidar(self):
+        """A próxima consulta confere as linhas incluídas no fim (ex: após uma escrita)."""
+        with self._lock:
+            self._conferido_em = None
+
+    def reconstruir(self):
+        """A próxima consulta monta o índice do zero (ex: após apagar linhas)."""
+        with self._lock:
+            self._montado_em = None
+
+    @staticmethod
+    def _periodo(mes, ano):
+        try:
+            return int(float(ano.strip())), int(float(mes.strip()))
+        except ValueError:
+            return None
+
+    def _periodo_da_linha(self, linha, colunas):
+        coluna_mes, coluna_ano = colunas
+        if max(coluna_mes, coluna_ano) >= len(linha):
+            return None
+        return self._periodo(linha[coluna_mes], linha[coluna_ano])
+
+    def _ler_competencias(self, aba, linha_inicial):
+        """Colunas de competência a partir de `linha_inicial` da planilha, até o fim da aba."""
+        primeira, ultima = self._faixa
+        return aba.batch_get([f"{_letra_coluna(primeira)}{linha_inicial}:{_letra_coluna(ultima)}"])[0]
+
+    def _indexar(self, valores, primeira_posicao):
+        for deslocamento, linha in enumerate(valores):
+            periodo = self._periodo_da_linha(linha, self._relativas)
+            if periodo is not None:
+                self._posicoes.setdefault(periodo, []).append(primeira_posicao + deslocamento)
+            self._ultimo = periodo
+        self._total = primeira_posicao + len(valores)
+
+    def _montar(self, aba):
+        self._cabecalho = [titulo.strip() for titulo in aba.row_values(1)]
+        faltando = [coluna for coluna in self._colunas if coluna not in self._cabecalho]
+        if faltando:
+            raise KeyError(f"Colunas de competência ausentes: {', '.join(faltando)}")
+        numeros = [self._cabecalho.index(coluna) + 1 for coluna in self._colunas]
+        self._faixa = (min(numeros), max(numeros))
+        self._relativas = tuple(numero - self._faixa[0] for numero in numeros)
+        self._posicoes, self._ultimo, self._total = {}, None, 0
+        self._indexar(self._ler_competencias(aba, 2), 0)
+        self._montado_em = self._conferido_em = time.monotonic()
+        self._contadores['montagens'] += 1
+
+    def _atualizar(self, aba):
+        agora = time.monotonic()
+        if self._montado_em is None or agora - self._montado_em >= self.ttl_maximo:
+            return self._montar(aba)
+        if self._conferido_em is not None and agora - self._conferido_em < self.ttl:
+            return
+        if not self._total:
+            return self._montar(aba)
+        # Relê a última linha conhecida (posição total - 1 = linha total + 1 da planilha) junto com as novas
+        valores = self._ler_competencias(aba, self._total + 1)
+        if not valores or self._periodo_da_linha(valores[0], self._relativas) != self._ultimo:
+            return self._montar(aba)
+        self._indexar(valores[1:], self._total)
+        self._conferido_em = agora
+        self._contadores['atualizacoes'] += 1
+
+    def valores_do_periodo(self, mes, ano):
+        """Cabeçalho e linhas da competência, no formato de get_all_values (uma leitura para todos os blocos)."""
+        aba = self._abrir_aba()
+        with self._lock:
+            self._atualizar(aba)
+            cabecalho = list(self._cabecalho)
+            posicoes = list(self._posicoes.get((ano, mes), []))
+            self._contadores['consultas'] += 1
+        if not posicoes:
+            return [cabecalho]
+
+        folga = self.folga
+        blocos = _agrupar_posicoes(posicoes, folga)
+        while len(blocos) > MAX_INTERVALOS_POR_LEITURA:
+            folga = folga * 2 + 1
+            blocos = _agrupar_posicoes(posicoes, folga)
+        ultima_coluna = _letra_coluna(len(cabecalho))
+        # Posição 0 é a linha 2 da planilha (a 1 é o cabeçalho)
+        partes = aba.batch_get([f"A{inicio + 2}:{ultima_coluna}{fim + 2}" for inicio, fim in blocos])
+
+        colunas = tuple(cabecalho.index(coluna) for coluna in self._colunas)
+        linhas = [linha + [''] * (len(cabecalho) - len(linha)) for parte in partes for linha in parte
+                  if self._periodo_da_linha(linha, colunas) == (ano, mes)]
+        with self._lock:
+            self._contadores['linhas_lidas'] += sum(len(parte) for parte in partes)
+        return [cabecalho] + linhas
+
+
+def _agrupar_posicoes(posicoes, folga):
+    """Posições ordenadas -> intervalos [inicio, fim], juntando os separados por até `folga` linhas."""
+    blocos = []
+    for posicao in posicoes:
+        if blocos and posicao - blocos[-1][1] <= folga + 1:
+            blocos[-1][1] = posicao
+        else:
+            blocos.append([posicao, posicao])
+    return blocos
+
+
+def _letra_coluna(numero):
+    """1 -> 'A', 27 -> 'AA'."""
+    return gspread.utils.rowcol_to_a1(1, numero)[:-1]
+
+
+def aquecer_em_paralelo(caches, titulos, max_threads=8):
+    """Lê as abas `titulos` de vários CacheDeAbas ao mesmo tempo ({chave: cache}).
+
+    A espera é de rede, então as leituras se sobrepõem (a cota continua sendo do
+    ClienteComCota). Devolve {(chave, titulo): exceção} das leituras que falharam.
+    """
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        futuros = {(chave, titulo): executor.submit(cache.obter, titulo)
+                   for chave, cache in caches.items() for titulo in titulos}
+    return {chave: futuro.exception() for chave, futuro in futuros.items() if futuro.exception() is not None}
+
+
+# Cota única do processo: todas as sessões do Streamlit usam o mesmo cliente
+CLIENTE_PADRAO = ClienteComCota(JanelaDeRequisicoes(REQUISICOES_POR_MINUTO))
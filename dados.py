@@ -0,0 +1,245 @@
+import pandas as pd
+
+import calculos
+
+# -----------------------------------------------------
+# LIMPEZA DAS ABAS (SEM STREAMLIT)
+# -----------------------------------------------------
+# Converte os valores crus de cada aba (texto, como o get_all_values devolve) em
+# DataFrames tipados. Usadas pelos loaders do app.py e pelo precalculo.py, para
+# que a carga noturna e as páginas enxerguem exatamente os mesmos dados.
+
+
+def montar_dataframe(valores):
+    """DataFrame de texto a partir dos valores crus da aba (cabeçalho primeiro, nomes sem espaços nas pontas)."""
+    if not valores:
+        return pd.DataFrame()
+
+    headers = valores[0]
+    records_data = valores[1:]
+    df = pd.DataFrame(records_data, columns=headers)
+
+    if not df.empty:
+        df.columns = df.columns.str.strip()
+    return df
+
+
+def limpar_matriculas(df):
+    """Converte IDs, datas e desconto da aba Matriculas (colunas opcionais ganham valor padrão)."""
+    if not df.empty:
+        if 'ID' in df.columns:
+            df['ID'] = pd.to_numeric(df['ID'], errors='coerce')
+        if 'Data_Inicio' in df.columns:
+            df['Data_Inicio'] = pd.to_datetime(df['Data_Inicio'], errors='coerce').dt.date
+            df['Data_Inicio'] = pd.to_datetime(df['Data_Inicio'], errors='coerce')
+
+        if 'Data_Nascimento' in df.columns:
+            df['Data_Nascimento'] = pd.to_datetime(df['Data_Nascimento'], errors='coerce').dt.date
+            df['Data_Nascimento'] = pd.to_datetime(df['Data_Nascimento'], errors='coerce')
+        else:
+            df['Data_Nascimento'] = pd.NaT
+
+        if 'Desconto_Percentual' in df.columns:
+            df['Desconto_Percentual'] = pd.to_numeric(df['Desconto_Percentual'], errors='coerce').fillna(0.0)
+        else:
+            df['Desconto_Percentual'] = 0.0
+
+        if 'Justificativa_Desconto' not in df.columns:
+            df['Justificativa_Desconto'] = ''
+
+        if 'Data_Congelamento_Inicio' in df.columns:
+            df['Data_Congelamento_Inicio'] = pd.to_datetime(df['Data_Congelamento_Inicio'], errors='coerce').dt.date
+        else:
+            df['Data_Congelamento_Inicio'] = pd.NaT
+
+        if 'Data_Primeira_Matricula' in df.columns:
+            df['Data_Primeira_Matricula'] = pd.to_datetime(df['Data_Primeira_Matricula'], errors='coerce').dt.date
+            df['Data_Primeira_Matricula'] = pd.to_datetime(df['Data_Primeira_Matricula'], errors='coerce')
+        else:
+            df['Data_Primeira_Matricula'] = pd.NaT
+
+    return df
+
+
+def limpar_planos(df):
+    """Converte preço mensal e duração da aba Planos."""
+    if not df.empty:
+        if 'Preco_Mensal' in df.columns:
+            df['Preco_Mensal'] = df['Preco_Mensal'].astype(str).str.replace('R$', '', regex=False).str.strip()
+            df['Preco_Mensal'] = df['Preco_Mensal'].str.replace(',', '.', regex=False)
+            df['Preco_Mensal'] = df['Preco_Mensal'].apply(
+                lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
+            df['Preco_Mensal'] = pd.to_numeric(df['Preco_Mensal'], errors='coerce').fillna(0.0)
+        if 'Duracao_Meses' in df.columns:
+            df['Duracao_Meses'] = pd.to_numeric(df['Duracao_Meses'], errors='coerce').fillna(0)
+    return df
+
+
+def limpar_despesas(df):
+    """Converte valores, competência e datas das linhas de Lancamentos_Despesas."""
+    if not df.empty:
+        if 'ID' in df.columns:
+            df['ID'] = pd.to_numeric(df['ID'].astype(str).str.strip(), errors='coerce').fillna(0).astype(int)
+
+        if 'Valor' in df.columns:
+            df['Valor'] = df['Valor'].astype(str).str.replace('R$', '', regex=False).str.strip()
+            df['Valor'] = df['Valor'].str.replace(',', '.', regex=False)
+            df['Valor'] = df['Valor'].apply(lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
+            df['Valor'] = pd.to_numeric(df['Valor'], errors='coerce').fillna(0.0)
+
+        if 'Mes_Competencia' in df.columns:
+            df['Mes_Competencia'] = pd.to_numeric(df['Mes_Competencia'].astype(str).str.strip(),
+                                                  errors='coerce').fillna(0).astype(int)
+        if 'Ano_Competencia' in df.columns:
+            df['Ano_Competencia'] = pd.to_numeric(df['Ano_Competencia'].astype(str).str.strip(),
+                                                  errors='coerce').fillna(0).astype(int)
+
+        if 'Valor_Pago' in df.columns:
+            df['Valor_Pago'] = df['Valor_Pago'].astype(str).str.replace('R$', '', regex=False).str.strip()
+            df['Valor_Pago'] = df['Valor_Pago'].str.replace(',', '.', regex=False)
+            df['Valor_Pago'] = df['Valor_Pago'].apply(
+                lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
+            df['Valor_Pago'] = pd.to_numeric(df['Valor_Pago'], errors='coerce').fillna(0.0)
+        else:
+            df['Valor_Pago'] = 0.0
+
+        if 'Data_Pagamento' in df.columns:
+            df['Data_Pagamento'] = pd.to_datetime(df['Data_Pagamento'], errors='coerce')
+        else:
+            df['Data_Pagamento'] = pd.NaT
+
+        if 'Data_Vencimento' in df.columns:
+            df['Data_Vencimento'] = pd.to_datetime(df['Data_Vencimento'], errors='coerce')
+        else:
+            df['Data_Vencimento'] = pd.NaT
+
+        if 'Status_Pagamento' not in df.columns:
+            df['Status_Pagamento'] = 'Pendente'
+        if 'Forma_Pagamento' not in df.columns:
+            df['Forma_Pagamento'] = ''
+        if 'Recorrente' not in df.columns:
+            df['Recorrente'] = 'Não'
+
+        if 'Ano_Competencia' in df.columns and 'Mes_Competencia' in df.columns:
+            df['Data_Competencia'] = pd.to_datetime(
+                df['Ano_Competencia'].astype(str) + '-' +
+                df['Mes_Competencia'].astype(str) + '-01',
+                format='%Y-%m-%d',
+                errors='coerce'
+            )
+    return df
+
+
+def limpar_pagamentos(df):
+    """Converte IDs, competência, datas e valores (bruto e líquido) das linhas de Pagamentos_Recebidos."""
+    if not df.empty:
+        if 'ID_Pagamento' in df.columns:
+            df['ID_Pagamento'] = pd.to_numeric(df['ID_Pagamento'], errors='coerce')
+        if 'ID_Aluno' in df.columns:
+            df['ID_Aluno'] = pd.to_numeric(df['ID_Aluno'], errors='coerce')
+        if 'Data_Pagamento' in df.columns:
+            df['Data_Pagamento'] = pd.to_datetime(df['Data_Pagamento'], errors='coerce')
+
+        if 'Mes_Competencia' in df.columns:
+            df['Mes_Competencia'] = pd.to_numeric(df['Mes_Competencia'].astype(str).str.strip(),
+                                                  errors='coerce').fillna(0).astype(int)
+        if 'Ano_Competencia' in df.columns:
+            df['Ano_Competencia'] = pd.to_numeric(df['Ano_Competencia'].astype(str).str.strip(),
+                                                  errors='coerce').fillna(0).astype(int)
+
+        # Limpeza do Valor_Pago (Bruto)
+        if 'Valor_Pago' in df.columns:
+            df['Valor_Pago'] = df['Valor_Pago'].astype(str).str.replace('R$', '', regex=False).str.strip()
+            df['Valor_Pago'] = df['Valor_Pago'].str.replace(',', '.', regex=False)
+            df['Valor_Pago'] = df['Valor_Pago'].apply(
+                lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
+            df['Valor_Pago'] = pd.to_numeric(df['Valor_Pago'], errors='coerce').fillna(0.0)
+
+        # Limpeza do Valor_Liquido
+        if 'Valor_Liquido' in df.columns:
+            df['Valor_Liquido'] = df['Valor_Liquido'].astype(str).str.replace('R$', '', regex=False).str.strip()
+            df['Valor_Liquido'] = df['Valor_Liquido'].str.replace(',', '.', regex=False)
+            df['Valor_Liquido'] = df['Valor_Liquido'].apply(
+                lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
+            df['Valor_Liquido'] = pd.to_numeric(df['Valor_Liquido'], errors='coerce')
+        else:
+            df['Valor_Liquido'] = pd.NA
+
+        # Lógica Chave: Se Valor_Liquido for Nulo ou 0, ele é igual ao Valor_Pago (Bruto).
+        df['Valor_Liquido'] = df['Valor_Liquido'].fillna(df['Valor_Pago'])
+        df['Valor_Liquido'] = df.apply(
+            lambda row: row['Valor_Pago'] if row['Valor_Liquido'] == 0 else row['Valor_Liquido'],
+            axis=1
+        )
+
+    return df
+
+
+def limpar_presencas(df):
+    """Converte IDs e data da aula das linhas de Presencas_Evolucao."""
+    if not df.empty:
+        if 'ID_Presenca' in df.columns:
+            df['ID_Presenca'] = pd.to_numeric(df['ID_Presenca'], errors='coerce')
+        if 'ID_Aluno' in df.columns:
+            df['ID_Aluno'] = pd.to_numeric(df['ID_Aluno'], errors='coerce')
+        if 'Data_Aula' in df.columns:
+            df['Data_Aula'] = pd.to_datetime(df['Data_Aula'], errors='coerce')
+    return df
+
+
+def limpar_investimentos(df):
+    """Converte ID, data e valor das movimentações de Investimentos_Caixa."""
+    if not df.empty:
+        if 'ID_Movimentacao' in df.columns:
+            df['ID_Movimentacao'] = pd.to_numeric(df['ID_Movimentacao'].astype(str).str.strip(),
+                                                  errors='coerce').fillna(0).astype(int)
+        if 'Data' in df.columns:
+            df['Data'] = pd.to_datetime(df['Data'], errors='coerce')
+
+        if 'Valor' in df.columns:
+            df['Valor'] = df['Valor'].astype(str).str.replace('R$', '', regex=False).str.strip()
+            df['Valor'] = df['Valor'].str.replace(',', '.', regex=False)
+            df['Valor'] = df['Valor'].apply(lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
+            df['Valor'] = pd.to_numeric(df['Valor'], errors='coerce').fillna(0.0)
+    return df
+
+
+def limpar_historico_renovacoes(df):
+    """Converte IDs, data de início e valor dos contratos de Historico_Renovacoes."""
+    if not df.empty:
+        df['ID_Historico'] = pd.to_numeric(df['ID_Historico'], errors='coerce')
+        df['ID_Aluno'] = pd.to_numeric(df['ID_Aluno'], errors='coerce')
+        df['Data_Inicio_Contrato'] = pd.to_datetime(df['Data_Inicio_Contrato'], errors='coerce').dt.date
+        df['Data_Inicio_Contrato'] = pd.to_datetime(df['Data_Inicio_Contrato'], errors='coerce')
+
+        if 'Valor_Contrato' in df.columns:
+            df['Valor_Contrato'] = df['Valor_Contrato'].astype(str).str.replace('R$', '', regex=False).str.strip()
+            df['Valor_Contrato'] = df['Valor_Contrato'].str.replace(',', '.', regex=False)
+            df['Valor_Contrato'] = df['Valor_Contrato'].apply(
+                lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
+            df['Valor_Contrato'] = pd.to_numeric(df['Valor_Contrato'], errors='coerce').fillna(0.0)
+    return df
+
+
+def limpar_resumo_mensal(df):
+    """Totais de Resumo_Mensal indexados por (Ano, Mes); linhas com valor ilegível ficam de fora.
+
+    Sem alguma das colunas de totais, devolve vazio (o app calcula tudo das abas de origem).
+    """
+    colunas = calculos.COLUNAS_RESUMO_MENSAL
+    if df.empty or not {'Ano', 'Mes', *colunas}.issubset(df.columns):
+        return pd.DataFrame(columns=colunas, index=pd.MultiIndex.from_tuples([], names=['Ano', 'Mes']))
+
+    df = df[['Ano', 'Mes'] + colunas].copy()
+    for coluna in ['Ano', 'Mes']:
+        df[coluna] = pd.to_numeric(df[coluna].astype(str).str.strip(), errors='coerce')
+    for coluna in colunas:
+        df[coluna] = df[coluna].astype(str).str.replace('R$', '', regex=False).str.strip()
+        df[coluna] = df[coluna].str.replace(',', '.', regex=False)
+        df[coluna] = df[coluna].apply(lambda x: x.replace('.', '', x.count('.') - 1) if x.count('.') > 1 else x)
+        df[coluna] = pd.to_numeric(df[coluna], errors='coerce')
+    df = df.dropna()
+    df['Ano'] = df['Ano'].astype(int)
+    df['Mes'] = df['Mes'].astype(int)
+    df = df.drop_duplicates(subset=['Ano', 'Mes'], keep='last').set_index(['Ano', 'Mes']).sort_index()
+    return df
@@ -0,0 +1,106 @@
+import importlib.util
+import io
+import tempfile
+
+import pandas as pd
+
+# -----------------------------------------------------
+# EXPORTAÇÃO DE RELATÓRIOS (SEM STREAMLIT)
+# -----------------------------------------------------
+# Grava um DataFrame já tipado (o mesmo dos loaders em cache) em CSV, XLSX ou
+# Parquet, em blocos de LINHAS_POR_BLOCO linhas: nenhum formato monta o arquivo
+# inteiro como texto antes de gravar. O destino é um arquivo temporário que fica
+# em memória até ARQUIVO_EM_MEMORIA bytes e depois vai para o disco.
+# O CSV sai no padrão do Excel em português (";" e vírgula decimal, UTF-8 com BOM).
+
+LINHAS_POR_BLOCO = 5000
+ARQUIVO_EM_MEMORIA = 8 * 1024 * 1024
+
+FORMATOS = {
+    'CSV': ('csv', 'text/csv'),
+    'Excel (XLSX)': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def formatos_disponiveis():
+    """Formatos que dá para gerar aqui (XLSX depende do openpyxl e Parquet do pyarrow, ambos opcionais)."""
+    dependencias = {'Excel (XLSX)': 'openpyxl', 'Parquet': 'pyarrow'}
+    return [formato for formato in FORMATOS
+            if formato not in dependencias or importlib.util.find_spec(dependencias[formato]) is not None]
+
+
+def _blocos(df):
+    for inicio in range(0, len(df), LINHAS_POR_BLOCO):
+        yield inicio, df.iloc[inicio:inicio + LINHAS_POR_BLOCO]
+
+
+def _gravar_csv(df, destino):
+    texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+    if df.empty:
+        df.to_csv(texto, index=False, sep=';', decimal=',')
+    for inicio, bloco in _blocos(df):
+        bloco.to_csv(texto, header=inicio == 0, index=False, sep=';', decimal=',', date_format='%d/%m/%Y')
+    texto.flush()
+    texto.detach()
+
+
+def _valor_celula(valor):
+    """Valor aceito pelo openpyxl (sem NaN/NaT e sem tipos do numpy/pandas)."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.to_pydatetime()
+    return valor.item() if hasattr(valor, 'item') else valor
+
+
+def _gravar_xlsx(df, destino, nome_aba):
+    from openpyxl import Workbook
+
+    # write_only grava as linhas direto no arquivo, sem manter a planilha inteira em memória
+    livro = Workbook(write_only=True)
+    aba = livro.create_sheet(nome_aba[:31])
+    aba.append([str(coluna) for coluna in df.columns])
+    for _, bloco in _blocos(df):
+        for linha in bloco.itertuples(index=False, name=None):
+            aba.append([_valor_celula(valor) for valor in linha])
+    livro.save(destino)
+
+
+def _gravar_parquet(df, destino):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        for _, bloco in _blocos(df):
+            escritor.write_table(pa.Table.from_pandas(bloco, schema=esquema, preserve_index=False))
+        if df.empty:
+            escritor.write_table(pa.Table.from_pandas(df, schema=esquema, preserve_index=False))
+
+
+def exportar(df, formato, nome_aba="Dados"):
+    """Grava `df` no formato escolhido e devolve o arquivo (posicionado no início)."""
+    destino = tempfile.SpooledTemporaryFile(max_size=ARQUIVO_EM_MEMORIA)
+    if formato == 'CSV':
+        _gravar_csv(df, destino)
+    elif formato == 'Excel (XLSX)':
+        _gravar_xlsx(df, destino, nome_aba)
+    elif formato == 'Parquet':
+        _gravar_parquet(df, destino)
+    else:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+    destino.seek(0)
+    return destino
+
+
+def filtrar_competencias(df, inicio, fim):
+    """Linhas com competência (Ano_Competencia/Mes_Competencia) entre os meses de `inicio` e `fim`, em ordem.
+
+    Ordena porque a aba principal e as abas arquivadas chegam concatenadas fora da sequência.
+    """
+    if df.empty or 'Ano_Competencia' not in df.columns or 'Mes_Competencia' not in df.columns:
+        return df
+    competencia = df['Ano_Competencia'] * 12 + df['Mes_Competencia']
+    no_periodo = competencia.between(inicio.year * 12 + inicio.month, fim.year * 12 + fim.month)
+    return df[no_periodo].iloc[competencia[no_periodo].argsort(kind='stable')]
@@ -0,0 +1,228 @@
+import argparse
+import copy
+import os
+import pickle
+import sys
+import tomllib
+from datetime import datetime, timedelta
+
+import gspread
+import pandas as pd
+
+import arquivamento
+import calculos
+import conexao_sheets
+import dados
+import resumo_mensal
+
+# -----------------------------------------------------
+# PRÉ-CÁLCULO NOTURNO (SEM STREAMLIT)
+# -----------------------------------------------------
+# Uso: python precalculo.py [--estudio ID] [--arquivar] [--validade-horas 8]
+# Lê cada aba uma vez, calcula o que as primeiras páginas do dia pedem (fluxo e
+# inadimplência do mês, projeção anual, vencimentos de planos, aniversários e saldos
+# dos investimentos) e grava um snapshot local por estúdio (precalculado/<id>.pkl).
+# Também reconstrói a aba Resumo_Mensal com todo o histórico (inclusive os anos
+# arquivados), o que traz para ela as edições feitas direto na planilha.
+# O app serve esses resultados no lugar dos loaders até o snapshot vencer ou até a
+# primeira escrita / atualização de dados do estúdio, que o descarta. Alterações
+# feitas direto na planilha só aparecem quando ele vence (ou no "Forçar Atualização").
+# Agendamento (cron, 3h): 0 3 * * * cd /caminho/do/app && python precalculo.py --arquivar
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_PADRAO = os.path.join(RAIZ, "precalculado")
+SECRETS_PADRAO = os.path.join(RAIZ, ".streamlit", "secrets.toml")
+CAMINHO_CDI = os.path.join(RAIZ, "cdi_historico.csv")
+VALIDADE_HORAS = 8
+
+
+def _caminho(diretorio, estudio, extensao):
+    return os.path.join(diretorio, f"{estudio}.{extensao}")
+
+
+def gravar_snapshot(diretorio, estudio, resultados, lido_em, valido_ate):
+    """Grava os resultados do estúdio (arquivo temporário + troca atômica: o app nunca lê um arquivo pela metade)."""
+    os.makedirs(diretorio, exist_ok=True)
+    destino = _caminho(diretorio, estudio, "pkl")
+    with open(destino + ".tmp", "wb") as arquivo:
+        pickle.dump({'lido_em': lido_em, 'valido_ate': valido_ate, 'resultados': resultados}, arquivo)
+    os.replace(destino + ".tmp", destino)
+
+
+def ler_snapshot(diretorio, estudio, agora):
+    """Resultados do snapshot do estúdio; {} se não houver, se venceu ou se foi descartado depois da leitura."""
+    try:
+        with open(_caminho(diretorio, estudio, "pkl"), "rb") as arquivo:
+            snapshot = pickle.load(arquivo)
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        # Arquivo corrompido ou de outra versão: o app calcula normalmente
+        return {}
+    if agora >= snapshot['valido_ate']:
+        return {}
+    # Uma escrita entre a leitura das abas e a gravação do snapshot também o invalida
+    try:
+        descartado_em = datetime.fromtimestamp(os.path.getmtime(_caminho(diretorio, estudio, "descartado")))
+        if descartado_em >= snapshot['lido_em']:
+            return {}
+    except FileNotFoundError:
+        pass
+    return snapshot['resultados']
+
+
+def descartar_snapshot(diretorio, estudio):
+    """Apaga o snapshot do estúdio e marca a hora (ver ler_snapshot); chamado a cada escrita/atualização."""
+    try:
+        os.remove(_caminho(diretorio, estudio, "pkl"))
+    except FileNotFoundError:
+        pass
+    try:
+        with open(_caminho(diretorio, estudio, "descartado"), "w"):
+            pass
+    except FileNotFoundError:
+        # Sem diretório, não há snapshot para invalidar
+        pass
+
+
+def resultado(snapshot, nome, *args):
+    """Cópia do resultado do loader `nome` com estes argumentos, ou None se não foi pré-calculado."""
+    valor = snapshot.get((nome,) + args)
+    return copy.deepcopy(valor) if valor is not None else None
+
+
+def calcular(ler_aba, data_referencia, serie_cdi):
+    """Resultados do dia com as chaves (nome do loader do app.py, argumentos) que o app consulta.
+
+    `ler_aba(titulo)` devolve os valores crus da aba. O mês e o ano correntes nunca são
+    arquivados, então as abas principais bastam.
+    """
+    def aba(titulo, limpar):
+        return limpar(dados.montar_dataframe(ler_aba(titulo)))
+
+    df_matriculas = aba("Matriculas", dados.limpar_matriculas)
+    df_planos = aba("Planos", dados.limpar_planos)
+    df_pagamentos = aba("Pagamentos_Recebidos", dados.limpar_pagamentos)
+    df_despesas = aba("Lancamentos_Despesas", dados.limpar_despesas)
+    df_investimentos = aba("Investimentos_Caixa", dados.limpar_investimentos)
+
+    mes, ano = data_referencia.month, data_referencia.year
+
+    def do_mes(df):
+        if df.empty:
+            return df
+        return df[(df['Mes_Competencia'] == mes) & (df['Ano_Competencia'] == ano)].reset_index(drop=True)
+
+    df_contratos = calculos.montar_contratos_ativos(df_matriculas, df_planos)
+    fluxo_mes = calculos.resumir_fluxo_mes(df_contratos, do_mes(df_pagamentos), do_mes(df_despesas), mes, ano)
+    resultados = {
+        ('load_fluxo_mes', mes, ano): fluxo_mes,
+        ('load_projecao_anual', mes, ano): calculos.projetar_fluxo_anual(df_contratos, df_despesas,
+                                                                         datetime(ano, mes, 1)),
+        ('load_indice_comemoracoes',): calculos.indexar_comemoracoes(df_matriculas),
+        ('load_saldos_investimentos', data_referencia): calculos.acumular_investimentos(df_investimentos, serie_cdi,
+                                                                                         data_referencia),
+    }
+    if not fluxo_mes['receita'].empty:
+        resultados[('load_status_pagamentos', mes, ano)] = calculos.status_pagamentos_alunos(
+            fluxo_mes['receita'], fluxo_mes['pagamentos'])
+    if not df_matriculas.empty and 'Status' in df_matriculas.columns and 'Duracao_Meses' in df_planos.columns:
+        resultados[('load_vencimentos', data_referencia)] = calculos.separar_vencimentos(df_matriculas, df_planos,
+                                                                                         data_referencia)
+    return resultados
+
+
+def resumir_historico(ler_aba, data_referencia):
+    """Resumo_Mensal completo: do primeiro mês com lançamento até 12 meses após a referência.
+
+    Pagamentos e despesas somam a aba principal e as abas arquivadas listadas em
+    Arquivo_Historico (lido por `ler_aba`, sem criar a aba quando ela não existe).
+    """
+    indice = dados.montar_dataframe(ler_aba(arquivamento.ABA_INDICE))
+
+    def historico(titulo, limpar):
+        abas = [titulo]
+        if not indice.empty and {'Aba', 'Aba_Arquivo'}.issubset(indice.columns):
+            abas += indice.loc[indice['Aba'] == titulo, 'Aba_Arquivo'].tolist()
+        partes = [limpar(dados.montar_dataframe(ler_aba(aba))) for aba in abas]
+        partes = [df for df in partes if not df.empty]
+        return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+    df_matriculas = dados.limpar_matriculas(dados.montar_dataframe(ler_aba("Matriculas")))
+    df_planos = dados.limpar_planos(dados.montar_dataframe(ler_aba("Planos")))
+    df_contratos = calculos.montar_contratos_ativos(df_matriculas, df_planos)
+    df_pagamentos = historico("Pagamentos_Recebidos", dados.limpar_pagamentos)
+    df_despesas = historico("Lancamentos_Despesas", dados.limpar_despesas)
+    meses = calculos.meses_do_resumo(df_contratos, df_pagamentos, df_despesas, data_referencia)
+    return calculos.resumir_meses(meses, df_contratos, df_pagamentos, df_despesas)
+
+
+def precalcular_estudio(planilha, estudio, diretorio, agora, validade, arquivar=False, resumo=True):
+    """Arquiva os anos fechados (opcional), calcula os resultados do dia e grava o snapshot; devolve os resultados.
+
+    Com `resumo`, também reconstrói a aba Resumo_Mensal.
+    """
+    if arquivar:
+        arquivamento.arquivar_anos_fechados(planilha, agora=agora)
+
+    lidas = {}
+
+    def ler_aba(titulo):
+        # Cada aba é lida uma vez; como no app, aba que falta (ex: Investimentos_Caixa ainda não criada) conta
+        # como vazia
+        if titulo not in lidas:
+            try:
+                lidas[titulo] = planilha.worksheet(titulo).get_all_values()
+            except gspread.exceptions.WorksheetNotFound:
+                lidas[titulo] = []
+        return lidas[titulo]
+
+    resultados = calcular(ler_aba, agora.date(), calculos.carregar_historico_cdi(CAMINHO_CDI))
+    gravar_snapshot(diretorio, estudio, resultados, lido_em=agora, valido_ate=agora + validade)
+    if resumo:
+        # Sob a trava do app, e relendo as abas: um lançamento gravado desde a leitura acima entra no resumo
+        with arquivamento.travar(planilha, espera=arquivamento.ESPERA_ESCRITAS):
+            lidas.clear()
+            resumo_mensal.reconstruir(planilha, resumir_historico(ler_aba, agora.date()), agora)
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-calcula os resultados do dia e grava um snapshot por estúdio.")
+    parser.add_argument("--secrets", default=SECRETS_PADRAO, help="secrets.toml do app (conta de serviço e estúdios)")
+    parser.add_argument("--estudio", action="append", help="ID do estúdio (pode repetir); padrão: todos")
+    parser.add_argument("--destino", default=DIRETORIO_PADRAO, help="diretório dos snapshots")
+    parser.add_argument("--validade-horas", type=float, default=VALIDADE_HORAS)
+    parser.add_argument("--arquivar", action="store_true",
+                        help="antes, arquiva os anos fechados (como o botão da barra lateral)")
+    parser.add_argument("--sem-resumo", action="store_true", help="não reconstrói a aba Resumo_Mensal")
+    args = parser.parse_args(argv)
+
+    with open(args.secrets, "rb") as arquivo:
+        secrets = tomllib.load(arquivo)
+    estudios = conexao_sheets.estudios_configurados(secrets.get("estudios", {}))
+    ids = args.estudio or list(estudios)
+    desconhecidos = [id_estudio for id_estudio in ids if id_estudio not in estudios]
+    if desconhecidos:
+        parser.error(f"estúdio(s) desconhecido(s): {', '.join(desconhecidos)}")
+
+    cliente = conexao_sheets.conectar_gspread(secrets["gcp_service_account"])
+    falhas = 0
+    for id_estudio in ids:
+        agora = datetime.now()
+        try:
+            planilha = conexao_sheets.PlanilhaComCota(cliente.open(estudios[id_estudio]["planilha"]),
+                                                      conexao_sheets.CLIENTE_PADRAO)
+            resultados = precalcular_estudio(planilha, id_estudio, args.destino, agora,
+                                             timedelta(hours=args.validade_horas), args.arquivar,
+                                             resumo=not args.sem_resumo)
+            print(f"{id_estudio}: {len(resultados)} resultado(s) em {datetime.now() - agora}, "
+                  f"válido(s) até {agora + timedelta(hours=args.validade_horas):%d/%m %H:%M}")
+        except Exception as e:
+            falhas += 1
+            print(f"{id_estudio}: erro - {e}", file=sys.stderr)
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
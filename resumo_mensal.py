@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import gspread
+
+import calculos
+import conexao_sheets
+
+# -----------------------------------------------------
+# RESUMO MENSAL MATERIALIZADO (SEM STREAMLIT)
+# -----------------------------------------------------
+# A aba Resumo_Mensal guarda uma linha por mês de competência com os totais do
+# dashboard: receita prevista e descontos (contratos ativos), receita bruta e
+# líquida, taxas, gastos previstos e pagos. O Financeiro lê só essa aba pequena
+# para os cartões e a projeção anual. Cada escrita do app regrava apenas os meses
+# (e as colunas) que mudou; a carga noturna (precalculo.py) e o botão da barra
+# lateral a refazem inteira, a partir de todo o histórico. Mês sem linha na aba é
+# calculado das abas de origem, como antes.
+# Quem recalcula e grava (app e precalculo.py) o faz sob arquivamento.travar(planilha):
+# uma reconstrução não sobrescreve com totais antigos um mês gravado depois da leitura
+# dela, e ninguém grava por número de linha enquanto a aba é reescrita.
+
+ABA_RESUMO = "Resumo_Mensal"
+CABECALHO_RESUMO = ["Ano", "Mes"] + calculos.COLUNAS_RESUMO_MENSAL + ["Atualizado_Em"]
+
+
+def _valor(numero):
+    return str(round(float(numero), 2))
+
+
+def _linha(ano, mes, totais, carimbo):
+    return [str(ano), str(mes)] + [_valor(totais[coluna]) for coluna in calculos.COLUNAS_RESUMO_MENSAL] + [carimbo]
+
+
+def reconstruir(planilha, df_resumo, agora=None):
+    """Reescreve a aba (criada se faltar) com todas as linhas de `df_resumo`; devolve quantos meses gravou.
+
+    `df_resumo` vem de calculos.resumir_meses com pagamentos e despesas (todas as colunas).
+    A tabela é regravada no lugar, numa escrita só (sem limpar antes: uma falha no meio
+    não deixa a aba vazia), e as linhas que sobrarem abaixo dela são apagadas.
+    """
+    carimbo = (agora or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+    aba = conexao_sheets.abrir_ou_criar_aba(planilha, ABA_RESUMO, CABECALHO_RESUMO)
+    linhas = [CABECALHO_RESUMO] + [_linha(ano, mes, totais, carimbo) for (ano, mes), totais in df_resumo.iterrows()]
+    linhas_antes = len(aba.col_values(1))
+    aba.update(values=linhas, range_name='A1', value_input_option='USER_ENTERED')
+    if linhas_antes > len(linhas):
+        aba.delete_rows(len(linhas) + 1, linhas_antes)
+    return len(linhas) - 1
+
+
+def gravar_meses(planilha, df_resumo, agora=None):
+    """Atualiza na aba só os meses e as colunas presentes em `df_resumo` (NaN = célula mantida).
+
+    Mês que ainda não tem linha só é acrescentado se vier com todas as colunas; os
+    demais ficam para a próxima reconstrução. Devolve quantos meses foram gravados.
+    """
+    carimbo = (agora or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+    aba = planilha.worksheet(ABA_RESUMO)
+    valores = aba.get_all_values()
+    cabecalho = [titulo.strip() for titulo in valores[0]] if valores else []
+    if 'Ano' not in cabecalho or 'Mes' not in cabecalho:
+        return 0
+    posicao_ano, posicao_mes = cabecalho.index('Ano'), cabecalho.index('Mes')
+
+    linhas = {}
+    for numero, linha in enumerate(valores[1:], start=2):
+        try:
+            linhas[(int(linha[posicao_ano]), int(linha[posicao_mes]))] = numero
+        except (ValueError, IndexError):
+            continue
+
+    celulas, novas = [], []
+    for (ano, mes), totais in df_resumo.iterrows():
+        totais = totais.dropna()
+        numero = linhas.get((ano, mes))
+        if numero is None:
+            if len(totais) == len(calculos.COLUNAS_RESUMO_MENSAL) and cabecalho == CABECALHO_RESUMO:
+                novas.append(_linha(ano, mes, totais, carimbo))
+            continue
+        for coluna, valor in totais.items():
+            if coluna in cabecalho:
+                celulas.append(gspread.Cell(numero, cabecalho.index(coluna) + 1, _valor(valor)))
+        if 'Atualizado_Em' in cabecalho:
+            celulas.append(gspread.Cell(numero, cabecalho.index('Atualizado_Em') + 1, carimbo))
+
+    if celulas:
+        aba.update_cells(celulas, value_input_option='USER_ENTERED')
+    if novas:
+        aba.append_rows(novas, value_input_option='USER_ENTERED')
+    return len({celula.row for celula in celulas}) + len(novas)
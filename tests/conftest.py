@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Módulos do app na raiz; a planilha em memória fica em benchmarks/
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for caminho in (RAIZ, os.path.join(RAIZ, "benchmarks")):
+    if caminho not in sys.path:
+        sys.path.insert(0, caminho)
@@ -0,0 +1,61 @@
+import pytest
+
+import arquivamento
+from sheets_memoria import PlanilhaMemoria
+
+CABECALHO = ["ID_Pagamento", "ID_Aluno", "Nome_Aluno", "Data_Pagamento", "Mes_Competencia", "Ano_Competencia",
+             "Valor_Pago", "Forma_Pagamento", "Notas", "Valor_Liquido"]
+
+
+def _pagamento(id_pagamento, ano):
+    return [str(id_pagamento), "1", "Ana", f"{ano}-01-10", "1", str(ano), "100", "PIX", "", "100"]
+
+
+def _planilha(linhas):
+    return PlanilhaMemoria({"Pagamentos_Recebidos": [CABECALHO] + linhas})
+
+
+def _ids(planilha, titulo="Pagamentos_Recebidos"):
+    return [linha[0] for linha in planilha.abas[titulo].linhas[1:]]
+
+
+def test_move_os_anos_fechados_para_a_aba_do_ano():
+    planilha = _planilha([_pagamento(1, 2023), _pagamento(2, 2025), _pagamento(3, 2023), _pagamento(4, 2026)])
+    movidas = arquivamento.arquivar_anos_fechados(planilha, 2025, abas=("Pagamentos_Recebidos",))
+    assert movidas == {("Pagamentos_Recebidos", 2023): 2}
+    assert _ids(planilha) == ["2", "4"]
+    assert _ids(planilha, "Pagamentos_Recebidos_2023") == ["1", "3"]
+
+
+def test_apaga_pelo_id_mesmo_se_a_aba_mudou_depois_da_leitura():
+    planilha = _planilha([_pagamento(1, 2023), _pagamento(2, 2025), _pagamento(3, 2023), _pagamento(4, 2026)])
+    aba = planilha.abas["Pagamentos_Recebidos"]
+    leitura_original = aba.get_all_values
+
+    def ler_e_mudar_a_aba():
+        valores = leitura_original()
+        # Outra escrita tira uma linha do topo depois da leitura: as posições lidas deixam de valer
+        del aba.linhas[1]
+        return valores
+
+    aba.get_all_values = ler_e_mudar_a_aba
+    arquivamento.arquivar_anos_fechados(planilha, 2025, abas=("Pagamentos_Recebidos",))
+    assert _ids(planilha) == ["2", "4"]
+
+
+def test_linha_sem_id_ou_com_id_repetido_fica_na_aba_principal():
+    sem_id = _pagamento("", 2023)
+    planilha = _planilha([sem_id, _pagamento(5, 2023), _pagamento(5, 2026), _pagamento(6, 2023)])
+    arquivamento.arquivar_anos_fechados(planilha, 2025, abas=("Pagamentos_Recebidos",))
+    assert _ids(planilha) == ["", "5", "5"]
+    assert _ids(planilha, "Pagamentos_Recebidos_2023") == ["6"]
+
+
+def test_um_arquivamento_por_vez():
+    planilha = _planilha([_pagamento(1, 2023)])
+    with arquivamento.travar(planilha):
+        with pytest.raises(RuntimeError):
+            arquivamento.arquivar_anos_fechados(planilha, 2025, abas=("Pagamentos_Recebidos",))
+    assert _ids(planilha) == ["1"]
+    arquivamento.arquivar_anos_fechados(planilha, 2025, abas=("Pagamentos_Recebidos",))
+    assert _ids(planilha) == []
@@ -0,0 +1,57 @@
+import pandas as pd
+
+import calculos
+
+
+def _matriculas(linhas):
+    return pd.DataFrame(linhas, columns=["ID", "Nome", "Status", "Data_Nascimento", "Data_Primeira_Matricula"])
+
+
+def test_comemoracoes_do_periodo_em_ordem_de_data_e_nome():
+    df = _matriculas([
+        (1, "Carla", "Ativa", "1990-03-10", "2022-03-11"),
+        (2, "Ana", "Ativa", "1985-03-10", "2023-05-01"),
+        (3, "Bruno", "Inativa", "1990-03-10", "2021-03-10"),
+        (4, "Davi", "Ativa", "2000-03-09", ""),
+    ])
+    indice = calculos.indexar_comemoracoes(df)
+    vida = calculos.comemoracoes_no_periodo(indice, 'vida', "2025-03-09", "2025-03-10")
+    assert vida['Nome'].tolist() == ["Davi", "Ana", "Carla"]
+    assert vida['Anos'].tolist() == [25, 40, 35]
+    studio = calculos.comemoracoes_no_periodo(indice, 'studio', "2025-03-01", "2025-03-31")
+    assert studio[['ID', 'Anos']].values.tolist() == [[1, 3]]
+
+
+def test_nascido_em_29_de_fevereiro_comemora_dia_28_em_ano_nao_bissexto():
+    indice = calculos.indexar_comemoracoes(_matriculas([(1, "Ana", "Ativa", "2000-02-29", "")]))
+    assert calculos.comemoracoes_no_periodo(indice, 'vida', "2025-02-28", "2025-02-28")['ID'].tolist() == [1]
+    assert calculos.comemoracoes_no_periodo(indice, 'vida', "2024-02-28", "2024-02-28").empty
+    assert calculos.comemoracoes_no_periodo(indice, 'vida', "2024-02-20", "2024-03-05")['Anos'].tolist() == [24]
+
+
+def _presencas(linhas):
+    df = pd.DataFrame(linhas, columns=["ID_Presenca", "ID_Aluno", "Data_Aula"])
+    df['Data_Aula'] = pd.to_datetime(df['Data_Aula'])
+    return df
+
+
+def _mensal(agregados):
+    return {(id_aluno, mes.month): total for (id_aluno, mes), total in agregados['mensal'].items()}
+
+
+def test_agregar_presencas_soma_so_as_linhas_novas():
+    linhas = [(1, 10, "2025-01-06"), (2, 10, "2025-01-08"), (3, 11, "2025-01-09")]
+    agregados = calculos.agregar_presencas(_presencas(linhas))
+    incremental = calculos.agregar_presencas(_presencas(linhas + [(4, 11, "2025-02-03")]), agregados)
+    assert _mensal(incremental) == {(10, 1): 2, (11, 1): 1, (11, 2): 1}
+    assert incremental['max_id'] == 4
+
+
+def test_agregar_presencas_reagrupa_se_uma_linha_antiga_foi_editada():
+    linhas = [(1, 10, "2025-01-06"), (2, 10, "2025-01-08"), (3, 11, "2025-01-09")]
+    agregados = calculos.agregar_presencas(_presencas(linhas))
+    # ID_Aluno da linha 2 corrigido direto na planilha, e uma presença nova no fim
+    editadas = [(1, 10, "2025-01-06"), (2, 11, "2025-01-08"), (3, 11, "2025-01-09"), (4, 11, "2025-01-10")]
+    incremental = calculos.agregar_presencas(_presencas(editadas), agregados)
+    assert _mensal(incremental) == _mensal(calculos.agregar_presencas(_presencas(editadas)))
+    assert _mensal(incremental) == {(10, 1): 1, (11, 1): 3}
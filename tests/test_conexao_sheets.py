@@ -0,0 +1,176 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import gspread
+import pytest
+
+import conexao_sheets
+from sheets_memoria import PlanilhaMemoria
+
+CABECALHO = ["ID", "Nome"]
+
+
+def _cliente_sem_limite():
+    return conexao_sheets.ClienteComCota(conexao_sheets.BaldeDeTokens(float('inf'), 1))
+
+
+def _estudio(nome):
+    # Latência para as leituras dos dois estúdios se sobreporem no cliente compartilhado
+    return PlanilhaMemoria({"Matriculas": [CABECALHO, ["1", nome]]}, latencia=0.2)
+
+
+def test_estudios_lendo_a_mesma_aba_ao_mesmo_tempo_nao_trocam_dados():
+    cliente = _cliente_sem_limite()
+    centro, sul = _estudio("Ana (Centro)"), _estudio("Bia (Sul)")
+    planilhas = {"centro": conexao_sheets.PlanilhaComCota(centro, cliente),
+                 "sul": conexao_sheets.PlanilhaComCota(sul, cliente)}
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futuros = {id_estudio: executor.submit(lambda p: p.worksheet("Matriculas").get_all_values(), planilha)
+                   for id_estudio, planilha in planilhas.items()}
+    assert futuros["centro"].result()[1][1] == "Ana (Centro)"
+    assert futuros["sul"].result()[1][1] == "Bia (Sul)"
+
+    # A aba guardada de cada estúdio é a da própria planilha: escritas não vão para a outra
+    planilhas["sul"].worksheet("Matriculas").append_row(["2", "Carla (Sul)"])
+    assert sul.abas["Matriculas"].linhas[-1] == ["2", "Carla (Sul)"]
+    assert len(centro.abas["Matriculas"].linhas) == 2
+
+
+def test_leituras_iguais_da_mesma_planilha_continuam_coalescidas():
+    cliente = _cliente_sem_limite()
+    memoria = _estudio("Ana (Centro)")
+    planilha = conexao_sheets.PlanilhaComCota(memoria, cliente)
+    aba = planilha.worksheet("Matriculas")
+    memoria.zerar_contadores()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        resultados = list(executor.map(lambda _: aba.get_all_values(), range(4)))
+    assert all(resultado == resultados[0] for resultado in resultados)
+    assert memoria.contadores()['get_all_values'] == 1
+
+
+def _aba_com_cota():
+    cliente = conexao_sheets.ClienteComCota(conexao_sheets.BaldeDeTokens(float('inf'), 1), espera_base=0.01)
+    memoria = PlanilhaMemoria({"Matriculas": [CABECALHO, ["1", "Ana"]]})
+    aba = conexao_sheets.PlanilhaComCota(memoria, cliente).worksheet("Matriculas")
+    memoria.zerar_contadores()
+    return memoria, aba
+
+
+def test_leitura_e_repetida_em_erro_do_servidor():
+    memoria, aba = _aba_com_cota()
+    memoria.falhar_proximas(2, 503)
+    assert aba.get_all_values()[1] == ["1", "Ana"]
+    assert memoria.contadores()['get_all_values'] == 3
+
+
+def test_escrita_nao_e_repetida_em_erro_do_servidor():
+    memoria, aba = _aba_com_cota()
+    memoria.falhar_proximas(1, 503)
+    with pytest.raises(gspread.exceptions.APIError):
+        aba.append_row(["2", "Bia"])
+    assert memoria.contadores()['append_row'] == 1
+
+
+def test_escrita_recusada_por_cota_e_repetida():
+    memoria, aba = _aba_com_cota()
+    memoria.falhar_proximas(1, 429)
+    aba.append_row(["2", "Bia"])
+    assert memoria.contadores()['append_row'] == 2
+    assert memoria.abas["Matriculas"].linhas[1:] == [["1", "Ana"], ["2", "Bia"]]
+
+
+def test_janela_de_cota_nao_passa_do_limite_em_nenhuma_janela():
+    janela = conexao_sheets.JanelaDeRequisicoes(5, segundos=0.5)
+    horarios = []
+    for _ in range(12):
+        janela.consumir()
+        horarios.append(time.monotonic())
+    # Qualquer sequência de 6 requisições seguidas ocupa mais que uma janela inteira
+    assert all(horarios[i + 5] - horarios[i] >= 0.5 for i in range(len(horarios) - 5))
+    assert horarios[4] - horarios[0] < 0.1
+
+
+# -----------------------------------------------------
+# ÍNDICE DE PERÍODOS
+# -----------------------------------------------------
+CABECALHO_PAGAMENTOS = ["ID_Pagamento", "Nome_Aluno", "Mes_Competencia", "Ano_Competencia", "Valor_Pago"]
+
+
+def _pagamentos(competencias, primeiro_id=1):
+    return [[str(id_pagamento), f"Aluno {id_pagamento}", str(mes), str(ano), "100"]
+            for id_pagamento, (mes, ano) in enumerate(competencias, start=primeiro_id)]
+
+
+def _indice(competencias, **kwargs):
+    planilha = PlanilhaMemoria({"Pagamentos_Recebidos": [CABECALHO_PAGAMENTOS] + _pagamentos(competencias)})
+    aba = planilha.abas["Pagamentos_Recebidos"]
+    return aba, conexao_sheets.IndiceDePeriodos(lambda: aba, **kwargs)
+
+
+def _ids(valores):
+    return [linha[0] for linha in valores[1:]]
+
+
+def test_indice_de_periodos_le_so_as_linhas_do_mes():
+    aba, indice = _indice([(1, 2025), (2, 2025), (1, 2025), (3, 2025)])
+    valores = indice.valores_do_periodo(1, 2025)
+    assert valores[0] == CABECALHO_PAGAMENTOS
+    assert _ids(valores) == ["1", "3"]
+    assert _ids(indice.valores_do_periodo(4, 2025)) == []
+
+
+def test_indice_de_periodos_pega_linhas_incluidas_no_fim_depois_de_invalidar():
+    aba, indice = _indice([(1, 2025), (2, 2025)])
+    assert _ids(indice.valores_do_periodo(2, 2025)) == ["2"]
+
+    aba.append_rows(_pagamentos([(2, 2025), (3, 2025)], primeiro_id=3))
+    # Dentro do ttl, sem invalidar, o índice ainda não conhece as linhas novas
+    assert _ids(indice.valores_do_periodo(2, 2025)) == ["2"]
+    indice.invalidar()
+    assert _ids(indice.valores_do_periodo(2, 2025)) == ["2", "3"]
+    assert _ids(indice.valores_do_periodo(3, 2025)) == ["4"]
+    assert indice.contadores()['montagens'] == 1
+    assert indice.contadores()['atualizacoes'] == 1
+
+
+def test_indice_de_periodos_e_refeito_quando_a_ultima_linha_conhecida_mudou():
+    aba, indice = _indice([(1, 2025), (2, 2025), (3, 2025)])
+    assert _ids(indice.valores_do_periodo(3, 2025)) == ["3"]
+
+    # Linhas apagadas: a última linha conhecida passa a ser de outro mês
+    aba.delete_rows(2, 3)
+    aba.append_rows(_pagamentos([(1, 2025)], primeiro_id=4))
+    indice.invalidar()
+    assert _ids(indice.valores_do_periodo(3, 2025)) == ["3"]
+    assert _ids(indice.valores_do_periodo(1, 2025)) == ["4"]
+    assert indice.contadores()['montagens'] == 2
+
+
+def test_indice_de_periodos_junta_blocos_ate_o_limite_de_intervalos(monkeypatch):
+    # Meses alternados: sem folga, cada linha do mês 1 seria um intervalo
+    aba, indice = _indice([(1, 2025), (2, 2025), (3, 2025), (4, 2025)] * 10, folga=0)
+    monkeypatch.setattr(conexao_sheets, "MAX_INTERVALOS_POR_LEITURA", 3)
+    leituras = []
+    batch_get = aba.batch_get
+
+    def espiar(intervalos, **kwargs):
+        leituras.append(list(intervalos))
+        return batch_get(intervalos, **kwargs)
+
+    indice.valores_do_periodo(2, 2025)  # monta o índice
+    monkeypatch.setattr(aba, "batch_get", espiar)
+    valores = indice.valores_do_periodo(1, 2025)
+    assert len(leituras) == 1 and len(leituras[0]) <= 3
+    assert _ids(valores) == [str(id_pagamento) for id_pagamento in range(1, 41, 4)]
+
+
+def test_indice_de_periodos_defasado_nao_traz_linhas_de_outro_mes():
+    aba, indice = _indice([(1, 2025), (2, 2025), (1, 2025), (2, 2025)])
+    assert _ids(indice.valores_do_periodo(1, 2025)) == ["1", "3"]
+
+    # Linha apagada direto na planilha, sem invalidar: as posições do índice ficam deslocadas
+    del aba.linhas[1]
+    assert _ids(indice.valores_do_periodo(1, 2025)) == ["3"]
+    assert _ids(indice.valores_do_periodo(2, 2025)) == ["4"]
@@ -0,0 +1,77 @@
+from datetime import datetime
+from unittest import mock
+
+import gspread
+import numpy as np
+import pandas as pd
+import pytest
+
+import resumo_mensal
+from sheets_memoria import AbaMemoria, PlanilhaMemoria, erro_api
+
+AGORA = datetime(2025, 3, 1, 3, 0)
+COLUNAS = resumo_mensal.CABECALHO_RESUMO[2:-1]
+
+
+def _resumo(meses):
+    """{(ano, mes): [valor de cada coluna]} -> DataFrame no formato de calculos.resumir_meses."""
+    indice = pd.MultiIndex.from_tuples(list(meses), names=['Ano', 'Mes'])
+    return pd.DataFrame(list(meses.values()), index=indice, columns=COLUNAS, dtype=float)
+
+
+def _linha(ano, mes, valor, carimbo="2025-01-01 00:00:00"):
+    return [str(ano), str(mes)] + [str(float(valor))] * len(COLUNAS) + [carimbo]
+
+
+def _aba(planilha):
+    return planilha.abas[resumo_mensal.ABA_RESUMO].linhas
+
+
+def test_reconstruir_grava_cabecalho_e_um_mes_por_linha():
+    planilha = PlanilhaMemoria({})
+    gravados = resumo_mensal.reconstruir(planilha, _resumo({(2025, 1): [1] * 7, (2025, 2): [2] * 7}), AGORA)
+    assert gravados == 2
+    assert _aba(planilha) == [resumo_mensal.CABECALHO_RESUMO,
+                              _linha(2025, 1, 1, "2025-03-01 03:00:00"), _linha(2025, 2, 2, "2025-03-01 03:00:00")]
+
+
+def test_reconstruir_regrava_no_lugar_e_apaga_as_linhas_que_sobram():
+    antigas = [resumo_mensal.CABECALHO_RESUMO] + [_linha(2024, mes, 9) for mes in range(1, 6)]
+    planilha = PlanilhaMemoria({resumo_mensal.ABA_RESUMO: antigas})
+    resumo_mensal.reconstruir(planilha, _resumo({(2025, 1): [1] * 7}), AGORA)
+    assert _aba(planilha) == [resumo_mensal.CABECALHO_RESUMO, _linha(2025, 1, 1, "2025-03-01 03:00:00")]
+
+
+def test_reconstruir_que_falha_na_escrita_nao_deixa_a_aba_vazia():
+    antigas = [resumo_mensal.CABECALHO_RESUMO, _linha(2024, 12, 9)]
+    planilha = PlanilhaMemoria({resumo_mensal.ABA_RESUMO: antigas})
+    with mock.patch.object(AbaMemoria, "update", side_effect=erro_api(503)), \
+            pytest.raises(gspread.exceptions.APIError):
+        resumo_mensal.reconstruir(planilha, _resumo({(2025, 1): [1] * 7}), AGORA)
+    assert _aba(planilha) == antigas
+
+
+def test_gravar_meses_atualiza_so_as_colunas_informadas():
+    planilha = PlanilhaMemoria({resumo_mensal.ABA_RESUMO: [resumo_mensal.CABECALHO_RESUMO, _linha(2025, 1, 5),
+                                                           _linha(2025, 2, 5)]})
+    parcial = _resumo({(2025, 2): [np.nan] * 7})
+    parcial.loc[(2025, 2), ['Receita_Bruta', 'Receita_Liquida']] = [100.0, 95.5]
+    assert resumo_mensal.gravar_meses(planilha, parcial, AGORA) == 1
+
+    linhas = _aba(planilha)
+    assert linhas[1] == _linha(2025, 1, 5)
+    fevereiro = dict(zip(resumo_mensal.CABECALHO_RESUMO, linhas[2]))
+    assert (fevereiro['Receita_Bruta'], fevereiro['Receita_Liquida']) == ('100.0', '95.5')
+    assert fevereiro['Receita_Prevista'] == fevereiro['Gastos_Pagos'] == '5.0'
+    assert fevereiro['Atualizado_Em'] == "2025-03-01 03:00:00"
+
+
+def test_gravar_meses_so_acrescenta_mes_novo_com_todas_as_colunas():
+    planilha = PlanilhaMemoria({resumo_mensal.ABA_RESUMO: [resumo_mensal.CABECALHO_RESUMO, _linha(2025, 1, 5)]})
+    incompleto = _resumo({(2025, 2): [np.nan] * 7})
+    incompleto.loc[(2025, 2), 'Receita_Bruta'] = 100.0
+    assert resumo_mensal.gravar_meses(planilha, incompleto, AGORA) == 0
+    assert len(_aba(planilha)) == 2
+
+    assert resumo_mensal.gravar_meses(planilha, _resumo({(2025, 3): [7] * 7}), AGORA) == 1
+    assert _aba(planilha)[-1] == _linha(2025, 3, 7, "2025-03-01 03:00:00")